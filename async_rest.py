@@ -0,0 +1,81 @@
+import asyncio
+import functools
+
+import batch
+import bybit_spot_rest
+import clients
+import ftx_rest
+import transport
+
+""" NOTES:
+    asyncio front end for ftx_rest and bybit_spot_rest.
+    Every function of the wrapped module is available as a coroutine, e.g.
+        async with AsyncFtxClient(pool_size=100) as ftx:
+            quotes = await asyncio.gather(*[ftx.quote(m) for m in markets])
+    This is not an asynchronous HTTP transport: each call is the blocking module function run with
+    loop.run_in_executor, so every request in flight holds one thread of a pool_size thread pool.
+    Its requests go through a session of its own with pool_size keep-alive connections per host;
+    the module session and its pool settings are left as they are.
+    Calls use the client bound in the awaiting task with client.bound() (or the client given),
+    with only the session swapped for the async client's.
+"""
+
+
+class AsyncClient:
+    module = None
+
+    def __init__(self, pool_size=100, client=None):
+        '''
+        pool_size   integer     threads, and keep-alive connections per host, so requests in flight at once
+        client      optional; module client the calls run on, default the one bound when a call is awaited
+        '''
+        self.pool_size = pool_size
+        self.client = client
+        self.executor = batch.ContextExecutor(max_workers=pool_size,
+                                              thread_name_prefix=self.module.__name__)
+        self.session = transport.pooled_session(max_per_host=pool_size)
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        owner = clients.SessionOverride(self.client or self.module.client(), self.session)
+        return await loop.run_in_executor(self.executor, functools.partial(owner.call, func, *args, **kwargs))
+
+    async def basic_request(self, *args, **kwargs):
+        return await self.run(self.module.basic_request, *args, **kwargs)
+
+    async def private_request(self, *args, **kwargs):
+        return await self.run(self.module.private_request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        func = getattr(self.module, name)
+        if name.startswith('_') or not callable(func):
+            raise AttributeError(name)
+
+        @functools.wraps(func)
+        async def call(*args, **kwargs):
+            return await self.run(func, *args, **kwargs)
+        return call
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+
+class AsyncFtxClient(AsyncClient):
+    module = ftx_rest
+
+
+class AsyncBybitSpotClient(AsyncClient):
+    module = bybit_spot_rest
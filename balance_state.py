@@ -0,0 +1,129 @@
+import collections
+import operator
+import threading
+
+import decoding
+
+""" NOTES:
+    Account balances held as float64 arrays indexed by coin, updated incrementally.
+    poll() fetches the balances body and
+        - when it is byte-for-byte the previous one, only restamps the time
+        - otherwise parses total and free once into arrays, aligned to the coins seen so far,
+          and compares them with the previous snapshot
+    and returns BalanceUpdate(time, changed) where changed holds only the coins whose total or free
+    moved (every coin on the first poll). time is epoch ms on the exchange clock when the body arrived.
+    locked is always total - free. numpy is imported on first use.
+    apply() and the readers hold a lock, so concurrent polls never pair new arrays with an old coin index.
+        update = ftx_rest.balance_store.poll()     BalanceUpdate(1650000000123, {'USD': Balance(...)})
+        ftx_rest.balance_store.get('BTC')          Balance(total, free, locked), zeros for unknown coins
+"""
+
+Balance = collections.namedtuple('Balance', ['total', 'free', 'locked'])
+
+# time: exchange-clock epoch ms of the snapshot, changed: {coin: Balance} of the coins that moved
+BalanceUpdate = collections.namedtuple('BalanceUpdate', ['time', 'changed'])
+
+_coin = operator.itemgetter('coin')
+_total = operator.itemgetter('total')
+_free = operator.itemgetter('free')
+
+
+class BalanceStore:
+    def __init__(self, fetch, records, now_ms):
+        '''
+        fetch       callable    RETURNS the balances response body as bytes
+        records     callable    records(response) -> list of dicts with coin, total and free;
+                                raises when the response is an error
+        now_ms      callable    exchange-clock epoch milliseconds
+        '''
+        self.fetch = fetch
+        self.records = records
+        self.now_ms = now_ms
+        self.coins = []
+        self.index = {}
+        self.total = None
+        self.free = None
+        self.time = None
+        self.polls = 0
+        self.parsed = 0
+        self._body = None
+        self._lock = threading.RLock()
+
+    @property
+    def locked(self):
+        return self.total - self.free
+
+    def poll(self):
+        ''' RETURNS BalanceUpdate(time, changed) '''
+        body = self.fetch()
+        return self.apply(body, self.now_ms())
+
+    def apply(self, body, time):
+        import numpy as np
+        with self._lock:
+            return self._apply(np, body, time)
+
+    def _apply(self, np, body, time):
+        self.polls += 1
+        if body == self._body:
+            self.time = time
+            return BalanceUpdate(time, {})
+        records = self.records(decoding.decode(body))
+        self.parsed += 1
+        coins = list(map(_coin, records))
+        total = np.fromiter(map(_total, records), np.float64, len(records))
+        free = np.fromiter(map(_free, records), np.float64, len(records))
+        previous_total, previous_free = self.total, self.free
+        if coins != self.coins:
+            known = self.coins + [coin for coin in dict.fromkeys(coins) if coin not in self.index]
+            index = {coin: i for i, coin in enumerate(known)}
+            positions = np.fromiter(map(index.__getitem__, coins), np.intp, len(coins))
+            total = self._aligned(np, positions, total, len(known))
+            free = self._aligned(np, positions, free, len(known))
+            # coins not seen before compare as NaN, so they always count as changed
+            previous_total = self._extended(np, previous_total, len(known))
+            previous_free = self._extended(np, previous_free, len(known))
+            self.coins, self.index = known, index
+        moved = np.flatnonzero((total != previous_total) | (free != previous_free))
+        self.total, self.free, self.time, self._body = total, free, time, body
+        return BalanceUpdate(time, {self.coins[i]: Balance(t, f, t - f) for i, t, f
+                                    in zip(moved.tolist(), total[moved].tolist(), free[moved].tolist())})
+
+    @staticmethod
+    def _aligned(np, positions, values, size):
+        aligned = np.zeros(size)
+        aligned[positions] = values
+        return aligned
+
+    @staticmethod
+    def _extended(np, values, size):
+        extended = np.full(size, np.nan)
+        if values is not None:
+            extended[:len(values)] = values
+        return extended
+
+    def get(self, coin):
+        with self._lock:
+            i = self.index.get(coin)
+            if i is None:
+                return Balance(0.0, 0.0, 0.0)
+            total, free = float(self.total[i]), float(self.free[i])
+        return Balance(total, free, total - free)
+
+    def balances(self):
+        ''' RETURNS {coin: Balance} of the last snapshot '''
+        with self._lock:
+            if self.total is None:
+                return {}
+            coins, total, free = self.coins, self.total.tolist(), self.free.tolist()
+        return {coin: Balance(t, f, t - f) for coin, t, f in zip(coins, total, free)}
+
+    def flat(self):
+        ''' RETURNS {'last_update': ms string, 'BTC_free': number, 'BTC_locked': number, ...} '''
+        with self._lock:
+            time, balances = self.time, self.balances()
+        coins = {'last_update': str(time)}
+        for coin, balance in balances.items():
+            coins[f'{coin}_free'] = balance.free
+            coins[f'{coin}_locked'] = balance.locked
+        return coins
@@ -0,0 +1,68 @@
+import collections
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+""" NOTES:
+    Bounded fan-out of blocking calls on a shared thread pool.
+    At most max_workers calls of one batch are in flight at a time; results come back in input order.
+    Calls run in a copy of the submitting context, so the client bound there (see clients.py) carries over.
+"""
+
+BatchResult = collections.namedtuple('BatchResult', ['result', 'latency', 'error'])
+
+MAX_THREADS = 64
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ContextExecutor(ThreadPoolExecutor):
+    ''' ThreadPoolExecutor running every call in a copy of the context it was submitted from '''
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ContextExecutor(max_workers=MAX_THREADS, thread_name_prefix='batch')
+        return _executor
+
+
+def _timed(func, params, check):
+    start = time.perf_counter()
+    try:
+        result = func(**params)
+        error = check(result) if check else None
+    except Exception as e:
+        result, error = None, e
+    return BatchResult(result, time.perf_counter() - start, error)
+
+
+def fan_out(func, batch, max_workers=10, check=None):
+    '''
+    func        callable    called as func(**params) for every params dict in batch
+    batch       list        of dicts
+    max_workers integer     calls in flight at once
+    check       callable    optional; maps a response to an error detail, None when it succeeded
+    RETURNS list of BatchResult(result, latency, error) in input order
+    '''
+    results = [None] * len(batch)
+    pending = {}
+    todo = iter(enumerate(batch))
+    pool = executor()
+    for index, params in todo:
+        pending[pool.submit(_timed, func, params, check)] = index
+        if len(pending) >= max_workers:
+            break
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[pending.pop(future)] = future.result()
+            for index, params in todo:
+                pending[pool.submit(_timed, func, params, check)] = index
+                break
+    return results
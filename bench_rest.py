@@ -0,0 +1,824 @@
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import requests
+
+import batch
+import bybit_spot_rest
+import decoding
+import ftx_rest
+import rate_limit
+import signing
+import stub_server
+import venues
+from async_rest import AsyncBybitSpotClient, AsyncFtxClient
+
+""" NOTES:
+    Benchmarks against the local stub server, no exchange access needed.
+        python bench_rest.py [name ...] [--save results.json] [--compare baseline.json]
+    Every figure printed is also recorded under its benchmark; --save writes them to a JSON file and
+    --compare prints the change from an earlier file, marking regressions beyond --threshold.
+"""
+
+# units where a larger number is better; anything else (ms, ns/call, MB) is better smaller
+HIGHER_IS_BETTER = {'req/s', 'sig/s', 'books/s', 'MB/s'}
+
+RESULTS = {}
+_current = None
+
+
+def record(metric, value, unit):
+    RESULTS.setdefault(_current, {})[metric] = {'value': value, 'unit': unit}
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(name, latencies, elapsed):
+    record(f'{name} throughput', len(latencies) / elapsed, 'req/s')
+    record(f'{name} p50', percentile(latencies, 0.5) * 1000, 'ms')
+    record(f'{name} p99', percentile(latencies, 0.99) * 1000, 'ms')
+    print(f'{name:<28} {len(latencies) / elapsed:>10.1f} req/s'
+          f'   p50 {percentile(latencies, 0.5) * 1000:>8.2f} ms'
+          f'   p99 {percentile(latencies, 0.99) * 1000:>8.2f} ms')
+
+
+API_KEY = 'stub-key'
+API_SECRET = 'stub-secret'
+
+
+@contextlib.contextmanager
+def stub(limited=False, **kwargs):
+    ''' Point both modules at a stub server; the exchange rate budgets are lifted unless limited. '''
+    server, url = stub_server.start(**kwargs)
+    saved = [(module, name, getattr(module, name)) for module in (ftx_rest, bybit_spot_rest)
+             for name in ('BASE_URL', 'API_KEY', 'API_SECRET', 'limiter')]
+    ftx_rest.BASE_URL = url + '/api'
+    bybit_spot_rest.BASE_URL = url
+    for module in (ftx_rest, bybit_spot_rest):
+        module.API_KEY, module.API_SECRET = API_KEY, API_SECRET
+        if not limited:
+            module.limiter = rate_limit.RateLimiter({})
+    try:
+        yield url
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+        server.shutdown()
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def bench_async(n=400, concurrency=100, latency=0.005):
+    ''' Sequential sync calls against the same calls overlapped on one event loop. '''
+    async def run(client, func, *args):
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with sem:
+                start = time.perf_counter()
+                await getattr(client, func)(*args)
+                return time.perf_counter() - start
+        return await asyncio.gather(*[one() for _ in range(n)])
+
+    with stub(latency=latency):
+        rows = []
+        for module, client_cls, func, args in [
+                (ftx_rest, AsyncFtxClient, 'quote', ('BTC/USD',)),
+                (bybit_spot_rest, AsyncBybitSpotClient, 'best_bid_ask', ('BTCUSDT',))]:
+            start = time.perf_counter()
+            latencies = [timed(getattr(module, func), *args) for _ in range(n)]
+            rows.append((f'{module.__name__} sync', latencies, time.perf_counter() - start))
+
+            with client_cls(pool_size=concurrency) as client:
+                start = time.perf_counter()
+                latencies = asyncio.run(run(client, func, *args))
+                rows.append((f'{module.__name__} async x{concurrency}', latencies,
+                             time.perf_counter() - start))
+    for row in rows:
+        report(*row)
+
+
+class FreshSession:
+    ''' The transport private_request used to have: a new Session, and handshake, per call. '''
+    def __init__(self, verify):
+        self.verify = verify
+
+    def send(self, prepared):
+        with requests.Session() as s:
+            s.verify = self.verify
+            return s.send(prepared)
+
+
+def bench_private_pool(n=300, latency=0.001):
+    ''' ftx_rest.private_request over a fresh Session per call against the pooled session, HTTPS. '''
+    with tempfile.TemporaryDirectory() as directory:
+        cert = stub_server.self_signed_cert(directory)
+        with stub(latency=latency, certfile=cert):
+            pooled = ftx_rest.session
+            rows = []
+            for name, session in [('fresh session', FreshSession(cert)), ('pooled session', pooled)]:
+                ftx_rest.session = session
+                session.verify = cert
+                start = time.perf_counter()
+                latencies = []
+                for _ in range(n // 2):
+                    latencies.append(timed(ftx_rest.place_order, market='BTC/USD', side='buy',
+                                           price=46000, type='limit', size=0.01))
+                    latencies.append(timed(ftx_rest.cancel_order, 1))
+                rows.append((f'ftx private {name}', latencies, time.perf_counter() - start))
+            ftx_rest.session = pooled
+            pooled.verify = True
+            stats = ftx_rest.connection_stats()
+    for row in rows:
+        report(*row)
+    for host, entry in stats.items():
+        print(f'{host}: {entry}')
+
+
+def bench_limiter(n=200_000):
+    ''' Cost of one budget check and one check_api_limit call. '''
+    limiter = rate_limit.RateLimiter({'GET': rate_limit.TokenBucket(rate=1e9, capacity=1e9)})
+    counter = rate_limit.SlidingWindowCounter(window=120)
+    for name, func in [('limiter.acquire', lambda: limiter.acquire('GET')),
+                       ('counter.add', counter.add),
+                       ('check_api_limit', ftx_rest.check_api_limit),
+                       ('check_micro_api_limit', ftx_rest.check_micro_api_limit)]:
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        elapsed = time.perf_counter() - start
+        record(name, elapsed / n * 1e9, 'ns/call')
+        print(f'{name:<28} {elapsed / n * 1e9:>10.0f} ns/call')
+
+
+def bench_import(runs=5):
+    ''' Fresh interpreter start plus import, best of runs; pandas is what the modules used to import. '''
+    here = os.path.dirname(os.path.abspath(__file__))
+    for stmt in ['pass', 'import pandas', 'import ftx_rest', 'import bybit_spot_rest']:
+        best = min(timed(subprocess.run, [sys.executable, '-c', stmt], cwd=here, check=True)
+                   for _ in range(runs))
+        record(stmt, best * 1000, 'ms')
+        print(f'{stmt:<28} {best * 1000:>10.1f} ms')
+
+
+def bench_request_overhead(n=100_000):
+    ''' Per-request clock work: the pandas timestamps the modules used against integer ns clocks. '''
+    import pandas as pd
+    warnings.simplefilter('ignore', FutureWarning)
+    warnings.simplefilter('ignore', DeprecationWarning)
+    track = []
+    for name, func in [('pandas create_ts', lambda: str(round(pd.Timestamp.utcnow().timestamp() * 1000))),
+                       ('create_ts', ftx_rest.create_ts),
+                       ('pandas track append', lambda: track.append(pd.Timestamp.utcnow())),
+                       ('track counter add', ftx_rest.api_limit_track_get.add)]:
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        elapsed = time.perf_counter() - start
+        record(name, elapsed / n * 1e9, 'ns/call')
+        print(f'{name:<28} {elapsed / n * 1e9:>10.0f} ns/call')
+
+
+def bench_signing(n=100_000):
+    ''' Signatures per second: HMAC keyed per call as before against the pre-keyed signers. '''
+    import hashlib
+    import hmac
+    from urllib.parse import urlencode
+    body = b'{"market": "BTC-PERP", "side": "buy", "price": 8500, "size": 1, "type": "limit"}'
+    params = {'symbol': 'BTCUSDT', 'qty': '0.01', 'side': 'Buy', 'type': 'LIMIT', 'price': '46000',
+              'timestamp': '1642000000000', 'api_key': API_KEY}
+
+    def ftx_per_call():
+        payload = f'{1588591856950}POST/api/orders'.encode() + body
+        return hmac.new(API_SECRET.encode(), payload, 'sha256').hexdigest()
+
+    def bybit_per_call():
+        sorted_params = {k: params[k] for k in sorted(params)}
+        return hmac.new(bytes(API_SECRET, 'utf-8'), urlencode(sorted_params).encode('utf-8'),
+                        hashlib.sha256).hexdigest()
+
+    ftx = signing.FtxSigner(API_SECRET)
+    bybit = signing.BybitSigner(API_SECRET)
+    batch = [(1588591856950, 'POST', '/api/orders', body)] * 100
+    for name, func, per in [('ftx per-call hmac', ftx_per_call, 1),
+                            ('ftx signer', lambda: ftx.sign_request(1588591856950, 'POST', '/api/orders', body), 1),
+                            ('ftx signer batch x100', lambda: ftx.sign_batch(batch), 100),
+                            ('bybit per-call hmac', bybit_per_call, 1),
+                            ('bybit signer', lambda: bybit.sign_params(params), 1)]:
+        start = time.perf_counter()
+        for _ in range(n // per):
+            func()
+        rate = n / (time.perf_counter() - start)
+        record(name, rate, 'sig/s')
+        print(f'{name:<28} {rate:>10.0f} sig/s')
+
+
+def ladder(n, side='buy'):
+    return [{'market': 'BTC/USD', 'side': side, 'price': 46000 - i, 'type': 'limit', 'size': 0.01}
+            for i in range(n)]
+
+
+def bench_place_orders(levels=20, rounds=10, latency=0.02):
+    ''' Time to get a full ladder onto the book: place_order loop against place_orders. '''
+    with stub(latency=latency):
+        orders = ladder(levels)
+        rows = [('sequential loop', lambda: [ftx_rest.place_order(**o) for o in orders])]
+        for workers in (5, 10, 20):
+            rows.append((f'place_orders x{workers}',
+                         lambda workers=workers: ftx_rest.place_orders(orders, max_workers=workers)))
+        results = [(name, [timed(func) for _ in range(rounds)]) for name, func in rows]
+    for name, samples in results:
+        record(name, percentile(samples, 0.5) * 1000, 'ms')
+        print(f'{name:<28} ladder of {levels}: p50 {percentile(samples, 0.5) * 1000:>8.2f} ms'
+              f'   max {max(samples) * 1000:>8.2f} ms')
+
+
+def bench_candle_cache(days=90, latency=0.005):
+    ''' cached_history / cached_candlesticks for 5 minute bars: cold store against warm store. '''
+    import candle_cache
+    end = 1_640_995_200
+    start = end - days * 86400
+    with tempfile.TemporaryDirectory() as directory, stub(latency=latency):
+        store = candle_cache.CandleStore(directory)
+        rows = []
+        for name, func, args in [
+                ('ftx cached_history', ftx_rest.cached_history, ('BTC/USD', 300, start, end)),
+                ('bybit cached_candlesticks', bybit_spot_rest.cached_candlesticks,
+                 ('BTCUSDT', '5m', start * 1000, end * 1000))]:
+            cold = timed(func, *args, store=store)
+            warm = min(timed(func, *args, store=store) for _ in range(20))
+            rows.append((name, cold, warm, len(func(*args, store=store))))
+    for name, cold, warm, count in rows:
+        record(f'{name} cold', cold * 1000, 'ms')
+        record(f'{name} warm', warm * 1000, 'ms')
+        print(f'{name:<28} {count} bars   cold {cold * 1000:>9.2f} ms   warm {warm * 1000:>7.3f} ms')
+    print(f'store stats {store.stats}')
+
+
+BOOK_BPS = [5, 10, 25, 50, 100]
+BOOK_NOTIONALS = [10_000, 50_000, 100_000, 250_000]
+
+
+def python_book_analytics(resp):
+    ''' The per-level Python walk callers did on the raw JSON. '''
+    bids = [(float(p), float(s)) for p, s in resp['result']['bids']]
+    asks = [(float(p), float(s)) for p, s in resp['result']['asks']]
+    mid = (bids[0][0] + asks[0][0]) / 2
+    spread = asks[0][0] - bids[0][0]
+    depths = [sum(s for p, s in asks if p <= mid * (1 + bps / 1e4)) for bps in BOOK_BPS]
+    impacts = []
+    for notional in BOOK_NOTIONALS:
+        remaining, size = notional, 0.0
+        for p, s in asks:
+            take = min(remaining, p * s)
+            size += take / p
+            remaining -= take
+            if not remaining:
+                break
+        impacts.append(notional / size)
+    return mid, spread, depths, impacts
+
+
+def bench_orderbook(books=2000, levels=200):
+    ''' Books evaluated per second: mid, spread, depth at 5 bps levels and impact at 4 notionals. '''
+    import orderbook
+    resp = {'result': {'time': 0, 'bids': [[str(46916.0 - i * 0.5), '1.25'] for i in range(levels)],
+                       'asks': [[str(46917.0 + i * 0.5), '1.25'] for i in range(levels)]}}
+
+    def vectorized():
+        book = orderbook.OrderBook.from_bybit(resp)
+        return (book.mid, book.spread, book.depth('buy', BOOK_BPS),
+                book.impact_price(BOOK_NOTIONALS, 'buy'))
+
+    assert max(abs(vectorized()[3] - python_book_analytics(resp)[3])) < 1e-6
+    assert list(vectorized()[2]) == python_book_analytics(resp)[2]
+    for name, func in [('python per-level walk', lambda: python_book_analytics(resp)),
+                       ('OrderBook', vectorized)]:
+        elapsed = min(timed(lambda: [func() for _ in range(books)]) for _ in range(3))
+        record(name, books / elapsed, 'books/s')
+        print(f'{name:<28} {books / elapsed:>10.0f} books/s ({levels} levels a side)')
+
+
+def sample_payloads():
+    ''' Bodies shaped like FTX /markets and Bybit ticker/24hr for every pair (~600 markets). '''
+    markets = [dict(stub_server._MARKET, name=f'COIN{i}/USD', baseCurrency=f'COIN{i}', volumeUsd24h=1e6 + i,
+                    change1h=0.001, change24h=-0.02, changeBod=0.01, quoteVolume24h=1e6, postOnly=False,
+                    restricted=False, highLeverageFeeExempt=True, largeOrderThreshold=5000.0)
+               for i in range(600)]
+    tickers = [{'time': 1642000000000 + i, 'symbol': f'COIN{i}USDT', 'bestBidPrice': '46916.5',
+                'bestAskPrice': '46917', 'volume': '1234.5678', 'quoteVolume': '57912345.12',
+                'lastPrice': '46916.5', 'highPrice': '47500', 'lowPrice': '46000', 'openPrice': '46500'}
+               for i in range(600)]
+    return {'ftx /markets': json.dumps({'success': True, 'result': markets}).encode(),
+            'bybit ticker/24hr': json.dumps({'ret_code': 0, 'ret_msg': '', 'result': tickers}).encode()}
+
+
+def bench_decoding(rounds=200):
+    ''' Decode throughput of every installed backend on market-wide payloads. '''
+    for name, body in sample_payloads().items():
+        for backend, loads in decoding.BACKENDS.items():
+            elapsed = min(timed(lambda: [loads(body) for _ in range(rounds)]) for _ in range(3))
+            record(f'{name} {backend}', len(body) * rounds / elapsed / 1e6, 'MB/s')
+            print(f'{name:<20} {backend:<8} {len(body) * rounds / elapsed / 1e6:>8.1f} MB/s'
+                  f'   {elapsed / rounds * 1e3:>7.3f} ms/payload ({len(body) // 1024} KB)')
+
+
+def bench_columnar(fills=100_000, pages=200):
+    ''' 100k FTX fills and 1000-bar Bybit kline pages to typed columns: pandas from records against columnar. '''
+    import columnar
+    import pandas as pd
+    # the route handlers read the simulator of the serving thread; an empty one leaves the generated history
+    stub_server._serving.sim = {'ftx': stub_server.Exchange('USD'), 'bybit': stub_server.Exchange('USDT')}
+    records = stub_server._ftx_fills(None, {'start_time': 0, 'end_time': 60 * fills})['result']
+    records = (records * (fills // len(records) + 1))[:fills]
+    klines = stub_server._bybit_klines(None, {'interval': '1m', 'startTime': 0, 'endTime': 60_000 * 999})['result']
+
+    def pandas_fills():
+        frame = pd.DataFrame(records)
+        frame['time'] = pd.to_datetime(frame['time'])
+        frame['side'] = frame['side'].astype('category')
+        return frame
+
+    def pandas_klines():
+        frame = pd.DataFrame(klines).iloc[:, :6]
+        frame.columns = ['time', 'open', 'high', 'low', 'close', 'volume']
+        return frame.astype({'time': 'int64', 'open': float, 'high': float, 'low': float,
+                             'close': float, 'volume': float})
+
+    for name, func, rounds in [
+            (f'{fills} fills pandas', pandas_fills, 1),
+            (f'{fills} fills as_arrays', lambda: columnar.to_arrays(records, columnar.FTX_FILLS), 1),
+            (f'{fills} fills as_frame', lambda: columnar.to_frame(records, columnar.FTX_FILLS), 1),
+            (f'{pages} kline pages pandas', pandas_klines, pages),
+            (f'{pages} kline pages arrays', lambda: columnar.to_arrays(klines, columnar.BYBIT_KLINES), pages)]:
+        elapsed = min(timed(lambda: [func() for _ in range(rounds)]) for _ in range(3))
+        record(name, elapsed * 1000, 'ms')
+        print(f'{name:<28} {elapsed * 1000:>10.1f} ms')
+
+
+def bench_metrics(n=20_000):
+    ''' Request path cost of the metrics hooks, disabled and enabled, against the stub. '''
+    with stub():
+        rows = []
+        for enabled in (False, True):
+            ftx_rest.metrics.enabled = enabled
+            start = time.perf_counter()
+            latencies = [timed(ftx_rest.quote, 'BTC/USD') for _ in range(n // 10)]
+            rows.append((f'quote metrics {"on" if enabled else "off"}', latencies, time.perf_counter() - start))
+        ftx_rest.metrics.enabled = False
+    for row in rows:
+        report(*row)
+    metrics = ftx_rest.instrumentation.Metrics('bench')
+    noop = lambda: None
+    for name, func in [('send() disabled', lambda: ftx_rest.send('GET', '/markets', noop)),
+                       ('metrics.observe()', lambda: metrics.observe('GET', '/markets', noop))]:
+        elapsed = timed(lambda: [func() for _ in range(n)])
+        record(name, elapsed / n * 1e9, 'ns/call')
+        print(f'{name:<28} {elapsed / n * 1e9:>10.0f} ns/call')
+    print(ftx_rest.metrics.snapshot())
+
+
+def bench_host_selection(rounds=11, slow=0.02, fast=0.005):
+    ''' Choosing between two hosts: the old back-to-back timing loop against concurrent probe rounds. '''
+    slow_server, slow_url = stub_server.start(latency=slow)
+    fast_server, fast_url = stub_server.start(latency=fast)
+    saved = bybit_spot_rest.BASE_URL, bybit_spot_rest.limiter
+    bybit_spot_rest.limiter = rate_limit.RateLimiter({})
+    try:
+        def sequential():
+            results = []
+            for url in (slow_url, fast_url):
+                bybit_spot_rest.BASE_URL = url
+                results.append((bybit_spot_rest.server_performance_tests(), url))
+            bybit_spot_rest.BASE_URL = min(results)[1]
+        elapsed = timed(sequential)
+        record('sequential choice', elapsed * 1000, 'ms')
+        print(f'{"sequential choice":<28} {elapsed * 1000:>10.1f} ms')
+        selector = bybit_spot_rest.host_selection.HostSelector([slow_url, fast_url], bybit_spot_rest.probe_host,
+                                                               on_switch=bybit_spot_rest.use_host)
+        elapsed = timed(lambda: [selector.probe_once() for _ in range(rounds)])
+        selector.select_best()
+        record('concurrent probe rounds', elapsed * 1000, 'ms')
+        print(f'{"concurrent probe rounds":<28} {elapsed * 1000:>10.1f} ms   active {selector.active == fast_url and "fast" or "slow"}')
+        for url, row in selector.snapshot().items():
+            print(f'{"slow" if url == slow_url else "fast":<28} p50 {row["p50"] * 1000:>8.2f} ms   p95 {row["p95"] * 1000:>8.2f} ms')
+    finally:
+        bybit_spot_rest.BASE_URL, bybit_spot_rest.limiter = saved
+        slow_server.shutdown()
+        fast_server.shutdown()
+
+
+def bench_clock_sync(n=200, skews=(-2.0, -0.5, 0.0, 3.0, 7.5)):
+    ''' Share of signed Bybit orders rejected for recvWindow by a stub whose clock is skewed, before and after sync. '''
+    order = dict(symbol='BTCUSDT', qty=0.01, side='BUY', type='LIMIT', price=40000)
+    saved = bybit_spot_rest.clock
+    try:
+        for skew in skews:
+            rejected = []
+            with stub(clock_skew=skew):
+                bybit_spot_rest.clock = bybit_spot_rest.clock_sync.ClockSync(bybit_spot_rest.server_time_ms)
+                for synced in (False, True):
+                    if synced:
+                        bybit_spot_rest.clock.sync()
+                    codes = [bybit_spot_rest.place_order(**order)['ret_code'] for _ in range(n)]
+                    rejected.append(codes.count(10002) / n)
+                    record(f'skew {skew:+.1f} s {"synced" if synced else "local clock"} rejected', rejected[-1], 'ratio')
+            print(f'skew {skew:>+5.1f} s{"":<17} rejected {rejected[0]:>6.1%} local clock'
+                  f'   {rejected[1]:>6.1%} synced (offset {bybit_spot_rest.clock.offset_ns / 1e6:+.1f} ms)')
+    finally:
+        bybit_spot_rest.clock = saved
+
+
+def bench_top_of_book(n=50, latency=0.02):
+    ''' Cross-venue snapshot: quoting one venue after the other against venues.top_of_book. '''
+    symbols = {'ftx': 'BTC/USD', 'bybit_spot': 'BTC/USDT'}
+    with stub(latency=latency):
+        sequential = [timed(lambda: [venues.VENUES[name].quote(symbol) for name, symbol in symbols.items()])
+                      for _ in range(n)]
+        concurrent = [timed(venues.top_of_book, symbols) for _ in range(n)]
+    for name, latencies in [('sequential quotes', sequential), ('top_of_book', concurrent)]:
+        report(name, latencies, sum(latencies))
+
+
+PIPELINE_STAGES = ['params', 'signing', 'prepare', 'network', 'decode', 'shape']
+
+
+def ftx_pipeline():
+    ''' ftx_rest.place_order taken apart: ns spent in each of PIPELINE_STAGES '''
+    clock = time.perf_counter_ns
+    t0 = clock()
+    params = dict(market='BTC/USD', side='buy', price=46000, type='limit', size=0.01)
+    ts = ftx_rest.clock.now_ms()
+    t1 = clock()
+    prepared = requests.Request('POST', ftx_rest.BASE_URL + ftx_rest._ORDERS, json=params).prepare()
+    t2 = clock()
+    prepared.headers['FTX-KEY'] = ftx_rest.API_KEY
+    prepared.headers['FTX-SIGN'] = ftx_rest.sign_payload(ftx_rest.API_SECRET, ts, 'POST', prepared.path_url,
+                                                         prepared.body)
+    prepared.headers['FTX-TS'] = str(ts)
+    t3 = clock()
+    r = ftx_rest.session.send(prepared)
+    t4 = clock()
+    resp = decoding.decode(r.content)
+    t5 = clock()
+    venues.VENUES['ftx'].order_result(venues.VENUES['ftx'].checked(resp))
+    t6 = clock()
+    return [t1 - t0, t3 - t2, t2 - t1, t4 - t3, t5 - t4, t6 - t5]
+
+
+def bybit_pipeline():
+    ''' bybit_spot_rest.place_order taken apart: ns spent in each of PIPELINE_STAGES '''
+    clock = time.perf_counter_ns
+    t0 = clock()
+    params = dict(symbol='BTCUSDT', qty=0.01, side='BUY', type='LIMIT', price=46000,
+                  timestamp=bybit_spot_rest.create_ts(), api_key=bybit_spot_rest.API_KEY)
+    t1 = clock()
+    query = bybit_spot_rest.default_client.signer(signing.BybitSigner).query(params)
+    t2 = clock()
+    session = bybit_spot_rest.session
+    request = requests.Request('POST', bybit_spot_rest.BASE_URL + bybit_spot_rest._ORDER, params=query)
+    prepared = session.prepare_request(request)
+    t3 = clock()
+    r = session.send(prepared)
+    t4 = clock()
+    resp = decoding.decode(r.content)
+    t5 = clock()
+    venues.VENUES['bybit_spot'].order_result(venues.VENUES['bybit_spot'].checked(resp), 'BTC/USDT')
+    t6 = clock()
+    return [t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4, t6 - t5]
+
+
+def bench_pipeline(n=2000):
+    ''' Where one private order request spends its time, stage by stage, against the whole wrapper call. '''
+    orders = {'ftx': dict(market='BTC/USD', side='buy', price=46000, type='limit', size=0.01),
+              'bybit': dict(symbol='BTCUSDT', qty=0.01, side='BUY', type='LIMIT', price=46000)}
+    with stub():
+        for name, pipeline, wrapper in [('ftx', ftx_pipeline, ftx_rest.place_order),
+                                        ('bybit', bybit_pipeline, bybit_spot_rest.place_order)]:
+            pipeline()
+            stages = list(zip(*[pipeline() for _ in range(n)]))
+            total = sum(map(sum, stages))
+            for stage, samples in zip(PIPELINE_STAGES, stages):
+                mean = sum(samples) / n / 1000
+                record(f'{name} {stage}', mean, 'us')
+                print(f'{name + " " + stage:<28} {mean:>10.1f} us   p99 {percentile(samples, 0.99) / 1000:>8.1f} us'
+                      f'   {sum(samples) / total:>6.1%}')
+            calls = n // 10
+            whole = min(timed(lambda: [wrapper(**orders[name]) for _ in range(calls)]) for _ in range(3)) / calls
+            record(f'{name} place_order', whole * 1e6, 'us')
+            print(f'{name + " place_order":<28} {whole * 1e6:>10.1f} us   (stages sum {total / n / 1000:.1f} us)')
+
+
+def bench_concurrency(n=2000, levels=(1, 4, 16, 64), latency=0.005):
+    ''' Requests per second through batch.fan_out at each level of in-flight requests. '''
+    calls = [{'symbol': f'COIN{i}/USD'} for i in range(n)]  # distinct, so the coalescer shares none
+    with stub(latency=latency):
+        ftx_rest.configure_pool(max_per_host=max(levels))
+        try:
+            for workers in levels:
+                start = time.perf_counter()
+                results = batch.fan_out(ftx_rest.quote, calls, max_workers=workers)
+                elapsed = time.perf_counter() - start
+                assert not any(r.error for r in results)
+                report(f'quote x{workers}', [r.latency for r in results], elapsed)
+        finally:
+            ftx_rest.configure_pool()
+
+
+def bench_pagination_memory(days=14):
+    ''' Peak Python heap and time of a long fills pull: kept as dicts against converted to typed columns. '''
+    import columnar
+    end = 1_640_995_200
+    start = end - days * 86400
+
+    def pull():
+        return list(ftx_rest.paginate(ftx_rest.fills, start, end, window=12000, page_limit=200))
+
+    with stub():
+        for name, func in [('fills as dicts', pull),
+                           ('fills as columns', lambda: columnar.to_arrays(pull(), columnar.FTX_FILLS))]:
+            tracemalloc.start()
+            begin = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - begin
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            rows = len(result) if isinstance(result, list) else len(result['id'])
+            del result
+            record(f'{name} peak', peak, 'MB')
+            record(f'{name} time', elapsed * 1000, 'ms')
+            print(f'{name:<28} {rows} rows   peak {peak:>8.1f} MB   {elapsed * 1000:>8.1f} ms')
+
+
+def bench_soak(n=4000, workers=32, error_rate=0.01, drop_rate=0.005):
+    ''' Signed order/cancel churn against the simulator with HMAC checks and injected failures. '''
+    orders = [dict(market='BTC/USD', side='buy', price=40000 + i % 100, type='limit', size=0.01) for i in range(n)]
+    with stub(api_key=API_KEY, api_secret=API_SECRET, error_rate=error_rate, drop_rate=drop_rate, seed=7) as url:
+        ftx_rest.configure_pool(max_per_host=workers)
+        try:
+            start = time.perf_counter()
+            placed = ftx_rest.place_orders(orders, max_workers=workers)
+            ids = [{'order_id': r.result['result']['id']} for r in placed if not r.error]
+            cancelled = batch.fan_out(ftx_rest.cancel_order, ids, max_workers=workers,
+                                      check=ftx_rest.response_error)
+            elapsed = time.perf_counter() - start
+        finally:
+            ftx_rest.configure_pool()
+    results = placed + cancelled
+    report(f'soak x{workers}', [r.latency for r in results], elapsed)
+    errors = collections.Counter(type(r.error).__name__ if isinstance(r.error, Exception) else r.error
+                                 for r in results if r.error)
+    record('failed requests', sum(errors.values()) / len(results), 'ratio')
+    print(f'{"failed":<28} {sum(errors.values()):>10} of {len(results)}   {dict(errors)}')
+
+def bench_hedging(n=600, latency=0.002, stall_rate=0.03, stall=0.1):
+    ''' best_bid_ask p50/p99 against two hosts with an occasional stall, unhedged and hedged. '''
+    servers = [stub_server.start(latency=latency, stall_rate=stall_rate, stall=stall, seed=seed) for seed in (1, 2)]
+    hosts = [url for _, url in servers]
+    saved = (bybit_spot_rest.BASE_URL, bybit_spot_rest.limiter, bybit_spot_rest.host_selector,
+             bybit_spot_rest.hedger)
+    bybit_spot_rest.BASE_URL = hosts[0]
+    bybit_spot_rest.limiter = rate_limit.RateLimiter({})
+    bybit_spot_rest.host_selector = bybit_spot_rest.host_selection.HostSelector(hosts, bybit_spot_rest.probe_host)
+    bybit_spot_rest.hedger = bybit_spot_rest.host_selection.Hedger()
+    try:
+        for name, endpoints in [('best_bid_ask', ()), ('best_bid_ask hedged', (bybit_spot_rest._BOOKTICKER,))]:
+            bybit_spot_rest.enable_hedging(endpoints)
+            latencies = [timed(bybit_spot_rest.best_bid_ask, 'BTCUSDT') for _ in range(n)]
+            report(name, latencies, sum(latencies))
+        hedger = bybit_spot_rest.hedger.snapshot()
+        record('extra requests', hedger['hedged'] / hedger['calls'], 'ratio')
+        print(f'{"hedges fired":<28} {hedger["hedged"]:>10} of {hedger["calls"]}   won {hedger["hedge_wins"]}')
+    finally:
+        (bybit_spot_rest.BASE_URL, bybit_spot_rest.limiter, bybit_spot_rest.host_selector,
+         bybit_spot_rest.hedger) = saved
+        for server, _ in servers:
+            server.shutdown()
+
+def bench_coalescing(threads=8, calls=100, latency=0.005, ttl_ms=10):
+    ''' threads strategy loops quoting the same market: plain, coalesced, coalesced with a micro-cache. '''
+    saved = ftx_rest.coalescer
+    try:
+        with stub(latency=latency):
+            for name, endpoints, ttl in [('quote plain', [], 0), ('quote coalesced', [ftx_rest._SINGLE_MARKET], 0),
+                                         (f'quote ttl {ttl_ms} ms', [ftx_rest._SINGLE_MARKET], ttl_ms)]:
+                ftx_rest.coalescer = ftx_rest.coalescing.Coalescer(endpoints)
+                ftx_rest.coalescer.set_ttl(ftx_rest._SINGLE_MARKET, ttl)
+                loop = lambda: [timed(ftx_rest.quote, 'BTC/USD') for _ in range(calls)]
+                start = time.perf_counter()
+                results = batch.fan_out(loop, [{}] * threads, max_workers=threads)
+                elapsed = time.perf_counter() - start
+                report(name, [latency for r in results for latency in r.result], elapsed)
+                counters = ftx_rest.coalescer.snapshot().get(ftx_rest._SINGLE_MARKET)
+                sent = counters['fetches'] if counters else threads * calls
+                record(f'{name} requests sent', sent, 'requests')
+                print(f'{"":<28} {sent:>10} requests sent for {threads * calls} calls   {counters or ""}')
+    finally:
+        ftx_rest.coalescer = saved
+
+def bench_mass_cancel(orders=1000, symbols=(4, 400), markets=20, latency=0.02):
+    '''
+    Time to flat for orders open orders: list them and send one cancel request after another,
+    against mass_cancel_orders, which sends them concurrently and lists again to verify.
+    '''
+    def flat(name, list_open, plan, mass_cancel_orders):
+        start = time.perf_counter()
+        latencies = [timed(cancel.func, **cancel.params) for cancel in plan(list_open())]
+        elapsed = time.perf_counter() - start
+        report(f'{name} sequential', latencies, elapsed)
+        record(f'{name} sequential time to flat', elapsed * 1000, 'ms')
+        seed()
+        result = mass_cancel_orders(max_workers=32)
+        report(f'{name} mass cancel', [c.latency for c in result.chunks], result.latency)
+        record(f'{name} mass cancel time to flat', result.latency * 1000, 'ms')
+        print(f'{"":<28} {len(result.chunks):>10} requests, flat in {result.latency * 1000:.1f} ms'
+              f' (sequential {elapsed * 1000:.1f} ms), {len(result.remaining)} left open')
+
+    with stub(latency=latency):
+        for n in symbols:
+            seed = lambda: batch.fan_out(bybit_spot_rest.place_order, [
+                dict(symbol=f'COIN{i % n}USDT', qty=1, side='BUY', type='LIMIT', price=100)
+                for i in range(orders)], max_workers=64)
+            seed()
+            flat(f'bybit {n} symbols', bybit_spot_rest.open_order_list, bybit_spot_rest.cancel_plan,
+                 bybit_spot_rest.mass_cancel_orders)
+        seed = lambda: batch.fan_out(ftx_rest.place_order, [
+            dict(market=f'COIN{i % markets}/USD', side='buy', price=100, type='limit', size=1)
+            for i in range(orders)], max_workers=64)
+        seed()
+        flat(f'ftx {markets} markets', ftx_rest.open_order_list, ftx_rest.cancel_plan, ftx_rest.mass_cancel_orders)
+
+def bench_order_store(orders=50, lookups=500, latency=0.005):
+    ''' Order state by polling order_status against reading it from ftx_rest.order_store. '''
+    with stub(latency=latency):
+        placed = [r.result['result'] for r in ftx_rest.place_orders(
+            [dict(market='BTC/USD', side='buy', price=40000 - i, type='limit', size=0.01) for i in range(orders)])]
+        ids = [placed[i % orders]['id'] for i in range(lookups)]
+        start_get = ftx_rest.check_api_limit()[0]
+        start = time.perf_counter()
+        latencies = [timed(ftx_rest.order_status, order_id) for order_id in ids]
+        report('order_status polling', latencies, time.perf_counter() - start)
+        record('order_status polling requests', ftx_rest.check_api_limit()[0] - start_get, 'requests')
+        start_get = ftx_rest.check_api_limit()[0]
+        start = time.perf_counter()
+        latencies = [timed(ftx_rest.order_store.get, order_id) for order_id in ids]
+        report('order_store lookups', latencies, time.perf_counter() - start)
+        record('order_store lookups requests', ftx_rest.check_api_limit()[0] - start_get, 'requests')
+        start = time.perf_counter()
+        dropped = ftx_rest.order_store.sync()
+        print(f'{"":<28} sync against open orders: {(time.perf_counter() - start) * 1000:.1f} ms,'
+              f' {len(dropped)} dropped, {ftx_rest.order_store.snapshot()["open"]} open')
+        ftx_rest.mass_cancel_orders()
+
+def bench_balances(coins=500, rounds=1000):
+    ''' One risk-loop poll of a coins-wide Bybit wallet body: the flattened string dict against balance_store. '''
+    import balance_state
+    rows = [{'coin': f'COIN{i}', 'coinId': f'COIN{i}', 'coinName': f'COIN{i}', 'total': f'{1000 + i}.12345678',
+             'free': f'{900 + i}.12345678', 'locked': '100'} for i in range(coins)]
+    body = json.dumps({'ret_code': 0, 'ret_msg': '', 'result': {'balances': rows}}).encode()
+    rows[coins // 2] = dict(rows[coins // 2], free='1.5')
+    moved = json.dumps({'ret_code': 0, 'ret_msg': '', 'result': {'balances': rows}}).encode()
+
+    def flattened(body):
+        # the previous balances(): every coin rebuilt as strings, which the risk loop then parses
+        coins_resp = decoding.decode(body)
+        coins = {'last_update': str(int(time.time() * 1000))}
+        for line in coins_resp['result']['balances']:
+            coins[f'{line["coin"]}_free'] = line['free']
+            coins[f'{line["coin"]}_locked'] = line['locked']
+        return {key: float(value) for key, value in coins.items()}
+
+    store = balance_state.BalanceStore(None, bybit_spot_rest.balance_records, None)
+    bodies = [body, moved]
+    for name, func in [('flattened strings', lambda i: flattened(bodies[i % 2])),
+                       ('store, unchanged', lambda i: store.apply(body, i)),
+                       ('store, one coin moved', lambda i: store.apply(bodies[i % 2], i))]:
+        elapsed = min(timed(lambda: [func(i) for i in range(rounds)]) for _ in range(3))
+        record(f'{name} per poll', elapsed / rounds * 1e6, 'us')
+        print(f'{name:<28} {elapsed / rounds * 1e6:>10.1f} us/poll   ({coins} coins)')
+
+def bench_account_snapshot(subaccounts=15, latency=0.02, rounds=5):
+    ''' Every SNAPSHOT_PARTS call for every subaccount: one after another against account_snapshot. '''
+    names = [f'sub{i}' for i in range(subaccounts)]
+    with stub(latency=latency):
+        saved = ftx_rest.DEFAULT_SUBACCOUNT
+        try:
+            serial = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                for name in names:
+                    ftx_rest.DEFAULT_SUBACCOUNT = name
+                    for part in ftx_rest.SNAPSHOT_PARTS.values():
+                        part()
+                serial.append(time.perf_counter() - start)
+        finally:
+            ftx_rest.DEFAULT_SUBACCOUNT = saved
+        snapshots = [ftx_rest.account_snapshot(names).latency for _ in range(rounds)]
+    for name, latencies in [('serial', serial), ('account_snapshot', snapshots)]:
+        record(f'{name} {subaccounts} subaccounts', percentile(latencies, 0.5) * 1000, 'ms')
+        print(f'{name:<28} {percentile(latencies, 0.5) * 1000:>10.1f} ms for {subaccounts} subaccounts'
+              f' x {len(ftx_rest.SNAPSHOT_PARTS)} requests')
+
+
+def bench_client_scaling(n=1000, levels=(1, 2, 4, 8, 16), latency=0.005):
+    ''' Private requests per second on 1 to 16 threads: module functions, a client, a client with per-thread sessions. '''
+    with stub(latency=latency):
+        shared = ftx_rest.FtxClient(API_KEY, API_SECRET)
+        per_thread = ftx_rest.FtxClient(API_KEY, API_SECRET, per_thread_sessions=True)
+        for client in (shared, per_thread):
+            client.limiter = rate_limit.RateLimiter({})
+        ftx_rest.configure_pool(max_per_host=max(levels))
+        shared.configure_pool(max_per_host=max(levels))
+        try:
+            for name, account in [('module', ftx_rest.account), ('client', shared.account),
+                                  ('client per-thread', per_thread.account)]:
+                for workers in levels:
+                    start = time.perf_counter()
+                    results = batch.fan_out(account, [{}] * n, max_workers=workers)
+                    elapsed = time.perf_counter() - start
+                    assert not any(r.error for r in results)
+                    report(f'{name} account x{workers}', [r.latency for r in results], elapsed)
+        finally:
+            ftx_rest.configure_pool()
+
+
+def compare(baseline, threshold):
+    ''' Print every metric of this run next to the same metric in baseline. '''
+    for bench, metrics in RESULTS.items():
+        for metric, entry in metrics.items():
+            before = baseline.get(bench, {}).get(metric)
+            if not before or not before['value']:
+                continue
+            change = entry['value'] / before['value'] - 1
+            worse = -change if entry['unit'] in HIGHER_IS_BETTER else change
+            print(f'{bench + " " + metric:<52} {before["value"]:>12.4g} -> {entry["value"]:>12.4g}'
+                  f' {entry["unit"]:<8} {change:>+7.1%} {"REGRESSION" if worse > threshold else ""}')
+
+
+BENCHMARKS = {
+    'async': bench_async,
+    'private_pool': bench_private_pool,
+    'limiter': bench_limiter,
+    'import': bench_import,
+    'request_overhead': bench_request_overhead,
+    'signing': bench_signing,
+    'place_orders': bench_place_orders,
+    'candle_cache': bench_candle_cache,
+    'orderbook': bench_orderbook,
+    'decoding': bench_decoding,
+    'columnar': bench_columnar,
+    'metrics': bench_metrics,
+    'host_selection': bench_host_selection,
+    'clock_sync': bench_clock_sync,
+    'top_of_book': bench_top_of_book,
+    'pipeline': bench_pipeline,
+    'concurrency': bench_concurrency,
+    'pagination_memory': bench_pagination_memory,
+    'soak': bench_soak,
+    'hedging': bench_hedging,
+    'coalescing': bench_coalescing,
+    'mass_cancel': bench_mass_cancel,
+    'order_store': bench_order_store,
+    'balances': bench_balances,
+    'account_snapshot': bench_account_snapshot,
+    'client_scaling': bench_client_scaling,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('names', nargs='*', metavar='name', help=', '.join(BENCHMARKS))
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change flagged as a regression')
+    args = parser.parse_args()
+    for name in args.names or BENCHMARKS:
+        print(f'== {name}')
+        _current = name
+        BENCHMARKS[name]()
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': sys.version.split()[0], 'decoder': decoding.backend, 'time': time.time(),
+                       'results': RESULTS}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        print(f'== compared with {args.compare}')
+        compare(baseline, args.threshold)
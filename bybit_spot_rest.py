@@ -1,11 +1,29 @@
 #%%
-import hashlib
-import hmac
-from urllib.parse import urlencode
+import collections
+import contextvars
+import datetime
+import sys
+import time
 
-import pandas as pd
 import requests
 
+import balance_state
+import batch
+import clients
+import clock_sync
+import coalescing
+import columnar
+import decoding
+import host_selection
+import instrumentation
+import instruments
+import mass_cancel
+import order_state
+import pagination
+import rate_limit
+import signing
+import transport
+
 
 API_KEY = None
 API_SECRET = None
@@ -25,8 +43,24 @@ user cancel_by_id = the rest are a bit dodgy
 
 
 '''
-api_limit_track_post = []
-api_limit_track_get = []
+def new_limiter():
+	''' Bybit spot allows GET 50/s sustained with bursts to 70/s, POST and DELETE 20/s with bursts to 50/s '''
+	return rate_limit.RateLimiter({
+		'GET': rate_limit.TokenBucket(rate=50, capacity=70),
+		'POST': rate_limit.TokenBucket(rate=20, capacity=50),
+		'DELETE': rate_limit.TokenBucket(rate=20, capacity=50),
+	})
+
+limiter = new_limiter()
+
+# per-endpoint call counts, errors and latency histograms; metrics.enabled = True to collect
+metrics = instrumentation.Metrics('bybit_spot', check=lambda response: http_error(response))
+
+# opt-in duplicate GETs to the other host for latency-critical reads, see enable_hedging
+hedger = host_selection.Hedger()
+
+api_limit_track_post = rate_limit.SlidingWindowCounter(window=120)
+api_limit_track_get = rate_limit.SlidingWindowCounter(window=120)
 
 
 #PUBLIC
@@ -53,54 +87,165 @@ _TRADE_HISTORY = '/spot/v1/myTrades'
 _WALLET = '/spot/v1/account'
 
 
-session = requests.session()
+# concurrent identical public GETs share one request; coalescer.set_ttl(endpoint, ms) to cache results too
+coalescer = coalescing.Coalescer([_SYMBOLS, _ORDERBOOK, _ORDERBOOK_MERGED, _TICKER24HR, _TICKERPRICE, _BOOKTICKER])
 
-def basic_request(method, endpoint, params=None):
-	global api_limit_track_post
-	global api_limit_track_get
+def new_order_store(owner=None):
+	''' Orders placed through owner (a client, default_client when None), as the last response showed them '''
+	bind = owner.call if owner else lambda func: func()
+	return order_state.OrderStore(order_state.bybit_fields, order_state.bybit_cancelled,
+									lambda resp: response_error(resp), lambda: bind(open_order_list))
 
-	if method == 'POST':
-		api_limit_track_post.append(pd.Timestamp.utcnow())
-	elif method == 'GET':
-		api_limit_track_get.append(pd.Timestamp.utcnow())
-	
-	print(endpoint)
-	return session.request(method, BASE_URL + endpoint, params=params).json()
+# order_store.start() to reconcile in the background
+order_store = new_order_store()
+
+session = transport.pooled_session()
+
+
+class BybitSpotClient(clients.Client):
+	''' Credentials, session, limiter, counters and order / balance stores of one Bybit account, see clients.py '''
+	module = sys.modules[__name__]
+	current = contextvars.ContextVar('bybit_spot_rest.client', default=None)
+
+	def __init__(self, api_key=None, api_secret=None, base_url=None, session=None, per_thread_sessions=False):
+		super().__init__(api_key, api_secret, base_url, session, per_thread_sessions)
+		self.limiter = new_limiter()
+		self.api_limit_track_post = rate_limit.SlidingWindowCounter(window=120)
+		self.api_limit_track_get = rate_limit.SlidingWindowCounter(window=120)
+		self.order_store = new_order_store(self)
+		self.balance_store = new_balance_store(self)
+
+
+def client():
+	''' The client bound to this context, default_client when there is none '''
+	return BybitSpotClient.current.get() or default_client
 
 
-def private_request(method, endpoint, params={}):
-	global api_limit_track_post
-	global api_limit_track_get
+def configure_pool(pool_size=10, max_per_host=10, block=False):
+	'''
+	pool_size 	integer 	number of hosts to keep connection pools for
+	max_per_host 	integer 	keep-alive connections kept open per host
+	block 	boolean 	wait for a free connection when all are busy
+	'''
+	transport.configure(client().session, pool_size, max_per_host, block)
+
+
+def connection_stats():
+	return transport.connection_stats(client().session)
 
+def track_request(method, endpoint, owner=None):
+	''' Wait for rate budget and count the request for check_api_limit. '''
+	owner = owner or client()
+	owner.limiter.acquire(method, endpoint)
 	if method == 'POST':
-		api_limit_track_post.append(pd.Timestamp.utcnow())
+		owner.api_limit_track_post.add()
 	elif method == 'GET':
-		api_limit_track_get.append(pd.Timestamp.utcnow())
+		owner.api_limit_track_get.add()
+
+
+def send(method, endpoint, func, *args, **kwargs):
+	''' func(*args, **kwargs), recorded under (method, endpoint) when metrics are enabled '''
+	if metrics.enabled:
+		return metrics.observe(method, endpoint, func, *args, **kwargs)
+	return func(*args, **kwargs)
+
+
+def send_to_host(method, endpoint, params, owner=None):
+	'''
+	Request on the client's base_url, BASE_URL when it has none. While host_selector is running a connection
+	failure is reported to it, which moves BASE_URL off that host; GETs are retried once on the new BASE_URL,
+	or for a client with its own base_url on the other host, other methods re-raise as they may have reached
+	the exchange. A client's base_url itself is left as it is.
+	'''
+	owner = owner or client()
+	session = owner.session
+	host = owner.base_url or BASE_URL
+	try:
+		return send(method, endpoint, session.request, method, host + endpoint, params=params)
+	except (requests.ConnectionError, requests.Timeout):
+		if not host_selector.running or host not in host_selector.stats:
+			raise
+		host_selector.failover(host)
+		retry = BASE_URL if owner.base_url is None else host_selector.best(exclude=(host,)) or next(
+			(other for other in host_selector.hosts if other != host), host)
+		if method != 'GET' or retry == host:
+			raise
+	return send(method, endpoint, session.request, method, retry + endpoint, params=params)
+
+
+def hedge_hosts():
+	''' The client's host (BASE_URL unless it has a base_url) first, then the other host_selector host '''
+	first = client().base_url or BASE_URL
+	return [first] + [host for host in host_selector.hosts if host != first][:1]
+
+
+def enable_hedging(endpoints=(_BOOKTICKER, _TICKERPRICE, _ORDERBOOK), quantile=0.95):
+	'''
+	Send GETs to these endpoints to the other host as well when BASE_URL is slower than its recent quantile latency.
+	Both requests are charged to the limiter. enable_hedging(()) turns hedging off.
+	'''
+	hedger.endpoints = set(endpoints)
+	hedger.quantile = quantile
+
+
+def basic_request(method, endpoint, params=None, raw=False, schema=None):
+	'''
+	raw 	boolean 	return the response body as bytes, without decoding it
+	schema 	optional; decode into this type, see decoding.decode
+	GETs to coalescer.endpoints are shared with identical concurrent calls and may come from its cache
+	'''
+	if method == 'GET' and endpoint in coalescer.endpoints:
+		key = (client().base_url or BASE_URL, tuple(sorted((params or {}).items())), raw, schema)
+		return coalescer.call(endpoint, key, uncoalesced_request, method, endpoint, params, raw, schema)
+	return uncoalesced_request(method, endpoint, params, raw, schema)
 
-	params.update(timestamp=create_ts())
-	params.update(api_key=API_KEY)
-	params = {k:params[k] for k in sorted(params)}
 
-	params_string = urlencode(params)
+def uncoalesced_request(method, endpoint, params=None, raw=False, schema=None):
+	owner = client()
+	track_request(method, endpoint, owner)
+	if endpoint in hedger.endpoints and method == 'GET':
+		call = lambda host: send(method, endpoint, owner.session.request, method, host + endpoint, params=params)
+		r = hedger.request(endpoint, call, hedge_hosts(), lambda: track_request(method, endpoint, owner))
+	else:
+		r = send_to_host(method, endpoint, params, owner)
+	return r.content if raw else decoding.decode(r.content, schema)
 
-	signature = hmac.new(bytes(API_SECRET, 'utf-8'), params_string.encode('utf-8'), hashlib.sha256).hexdigest()
 
-	params.update(sign=signature)
+def private_request(method, endpoint, params=None, raw=False, schema=None):
+	owner = client()
+	track_request(method, endpoint, owner)
 
-	print(endpoint)
-	return session.request(method, BASE_URL + endpoint, params=params).json()
+	# a new dict: the caller's, or a shared default, would be signed by concurrent requests at once
+	params = dict(params or {}, timestamp=create_ts(), api_key=owner.api_key)
+	query = owner.signer(signing.BybitSigner).query(params)
+
+	r = send_to_host(method, endpoint, query, owner)
+	return r.content if raw else decoding.decode(r.content, schema)
 
 
 def create_ts():
-	return str(round(pd.Timestamp.utcnow().timestamp() * 1000))
+	''' Request timestamp in ms on the exchange clock once clock has synced, the local clock before that '''
+	return str(clock.now_ms())
 
 
 def server_time():
 	return basic_request('GET', _SERVERTIME)
 
 
-def symbols():
-	return basic_request('GET', _SYMBOLS)
+def server_time_ms():
+	return int(server_time()['result']['serverTime'])
+
+
+# clock.start() to keep request timestamps inside recvWindow when the local clock drifts
+clock = clock_sync.ClockSync(server_time_ms)
+
+
+def symbols(raw=False, schema=None):
+	'''
+	raw 	boolean 	body as bytes, undecoded
+	schema 	optional; decode into this type, see decoding.decode
+	'''
+	return basic_request('GET', _SYMBOLS, raw=raw, schema=schema)
 
 
 def orderbook(symbol, **params):
@@ -122,27 +267,62 @@ def orderbook_merged(symbol, **params):
 	return basic_request('GET', _ORDERBOOK_MERGED, params)
 
 
-def trades(symbol, limit=60):
-	return basic_request('GET', _TRADES, {'limit': limit, 'symbol': symbol})
+def orderbook_snapshot(symbol, **params):
+	'''
+	orderbook() parsed into an orderbook.OrderBook of float64 arrays; use .merged(tick) instead of orderbook_merged
+	symbol 	true 	string 	Name of the trading pair
+	limit 	false 	integer 	Default value is 100
+	'''
+	import orderbook as books
+	return books.OrderBook.from_bybit(orderbook(symbol, **params))
+
+
+def shape_result(resp, schema, as_arrays=False, as_frame=False):
+	'''
+	resp unchanged, or its result as columnar.to_arrays / columnar.to_frame columns.
+	Raises RuntimeError on an error response when columns are asked for.
+	'''
+	if not (as_arrays or as_frame):
+		return resp
+	error = response_error(resp)
+	if error:
+		raise RuntimeError(error)
+	return (columnar.to_frame if as_frame else columnar.to_arrays)(resp['result'] or [], schema)
 
 
-def candlesticks(symbol, interval, **params):
+def trades(symbol, limit=60, as_arrays=False, as_frame=False):
+	'''
+	as_arrays 	false 	boolean 	{column: ndarray} instead of the response, see columnar.BYBIT_TRADES
+	as_frame 	false 	boolean 	pandas DataFrame of the same columns
+	'''
+	resp = basic_request('GET', _TRADES, {'limit': limit, 'symbol': symbol})
+	return shape_result(resp, columnar.BYBIT_TRADES, as_arrays, as_frame)
+
+
+def candlesticks(symbol, interval, as_arrays=False, as_frame=False, **params):
 	'''
 	symbol 	true 	string 	Name of the trading pair
 	interval 	true 	1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 12h, 1d, 1w, 1M
 	limit 	false 	integer 	Default value is 1000, max 1000
 	startTime 	false 	number 	Start time, unit in millisecond
 	endTime 	false 	number 	End time, unit in millisecond
+	as_arrays 	false 	boolean 	{column: ndarray} instead of the response, see columnar.BYBIT_KLINES
+	as_frame 	false 	boolean 	pandas DataFrame of the same columns
 
 	'''
 	params.update(symbol=symbol)
 	params.update(interval=interval)
-	return basic_request('GET', _KLINES, params)
+	return shape_result(basic_request('GET', _KLINES, params), columnar.BYBIT_KLINES, as_arrays, as_frame)
 
 
-def ticker_info(symbol=None):
+def ticker_info(symbol=None, raw=False, schema=None):
+	'''
+	symbol 	false 	string 	Name of the trading pair; every pair when omitted
+	raw 	boolean 	body as bytes, undecoded
+	schema 	optional; decode into this type, see decoding.decode
+	'''
 	symbol = {'symbol': symbol} if symbol else None
-	return basic_request('GET', _TICKER24HR, symbol)
+	return basic_request('GET', _TICKER24HR, symbol, raw=raw, schema=schema)
 
 
 def ticker_price(symbol=None):
@@ -171,36 +351,48 @@ def place_order(**params):
 		
 	'''
 
-	return private_request('POST', _ORDER, params)
+	return client().order_store.record(private_request('POST', _ORDER, params))
 
 
 def order_info(orderid):
-	return private_request('GET', _ORDER, {'orderId': orderid})
+	return client().order_store.record(private_request('GET', _ORDER, {'orderId': orderid}))
 
 
 def cancel_order(orderid):
-	return private_request('DELETE', _ORDER, {'orderId': orderid})
+	resp = private_request('DELETE', _ORDER, {'orderId': orderid})
+	return client().order_store.record_cancel(resp, order_ids=[orderid])
 
 
 def fast_cancel(symbolId, orderId):
-	return private_request('DELETE', _FAST_CANCEL, locals())
+	resp = private_request('DELETE', _FAST_CANCEL, {'symbolId': symbolId, 'orderId': orderId})
+	return client().order_store.record_cancel(resp, order_ids=[orderId])
 
 
 def cancel_all(symbol):
-	return private_request('DELETE', _BATCH_CANCEL, {'symbol': symbol})
+	return client().order_store.record_cancel_all(private_request('DELETE', _BATCH_CANCEL, {'symbol': symbol}), symbol)
 
 
 def fast_cancel_all(symbol):
-	return private_request('DELETE', _BATCH_FAST_CANCEL, {'symbol': symbol})
+	return client().order_store.record_cancel_all(private_request('DELETE', _BATCH_FAST_CANCEL, {'symbol': symbol}), symbol)
 
 
 def cancel_by_id(orderid):
 	''' Order ID, use commas to indicate multiple orderIds. Maximum of 100 ids. '''
-	return private_request('DELETE', _BATCH_CANCEL_IDS, {'orderIds': orderid})
+	resp = private_request('DELETE', _BATCH_CANCEL_IDS, {'orderIds': orderid})
+	failed = {str(line['orderId']) for line in resp.get('result') or ()}
+	return client().order_store.record_cancel(resp, order_ids=[i for i in str(orderid).split(',') if i not in failed])
 
 
 def open_orders(**params):
-	return private_request('GET', _OPEN_ORDERS, params)
+	'''
+	symbol 	false 	string 	Name of the trading pair
+	orderId 	false 	string 	Specify orderId to return all the orders that orderId of which are smaller than this particular one for pagination purpose
+	limit 	false 	integer 	Default value is 500, max 500
+	'''
+	sent = time.monotonic()
+	resp = private_request('GET', _OPEN_ORDERS, params)
+	complete = 'orderId' not in params and len(resp.get('result') or ()) < int(params.get('limit', 500))
+	return client().order_store.record_open(resp, sent, params.get('symbol'), complete)
 
 
 def order_history(**params):
@@ -212,7 +404,7 @@ def order_history(**params):
 	return private_request('GET', _ORDER_HISTORY, params)
 
 
-def trade_history(**params):
+def trade_history(as_arrays=False, as_frame=False, **params):
 	'''
 	symbol 	false 	string 	Name of the trading pair
 	limit 	false 	integer 	Default value is 50, max 50
@@ -220,8 +412,10 @@ def trade_history(**params):
 	toId 	false 	integer 	Query ends with the trade ID
 	startTime 	false 	long 	Start time
 	endTime 	false 	long 	End time
+	as_arrays 	false 	boolean 	{column: ndarray} instead of the response, see columnar.BYBIT_FILLS
+	as_frame 	false 	boolean 	pandas DataFrame of the same columns
 	'''
-	return private_request('GET', _TRADE_HISTORY, params)
+	return shape_result(private_request('GET', _TRADE_HISTORY, params), columnar.BYBIT_FILLS, as_arrays, as_frame)
 	
 
 def wallet_balance():
@@ -230,8 +424,9 @@ def wallet_balance():
 
 def ws_auth():
 	expires = int(create_ts()) + 1000
-	signature = str(hmac.new(bytes(API_SECRET, 'utf-8'), bytes(f'GET/realtime{expires}', "utf-8"), digestmod="sha256").hexdigest())
-	return {'op': 'auth', 'args': [API_KEY, expires, signature]}
+	owner = client()
+	signature = owner.signer(signing.BybitSigner).sign(f'GET/realtime{expires}'.encode())
+	return {'op': 'auth', 'args': [owner.api_key, expires, signature]}
 
 
 
@@ -256,6 +451,96 @@ def maker_sell(symbol, price, qty):
 	return maker_order(**params)
 
 
+def response_error(resp):
+	''' Error message of a failed response, None on success '''
+	return (resp.get('ret_msg') or resp.get('ret_code')) if resp.get('ret_code') else None
+
+
+def http_error(response):
+	''' response_error of an HTTP response; the body is only decoded when it does not read as a success '''
+	body = response.content
+	if b'"ret_code":0,' in body or b'"ret_code": 0,' in body:
+		return None
+	try:
+		return response_error(decoding.decode(body))
+	except Exception:  # never fail the request over its metrics
+		return 'undecodable response'
+
+
+def place_orders(orders, max_workers=10):
+	'''
+	orders 	list 	place_order parameter dicts
+	max_workers 	integer 	orders in flight at once
+	RETURNS list of batch.BatchResult(result, latency, error) in the order of orders
+	'''
+	return batch.fan_out(place_order, orders, max_workers, check=response_error)
+
+
+def paginate(func, start_time, end_time, page_limit, window=3_600_000, max_workers=4, **params):
+	'''
+	Generator over the records of func between start_time and end_time, oldest first.
+	func 	callable 	trade_history, candlesticks, ... anything taking startTime and endTime
+	start_time 	number 	milliseconds
+	end_time 	number 	milliseconds
+	page_limit 	integer 	most records one response of func holds (trade_history 50, candlesticks limit), full windows are split
+	window 	number 	milliseconds covered by one request
+	max_workers 	integer 	windows fetched concurrently
+	params 	passed on to func, e.g. symbol='BTCUSDT'
+	'''
+	def fetch(start, end):
+		resp = func(startTime=start, endTime=end, **params)
+		error = response_error(resp)
+		if error:
+			raise RuntimeError(error)
+		return resp['result'] or []
+	return pagination.paginate(fetch, int(start_time), int(end_time), window, page_limit, max_workers)
+
+
+INTERVAL_SECONDS = {'1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800, '1h': 3600, '2h': 7200,
+					'4h': 14400, '6h': 21600, '12h': 43200, '1d': 86400, '1w': 604800}
+
+
+def cached_candlesticks(symbol, interval, start_time, end_time, store=None):
+	'''
+	candlesticks() served from the local candle store; only ranges not cached yet are downloaded.
+	symbol 	string 	Name of the trading pair
+	interval 	string 	1m ... 1w; 1M has no fixed length and is not cached
+	start_time 	number 	milliseconds
+	end_time 	number 	milliseconds
+	store 	candle_cache.CandleStore, optional; defaults to candle_cache.DEFAULT_PATH
+	RETURNS read-only candle_cache.CANDLE_DTYPE array (time in milliseconds)
+	'''
+	import candle_cache
+	store = store or candle_cache.default_store()
+	resolution = INTERVAL_SECONDS[interval]
+
+	def fetch(start_ms, end_ms):
+		klines = paginate(candlesticks, start_ms, end_ms, window=resolution * 1000 * 900,
+						page_limit=1000, symbol=symbol, interval=interval, limit=1000)
+		return candle_cache.to_candles((int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+									for k in klines)
+	return store.get('bybit_spot', symbol, resolution, int(start_time), int(end_time), fetch)
+
+
+def iter_order_history(**params):
+	'''
+	Generator over order_history newest first, following the orderId cursor page by page.
+	symbol 	false 	string 	Name of the trading pair
+	limit 	false 	integer 	page size, max 500
+	'''
+	params.setdefault('limit', 500)
+	while True:
+		resp = order_history(**params)
+		error = response_error(resp)
+		if error:
+			raise RuntimeError(error)
+		page = resp['result'] or []
+		yield from page
+		if len(page) < params['limit']:
+			return
+		params['orderId'] = min(int(order['orderId']) for order in page)
+
+
 def all_open_orders(**params):
 	return open_orders(**params)
 
@@ -270,16 +555,40 @@ def open_orders_by_id(orderid, **params):
 	return open_orders(**params)
 
 
+def balance_records(resp):
+	error = response_error(resp)
+	if error is not None:
+		raise RuntimeError(error)
+	return resp['result']['balances']
+
+
+def new_balance_store(owner=None):
+	''' Wallet balances of owner (a client, default_client when None) as arrays by coin '''
+	bind = owner.call if owner else lambda func, *args, **kwargs: func(*args, **kwargs)
+	return balance_state.BalanceStore(lambda: bind(private_request, 'GET', _WALLET, raw=True), balance_records,
+										lambda: clock.now_ms())
+
+
+# balance_store.poll() returns only the coins that changed
+balance_store = new_balance_store()
+
+# module functions run on default_client unless a BybitSpotClient is bound; its settings are the module globals
+default_client = clients.default_client(
+	BybitSpotClient, api_key='API_KEY', api_secret='API_SECRET', base_url='BASE_URL', session='session',
+	limiter='limiter', api_limit_track_post='api_limit_track_post', api_limit_track_get='api_limit_track_get',
+	order_store='order_store', balance_store='balance_store')
+
+
 def balances():
-	coins_resp = wallet_balance()
-	#coins = {coin['coin']: {'free': coin['free'], 'total': coin['total'], 'locked': coin['locked']}for coin in coins['result']['balances']}
-	coins = {'last_update': create_ts()}
-	for line in coins_resp['result']['balances']:
-		sym = line['coin']
-		coins[f'{sym}_free'] = line['free']
-		coins[f'{sym}_locked'] = line['locked']
+	''' RETURNS {'last_update': ms string, 'BTC_free': number, 'BTC_locked': number, ...} '''
+	store = client().balance_store
+	store.poll()
+	return store.flat()
 
-	return coins
+
+# symbols() metadata, refreshed in the background after ttl seconds;
+# instrument_cache.use_snapshot('bybit_spot_instruments.json') persists it for warm starts
+instrument_cache = instruments.InstrumentCache(lambda: symbols()['result'], instruments.bybit_instrument, ttl=300)
 
 
 def pair_info():
@@ -299,74 +608,114 @@ def pair_info():
 	'category': 1,
 	'showStatus': True}
 	'''
+	return instrument_cache.raw()
 
 
+def open_order_list(**params):
+	''' RETURNS the open orders, raises RuntimeError when they cannot be listed '''
+	resp = open_orders(**params)
+	error = response_error(resp)
+	if error is not None:
+		raise RuntimeError(error)
+	return resp['result']
 
-	resp = symbols()
-	info = {}
-	for ticker in resp['result']:
-		info[ticker['name']] = ticker
-	return info
+
+def cancel_plan(orders, chunk_size=100):
+	'''
+	Cancel requests for orders, whichever way takes fewer of them:
+	fast_cancel_all once per symbol, or cancel_by_id per chunk_size ids (fast_cancel for a lone id).
+	RETURNS list of mass_cancel.Cancel
+	'''
+	by_symbol = collections.defaultdict(list)
+	for order in orders:
+		by_symbol[order['symbol']].append(order)
+	chunks = mass_cancel.chunked(orders, chunk_size)
+	if len(by_symbol) <= len(chunks):
+		return [mass_cancel.Cancel(symbol, fast_cancel_all, {'symbol': symbol}, len(group))
+				for symbol, group in by_symbol.items()]
+	cancels = []
+	for i, chunk in enumerate(chunks):
+		key = f'ids {i * chunk_size}-{i * chunk_size + len(chunk) - 1}'
+		if len(chunk) == 1:
+			params = {'symbolId': chunk[0]['symbol'], 'orderId': chunk[0]['orderId']}
+			cancels.append(mass_cancel.Cancel(key, fast_cancel, params, 1))
+		else:
+			params = {'orderid': ','.join(order['orderId'] for order in chunk)}
+			cancels.append(mass_cancel.Cancel(key, cancel_by_id, params, len(chunk)))
+	return cancels
+
+
+def mass_cancel_orders(symbol=None, max_workers=10, rounds=3):
+	'''
+	Cancel every open order (of symbol, when given) with concurrent requests, then list again until none is left.
+	symbol 	false 	string 	Name of the trading pair; fast_cancel_all is sent for it before anything is listed
+	max_workers 	false 	integer 	cancel requests in flight at once
+	rounds 	false 	integer 	cancel rounds at most, each followed by a listing
+	RETURNS mass_cancel.CancelReport(latency, rounds, remaining, chunks); remaining == [] when flat
+	'''
+	params = {'symbol': symbol} if symbol else {}
+	first = [mass_cancel.Cancel(symbol, fast_cancel_all, {'symbol': symbol}, None)] if symbol else None
+	return mass_cancel.flatten(lambda: open_order_list(**params), cancel_plan, first, max_workers, rounds,
+								check=response_error)
 
 
 def cancel_all_orders():
-	orders = all_open_orders()
-	try:
-		order_ids = [line['orderId'] for line in orders['result']]
-		if order_ids:
-			cancel_by_id(','.join(order_ids))
-	except Exception as e:
-		print(e)
+	''' RETURNS mass_cancel.CancelReport, see mass_cancel_orders '''
+	return mass_cancel_orders()
 
 
 def check_api_limit():
-	global api_limit_track_post
-	global api_limit_track_get
+	''' [GET, POST] requests made in the last two minutes '''
+	owner = client()
+	return [owner.api_limit_track_get.count(), owner.api_limit_track_post.count()]
 
-	two_min_ago = pd.Timestamp.utcnow() - pd.Timedelta(minutes=2)
-	api_limit_track_post = [i for i in api_limit_track_post if i > two_min_ago]
-	api_limit_track_get = [i for i in api_limit_track_get if i > two_min_ago]
+def check_micro_api_limit():
+	''' [GET, POST] requests made in the last second '''
+	owner = client()
+	return [owner.api_limit_track_get.count(1), owner.api_limit_track_post.count(1)]
 
-	post_len = len(api_limit_track_post)
-	get_len = len(api_limit_track_get)
 
-	return [get_len, post_len]
 
-def check_micro_api_limit():
-	global api_limit_track_post
-	global api_limit_track_get
+def ticker_list():
+	return list(instrument_cache.all())
 
-	one_secs_ago = pd.Timestamp.utcnow() - pd.Timedelta(seconds=1)
 
-	post_len = len([i for i in api_limit_track_post if i > one_secs_ago])
-	get_len = len([i for i in api_limit_track_get if i > one_secs_ago])
+def instrument(symbol):
+	'''
+	RETURNS instruments.Instrument with numeric tick_size, lot_size, min_size and min_notional
+	'''
+	return instrument_cache.get(symbol)
 
-	return [get_len, post_len]
 
+def probe_host(host):
+	limiter.acquire('GET', _SERVERTIME)
+	session.get(host + _SERVERTIME, timeout=5).raise_for_status()
 
 
-def ticker_list():
-	sym = symbols()
-	return [i['name'] for i in sym['result']]
+def use_host(host):
+	global BASE_URL
+	BASE_URL = host
 
 
-def choose_optimal_server():
-	global BASE_URL
-	BASE_URL = BASE_PRIMARY_URL
-	primary = server_performance_tests()
-	BASE_URL = BASE_SECONDARY_URL
-	seconday = server_performance_tests()
-	if primary < seconday:
-		BASE_URL = BASE_PRIMARY_URL
+# host_selector.start() to probe both hosts in the background and follow the faster one
+host_selector = host_selection.HostSelector([BASE_PRIMARY_URL, BASE_SECONDARY_URL], probe_host, on_switch=use_host)
 
-	print(primary, seconday)
-	print(primary < seconday)
+
+def choose_optimal_server(rounds=11):
+	'''
+	Probe both hosts concurrently rounds times and switch BASE_URL to the one with the lower p95.
+	RETURNS host_selector.snapshot()
+	'''
+	for _ in range(rounds):
+		host_selector.probe_once()
+	host_selector.select_best()
+	return host_selector.snapshot()
 
 
 def server_performance_tests():
 	server_time()
-	now = pd.Timestamp.utcnow()
+	start = time.perf_counter_ns()
 	for _ in range(10):
 		server_time()
-	return (pd.Timestamp.utcnow() - now) / 10
+	return datetime.timedelta(microseconds=(time.perf_counter_ns() - start) / 10_000)
 # %%
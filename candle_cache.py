@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+""" NOTES:
+    On-disk candle store keyed by (exchange, symbol, resolution).
+    Every key is a directory holding
+        candles.npy     structured array sorted by time, opened memory-mapped
+        coverage.json   time ranges already fetched, [[start_ms, end_ms], ...] inclusive
+    get() fetches only the parts of the requested range not covered yet, merges them in and
+    returns a read-only memory-mapped slice, so cached ranges are served without copying.
+    Only closed candles count as covered; the candle still forming is fetched again next time.
+    A fetch that returns fewer candles than its range holds covers only the span it returned.
+    Each key has its own lock, so fetches for different keys run at the same time.
+"""
+
+DEFAULT_PATH = 'candle_cache'
+
+CANDLE_DTYPE = np.dtype([('time', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+                         ('close', 'f8'), ('volume', 'f8')])
+
+
+def to_candles(rows):
+    ''' rows    iterable of (time_ms, open, high, low, close, volume) '''
+    return np.array(list(rows), dtype=CANDLE_DTYPE)
+
+
+def missing_ranges(coverage, start, end):
+    ''' Parts of [start, end] not inside any covered range; coverage sorted and merged. '''
+    gaps = []
+    for covered_start, covered_end in coverage:
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            gaps.append([start, covered_start - 1])
+        start = max(start, covered_end + 1)
+    if start <= end:
+        gaps.append([start, end])
+    return gaps
+
+
+def returned_range(rows, start, end, step):
+    '''
+    The part of [start, end] a fetch returning rows covers: all of it when no candle is missing,
+    else from the first candle returned to the end of the last; None when nothing came back.
+    '''
+    first = -(-start // step) * step
+    if len(rows) >= (end - first) // step + 1:
+        return [start, end]
+    if not len(rows):
+        return None
+    return [max(start, int(rows['time'].min())), min(end, int(rows['time'].max()) + step - 1)]
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class CandleStore:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.stats = {'hits': 0, 'misses': 0, 'fetches': 0, 'fetched_rows': 0}
+        self._maps = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, exchange, symbol, resolution):
+        return os.path.join(self.path, exchange, symbol.replace('/', '_'), str(resolution))
+
+    def _key_lock(self, directory):
+        with self._lock:
+            return self._locks.setdefault(directory, threading.Lock())
+
+    def _count(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                self.stats[name] += n
+
+    def coverage(self, exchange, symbol, resolution):
+        try:
+            with open(os.path.join(self._dir(exchange, symbol, resolution), 'coverage.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def candles(self, exchange, symbol, resolution):
+        ''' Every cached candle of the key, memory-mapped. '''
+        directory = self._dir(exchange, symbol, resolution)
+        candles = self._maps.get(directory)
+        if candles is None:
+            try:
+                candles = np.load(os.path.join(directory, 'candles.npy'), mmap_mode='r')
+            except FileNotFoundError:
+                candles = np.empty(0, CANDLE_DTYPE)
+            self._maps[directory] = candles
+        return candles
+
+    def _store(self, exchange, symbol, resolution, rows, covered):
+        directory = self._dir(exchange, symbol, resolution)
+        os.makedirs(directory, exist_ok=True)
+        # newly fetched rows first, so they win over cached rows of the same time
+        combined = np.concatenate([rows, self.candles(exchange, symbol, resolution)])
+        _, first = np.unique(combined['time'], return_index=True)
+        candles = combined[first]
+        self._maps.pop(directory, None)
+        tmp = os.path.join(directory, 'candles.tmp.npy')
+        np.save(tmp, candles)
+        os.replace(tmp, os.path.join(directory, 'candles.npy'))
+        coverage = merge_ranges(self.coverage(exchange, symbol, resolution) + covered)
+        with open(os.path.join(directory, 'coverage.tmp.json'), 'w') as f:
+            json.dump(coverage, f)
+        os.replace(os.path.join(directory, 'coverage.tmp.json'), os.path.join(directory, 'coverage.json'))
+
+    def get(self, exchange, symbol, resolution, start, end, fetch):
+        '''
+        exchange    string      e.g. 'ftx', 'bybit_spot'
+        resolution  integer     candle length in seconds
+        start, end  integer     milliseconds, inclusive
+        fetch       callable    fetch(start_ms, end_ms) -> CANDLE_DTYPE array for that range
+        RETURNS read-only CANDLE_DTYPE array of the candles starting in [start, end]
+        '''
+        step = resolution * 1000
+        with self._key_lock(self._dir(exchange, symbol, resolution)):
+            gaps = missing_ranges(self.coverage(exchange, symbol, resolution), start, end)
+            if gaps:
+                self._count(misses=1)
+                forming = time.time_ns() // 1_000_000 // step * step
+                rows, covered = [], []
+                for gap_start, gap_end in gaps:
+                    fetched = fetch(gap_start, gap_end)
+                    self._count(fetches=1, fetched_rows=len(fetched))
+                    rows.append(fetched)
+                    span = returned_range(fetched, gap_start, gap_end, step)
+                    if span is not None and span[0] < forming:
+                        covered.append([span[0], min(span[1], forming - 1)])
+                self._store(exchange, symbol, resolution, np.concatenate(rows), covered)
+            else:
+                self._count(hits=1)
+            candles = self.candles(exchange, symbol, resolution)
+        times = candles['time']
+        return candles[np.searchsorted(times, start):np.searchsorted(times, end, side='right')]
+
+
+_default_store = None
+
+
+def default_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = CandleStore()
+    return _default_store
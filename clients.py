@@ -0,0 +1,145 @@
+import functools
+import threading
+
+import transport
+
+""" NOTES:
+    Several sets of credentials in one process.
+    A Client holds what used to be module settings: api_key, api_secret, base_url, its own session,
+    rate limiter, check_api_limit counters and order / balance stores. Every function of its module
+    is available as a method that runs with the client bound:
+        main = ftx_rest.FtxClient(API_KEY, API_SECRET)
+        hedge = ftx_rest.FtxClient(OTHER_KEY, OTHER_SECRET, subaccount='hedge')
+        main.place_order(market='BTC/USD', ...)
+        with hedge.bound():
+            ftx_rest.open_orders()      module functions use the bound client
+    With no client bound the module functions use module.default_client, whose settings are the
+    module globals (API_KEY, BASE_URL, session, ...), so existing code and configuration keep working.
+    The binding is a contextvars.ContextVar, so it belongs to one thread or asyncio task;
+    batch.executor() runs every call in a copy of the submitting context and carries it along.
+    A client with base_url None follows module.BASE_URL, and the host selection that moves it.
+    The instrument cache, coalescer, hedger, host selector, clock and metrics stay shared:
+    they describe the exchange, not an account.
+    per_thread_sessions gives every thread its own session (and connection pool) instead of one shared one.
+"""
+
+
+class ModuleAttribute:
+    ''' Client attribute kept in a module global, used by the default client '''
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, client, owner=None):
+        if client is None:
+            return self
+        return getattr(client.module, self.name)
+
+    def __set__(self, client, value):
+        setattr(client.module, self.name, value)
+
+
+class Client:
+    module = None
+    current = None      # contextvars.ContextVar holding the bound client, set by each subclass
+
+    def __init__(self, api_key=None, api_secret=None, base_url=None, session=None, per_thread_sessions=False):
+        '''
+        api_key, api_secret     string      credentials of this client
+        base_url                string      optional; default follows module.BASE_URL
+        session                 requests.Session    optional; default a new pooled session
+        per_thread_sessions     boolean     a pooled session per thread instead of one shared session
+        '''
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.base_url = base_url
+        self.shared_session = session or transport.pooled_session()
+        self.per_thread_sessions = per_thread_sessions
+        self._local = threading.local()
+        self._signer = None
+
+    def signer(self, cls):
+        ''' The cls signer (see signing.py) of api_secret, built once and again only when api_secret changes '''
+        cached = self._signer
+        secret = self.api_secret
+        if cached is None or cached[0] is not cls or cached[1] != secret:
+            cached = self._signer = (cls, secret, cls(secret))
+        return cached[2]
+
+    @property
+    def session(self):
+        if not self.per_thread_sessions:
+            return self.shared_session
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = transport.pooled_session()
+        return session
+
+    def call(self, func, *args, **kwargs):
+        ''' func(*args, **kwargs) with this client bound '''
+        token = self.current.set(self)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.current.reset(token)
+
+    def bound(self):
+        ''' Context manager binding this client for the module functions called inside it '''
+        return _Binding(self)
+
+    def __getattr__(self, name):
+        func = getattr(self.module, name)
+        if name.startswith('_') or not callable(func):
+            raise AttributeError(name)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+        return call
+
+
+class _Binding:
+    def __init__(self, client):
+        self.client = client
+        self.token = None
+
+    def __enter__(self):
+        self.token = self.client.current.set(self.client)
+        return self.client
+
+    def __exit__(self, *exc):
+        self.client.current.reset(self.token)
+
+
+class SessionOverride:
+    '''
+    client with requests sent through session instead of its own; credentials, base_url, limiter,
+    counters and stores are still client's, read through (the default client's stay the module globals)
+    '''
+    def __init__(self, client, session):
+        self.client = client
+        self.session = session
+
+    def call(self, func, *args, **kwargs):
+        ''' func(*args, **kwargs) with this override bound '''
+        token = self.client.current.set(self)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.client.current.reset(token)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def default_client(cls, **settings):
+    '''
+    The module's default client: an instance of cls whose attributes are the module globals named in
+    settings, read and written through, e.g. default_client(FtxClient, api_key='API_KEY', ...)
+    settings must name every attribute cls.__init__ would set other than per_thread_sessions.
+    '''
+    attributes = {attr: ModuleAttribute(name) for attr, name in settings.items()}
+    client = object.__new__(type('Default' + cls.__name__, (cls,), attributes))
+    client.per_thread_sessions = False
+    client._local = threading.local()
+    client._signer = None
+    return client
@@ -0,0 +1,78 @@
+import statistics
+import threading
+import time
+
+""" NOTES:
+    Local-to-exchange clock offset for request timestamps.
+    Each sample brackets one server time call between two local clock reads:
+        rtt     = t1 - t0
+        offset  = server - (t0 + t1) / 2
+    the same estimate NTP makes, assuming the request and response legs take equal time.
+    The offset error is at most rtt / 2, so sync() keeps only the `best` samples with the
+    lowest rtt and takes their median offset.
+    Until the first sync() the offset is 0 and now_ms() is the local wall clock.
+        clock.start()       sync now, then again every interval seconds on a daemon thread
+        clock.now_ms()      corrected epoch milliseconds
+"""
+
+
+class ClockSync:
+    def __init__(self, server_time_ms, samples=8, best=3, interval=60):
+        '''
+        server_time_ms  callable    returns the exchange clock in epoch milliseconds
+        samples         integer     server time calls per sync
+        best            integer     lowest-rtt samples the offset is taken from
+        interval        number      seconds between background syncs
+        '''
+        self.server_time_ms = server_time_ms
+        self.samples = samples
+        self.best = best
+        self.interval = interval
+        self.offset_ns = 0
+        self.rtt_ns = None
+        self.updated = None
+        self.last_error = None
+        self.running = False
+        self._stop = threading.Event()
+
+    def sample(self):
+        ''' RETURNS (rtt_ns, offset_ns) of one server time call '''
+        t0 = time.time_ns()
+        server_ms = self.server_time_ms()
+        t1 = time.time_ns()
+        # the server truncates to whole milliseconds, its true time is on average half a millisecond later
+        return t1 - t0, server_ms * 1_000_000 + 500_000 - (t0 + t1) // 2
+
+    def sync(self):
+        best = sorted(self.sample() for _ in range(self.samples))[:self.best]
+        self.offset_ns = int(statistics.median(offset for _, offset in best))
+        self.rtt_ns = best[0][0]
+        self.updated = time.time()
+        return self.offset_ns
+
+    def now_ns(self):
+        return time.time_ns() + self.offset_ns
+
+    def now_ms(self):
+        return (time.time_ns() + self.offset_ns) // 1_000_000
+
+    def start(self, interval=None):
+        ''' Sync once now, then every interval seconds (default self.interval) until stop(); no-op while running. '''
+        if self.running:
+            return
+        stop = self._stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval or self.interval):
+                try:
+                    self.sync()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = e
+        self.sync()
+        self.running = True
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.running = False
@@ -0,0 +1,108 @@
+import collections
+import copy
+import threading
+import time
+
+""" NOTES:
+    Single-flight coalescing and a millisecond micro-cache for public GETs.
+    Concurrent calls with the same key share one in-flight request: the first caller fetches, the
+    others wait for its result (or its exception). With a ttl set for the endpoint the result is
+    also served from memory for ttl_ms after it arrived.
+    The caller that fetched gets the decoded response itself; coalesced callers and cache hits each
+    get their own deep copy, so a caller mutating its result does not change anyone else's.
+        ftx_rest.coalescer.set_ttl(ftx_rest._SINGLE_MARKET, 50)
+        ftx_rest.coalescer.snapshot()   {'/markets/{symbol}': {'calls': 9, 'fetches': 2, 'hits': 5, 'coalesced': 2}}
+"""
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class EndpointCounters:
+    def __init__(self):
+        self.calls = 0
+        self.fetches = 0
+        self.hits = 0
+        self.coalesced = 0
+
+
+class Coalescer:
+    def __init__(self, endpoints=()):
+        '''
+        endpoints   iterable    endpoints whose calls are coalesced
+        '''
+        self.endpoints = set(endpoints)
+        self.ttls = {}
+        self.cache = {}
+        self.counters = collections.defaultdict(EndpointCounters)
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def set_ttl(self, endpoint, ttl_ms):
+        ''' Serve endpoint results from memory for ttl_ms milliseconds; 0 turns the cache off. '''
+        with self._lock:
+            if ttl_ms:
+                self.ttls[endpoint] = ttl_ms * 1_000_000
+            else:
+                self.ttls.pop(endpoint, None)
+            self.cache = {key: entry for key, entry in self.cache.items() if key[0] in self.ttls}
+
+    def call(self, endpoint, key, func, *args, **kwargs):
+        '''
+        func(*args, **kwargs), shared with every concurrent call of the same key
+        key     hashable    identifies the request, e.g. (endpoint, sorted params)
+        '''
+        key = (endpoint, key)
+        with self._lock:
+            counters = self.counters[endpoint]
+            counters.calls += 1
+            entry = self.cache.get(key)
+            hit = entry is not None and entry[0] > time.monotonic_ns()
+            if hit:
+                counters.hits += 1
+            else:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = Flight()
+                    counters.fetches += 1
+                else:
+                    flight.waiters += 1
+                    counters.coalesced += 1
+        if hit:
+            return copy.deepcopy(entry[1])
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+        result = None
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]  # later calls start a new flight, so flight.waiters is final
+                ttl = self.ttls.get(endpoint) if flight.error is None else None
+            if flight.waiters or ttl:
+                flight.result = copy.deepcopy(result)  # shared with the waiters and the cache, never returned
+                if ttl:
+                    with self._lock:
+                        self.cache[key] = (time.monotonic_ns() + ttl, flight.result)
+            flight.done.set()
+        return result
+
+    def clear(self):
+        with self._lock:
+            self.cache = {}
+
+    def snapshot(self):
+        return {endpoint: {'calls': c.calls, 'fetches': c.fetches, 'hits': c.hits, 'coalesced': c.coalesced}
+                for endpoint, c in list(self.counters.items())}
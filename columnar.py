@@ -0,0 +1,67 @@
+import operator
+
+""" NOTES:
+    Typed columns built straight from exchange records, without per-row dicts or DataFrames.
+    A schema is a list of (column, key, kind); key is a dict key or a list index, kind one of
+        'i8', 'f8', 'bool'   numbers or numeric strings
+        'id'                 integer id that may be null -> int64, -1 when null (FTX funding or liquidation fills)
+        'iso'                ISO-8601 UTC time string -> int64 milliseconds since epoch
+        ('buy', 'sell')      categorical -> int8 codes into that tuple, -1 when missing
+    to_arrays() returns {column: ndarray}; to_frame() the same as a pandas DataFrame
+    with categorical columns as pandas Categoricals.
+    Every time column is int64 epoch milliseconds, on either venue.
+    numpy and pandas are imported on first use, so importing the schemas costs nothing.
+"""
+
+FTX_TRADES = [('id', 'id', 'i8'), ('time', 'time', 'iso'), ('price', 'price', 'f8'), ('size', 'size', 'f8'),
+              ('side', 'side', ('buy', 'sell')), ('liquidation', 'liquidation', 'bool')]
+
+FTX_CANDLES = [('time', 'time', 'i8'), ('open', 'open', 'f8'), ('high', 'high', 'f8'), ('low', 'low', 'f8'),
+               ('close', 'close', 'f8'), ('volume', 'volume', 'f8')]
+
+FTX_FILLS = [('id', 'id', 'i8'), ('time', 'time', 'iso'), ('orderId', 'orderId', 'id'),
+             ('tradeId', 'tradeId', 'id'), ('side', 'side', ('buy', 'sell')), ('price', 'price', 'f8'),
+             ('size', 'size', 'f8'), ('fee', 'fee', 'f8'), ('feeRate', 'feeRate', 'f8'),
+             ('liquidity', 'liquidity', ('maker', 'taker'))]
+
+BYBIT_TRADES = [('time', 'time', 'i8'), ('price', 'price', 'f8'), ('qty', 'qty', 'f8'),
+                ('isBuyerMaker', 'isBuyerMaker', 'bool')]
+
+BYBIT_KLINES = [('time', 0, 'i8'), ('open', 1, 'f8'), ('high', 2, 'f8'), ('low', 3, 'f8'), ('close', 4, 'f8'),
+                ('volume', 5, 'f8'), ('closeTime', 6, 'i8'), ('quoteVolume', 7, 'f8'), ('trades', 8, 'i8'),
+                ('takerBaseVolume', 9, 'f8'), ('takerQuoteVolume', 10, 'f8')]
+
+BYBIT_FILLS = [('id', 'id', 'i8'), ('time', 'time', 'i8'), ('orderId', 'orderId', 'i8'), ('price', 'price', 'f8'),
+               ('qty', 'qty', 'f8'), ('commission', 'commission', 'f8'), ('isBuyer', 'isBuyer', 'bool'),
+               ('isMaker', 'isMaker', 'bool')]
+
+
+def _iso_utc(value):
+    return value[:-6] if value.endswith('+00:00') else value
+
+
+def _column(np, records, key, kind):
+    values = map(operator.itemgetter(key), records)
+    count = len(records)
+    if isinstance(kind, tuple):
+        codes = {category: code for code, category in enumerate(kind)}
+        return np.fromiter((codes.get(v, -1) for v in values), np.int8, count)
+    if kind == 'iso':
+        return np.array(list(map(_iso_utc, values)), dtype='datetime64[ms]').view(np.int64)
+    if kind == 'id':
+        return np.fromiter((-1 if v is None else v for v in values), np.int64, count)
+    return np.fromiter(values, kind, count)
+
+
+def to_arrays(records, schema):
+    import numpy as np
+    return {column: _column(np, records, key, kind) for column, key, kind in schema}
+
+
+def to_frame(records, schema):
+    import pandas as pd
+    columns = to_arrays(records, schema)
+    for column, key, kind in schema:
+        if isinstance(kind, tuple):
+            columns[column] = pd.Categorical.from_codes(columns[column], categories=list(kind))
+    return pd.DataFrame(columns, copy=False)
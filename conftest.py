@@ -0,0 +1,43 @@
+import pytest
+
+import bybit_spot_rest
+import ftx_rest
+import stub_server
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    '''
+    serve(**options) starts a stub server as stub_server.start does and points ftx_rest and
+    bybit_spot_rest at it with credentials key / secret; RETURNS (server, url).
+    Every server started is shut down after the test, whether it passed or not.
+    '''
+    servers = []
+
+    def start(**options):
+        server, url = stub_server.start(**options)
+        servers.append(server)
+        monkeypatch.setattr(ftx_rest, 'BASE_URL', url + '/api')
+        monkeypatch.setattr(bybit_spot_rest, 'BASE_URL', url)
+        for module in (ftx_rest, bybit_spot_rest):
+            monkeypatch.setattr(module, 'API_KEY', 'key')
+            monkeypatch.setattr(module, 'API_SECRET', 'secret')
+        return server, url
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def stub_url(serve):
+    ''' Both modules pointed at a stub server that accepts any credentials '''
+    server, url = serve()
+    return url
+
+
+@pytest.fixture
+def exchange(serve):
+    ''' Both modules pointed at a stub server that checks the credentials key / secret; the server '''
+    server, url = serve(api_key='key', api_secret='secret')
+    return server
@@ -0,0 +1,48 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+""" NOTES:
+    Response body decoding shared by both modules.
+    The fastest installed parser is used: orjson, then msgspec, then the stdlib json module.
+    use('json') forces a backend.
+    decode(content, schema) decodes into a pre-declared schema: a msgspec type (e.g. a Struct
+    declaring only the fields needed, the rest is skipped without being built) when msgspec is
+    installed, or any callable applied to the decoded object.
+"""
+
+BACKENDS = {'json': json.loads}
+if msgspec is not None:
+    BACKENDS['msgspec'] = msgspec.json.Decoder().decode
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+
+backend = next(name for name in ('orjson', 'msgspec', 'json') if name in BACKENDS)
+loads = BACKENDS[backend]
+
+
+def use(name):
+    ''' name    string  orjson, msgspec or json '''
+    global backend, loads
+    loads = BACKENDS[name]
+    backend = name
+
+
+def decode(content, schema=None):
+    '''
+    content     bytes       response body
+    schema      optional; msgspec type or callable to build the result from the decoded object
+    '''
+    if schema is None:
+        return loads(content)
+    if msgspec is not None and isinstance(schema, type) and issubclass(schema, msgspec.Struct):
+        return msgspec.json.decode(content, type=schema)
+    return schema(loads(content))
@@ -1,15 +1,32 @@
+import collections
+import contextvars
 import json
+import sys
 import time
 import datetime
 import hashlib
-import hmac
 import configparser
 from urllib import parse
 from urllib.parse import urlencode
 
-import pandas as pd
 import requests
 
+import balance_state
+import batch
+import clients
+import clock_sync
+import coalescing
+import columnar
+import decoding
+import instrumentation
+import instruments
+import mass_cancel
+import order_state
+import pagination
+import rate_limit
+import signing
+import transport
+
 """ NOTES:
     1. Configuration for API_KEY and API_SECRET
        Update CONFIG_PATH with path to your API key file, its a configuration file in ini format as below
@@ -18,6 +35,7 @@ import requests
         API_SECRET=xxxxxxxx
     2. Default sub account
         Update DEFAULT_SUBACCOUNT in case you want to use a specific sub account
+        Private calls taking subaccount= use that sub account for the one call instead; 'main' is the main account
     3. Common parameters:
         FTX Supports pagination on most of the REST APIs, below parameters are common-
         start_time    false   number  filter starting time in seconds
@@ -127,49 +145,141 @@ _LENDING_OFFERS = "/spot_margin/offers" # SAME FOR SUBMITTING OFFER
 _LENDING_INFO = "/spot_margin/lending_info"
 
 
-api_limit_track_post = []
-api_limit_track_get = []
+def new_limiter():
+    ''' FTX allows 30 requests per 200ms across all methods, so they draw on one bucket; weights per endpoint '''
+    bucket = rate_limit.TokenBucket(rate=150, capacity=30)
+    return rate_limit.RateLimiter({'GET': bucket, 'POST': bucket, 'DELETE': bucket})
+
+limiter = new_limiter()
+
+# per-endpoint call counts, errors and latency histograms; metrics.enabled = True to collect
+metrics = instrumentation.Metrics('ftx', check=lambda response: http_error(response))
+
+# concurrent identical public GETs share one request; coalescer.set_ttl(endpoint, ms) to cache results too
+coalescer = coalescing.Coalescer([_MARKETS, _SINGLE_MARKET, _ORDER_BOOK])
+
+def new_order_store(owner=None):
+    ''' Orders placed through owner (a client, default_client when None), as the last response showed them '''
+    bind = owner.call if owner else lambda func: func()
+    return order_state.OrderStore(order_state.ftx_fields, order_state.ftx_cancelled,
+                                  lambda resp: response_error(resp), lambda: bind(open_order_list))
+
+# order_store.start() to reconcile in the background
+order_store = new_order_store()
+
+api_limit_track_post = rate_limit.SlidingWindowCounter(window=120)
+api_limit_track_get = rate_limit.SlidingWindowCounter(window=120)
+
+
+
+session = transport.pooled_session()
+
 
+class FtxClient(clients.Client):
+    '''
+    Credentials, session, limiter, counters and order / balance stores of one FTX account, see clients.py
+    subaccount      string      optional; FTX-SUBACCOUNT of every request, like DEFAULT_SUBACCOUNT
+    '''
+    module = sys.modules[__name__]
+    current = contextvars.ContextVar('ftx_rest.client', default=None)
+
+    def __init__(self, api_key=None, api_secret=None, subaccount=None, base_url=None, session=None,
+                 per_thread_sessions=False):
+        super().__init__(api_key, api_secret, base_url, session, per_thread_sessions)
+        self.subaccount = subaccount
+        self.limiter = new_limiter()
+        self.api_limit_track_post = rate_limit.SlidingWindowCounter(window=120)
+        self.api_limit_track_get = rate_limit.SlidingWindowCounter(window=120)
+        self.order_store = new_order_store(self)
+        self.balance_store = new_balance_store(self)
 
 
-session = requests.session()
+def client():
+    ''' The client bound to this context, default_client when there is none '''
+    return FtxClient.current.get() or default_client
+
+def configure_pool(pool_size=10, max_per_host=10, block=False):
+    '''
+    pool_size       integer     number of hosts to keep connection pools for
+    max_per_host    integer     keep-alive connections kept open per host
+    block           boolean     wait for a free connection when all are busy
+    '''
+    transport.configure(client().session, pool_size, max_per_host, block)
 
-def basic_request(method, endpoint, url_params={}, params={}, json={}, data={}):
-    global api_limit_track_post
-    global api_limit_track_get
+def connection_stats():
+    return transport.connection_stats(client().session)
 
+def track_request(method, endpoint, owner=None):
+    ''' Wait for rate budget and count the request for check_api_limit. '''
+    owner = owner or client()
+    owner.limiter.acquire(method, endpoint)
     if method == 'POST':
-        api_limit_track_post.append(pd.Timestamp.utcnow())
+        owner.api_limit_track_post.add()
     elif method == 'GET':
-        api_limit_track_get.append(pd.Timestamp.utcnow())
-    
-    print(endpoint)
-    return session.request(method, BASE_URL + endpoint.format(**url_params), params=params, json=json, data=data).json()
+        owner.api_limit_track_get.add()
+
+def send(method, endpoint, func, *args, **kwargs):
+    ''' func(*args, **kwargs), recorded under (method, endpoint) when metrics are enabled '''
+    if metrics.enabled:
+        return metrics.observe(method, endpoint, func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+def basic_request(method, endpoint, url_params={}, params={}, json={}, data={}, raw=False, schema=None):
+    '''
+    raw     boolean     return the response body as bytes, without decoding it
+    schema  optional; decode into this type, see decoding.decode
+    GETs to coalescer.endpoints are shared with identical concurrent calls and may come from its cache
+    '''
+    if method == 'GET' and endpoint in coalescer.endpoints:
+        key = (client().base_url or BASE_URL, tuple(sorted(url_params.items())), tuple(sorted(params.items())),
+               raw, schema)
+        return coalescer.call(endpoint, key, uncoalesced_request, method, endpoint, url_params, params,
+                              json, data, raw, schema)
+    return uncoalesced_request(method, endpoint, url_params, params, json, data, raw, schema)
+
+def uncoalesced_request(method, endpoint, url_params={}, params={}, json={}, data={}, raw=False, schema=None):
+    owner = client()
+    track_request(method, endpoint, owner)
+    url = (owner.base_url or BASE_URL) + endpoint.format(**url_params)
+    r = send(method, endpoint, owner.session.request, method, url, params=params, json=json, data=data)
+    return r.content if raw else decoding.decode(r.content, schema)
 
 def sign_payload(api_secret, ts, method, path_url, body=None):
-    signature_payload = f'{ts}{method}{path_url}'.encode()
-    if body:
-        signature_payload = signature_payload + body
-    return hmac.new(api_secret.encode(), signature_payload, 'sha256').hexdigest()
-
-def private_request(method, endpoint, url_params={}, **kwargs):
-    ts = int(time.time() * 1000)
-    request = requests.Request(method, BASE_URL + endpoint.format(**url_params), **kwargs)
+    return signing.FtxSigner(api_secret).sign_request(ts, method, path_url, body)
+
+def nickname(subaccount):
+    ''' The FTX-SUBACCOUNT of subaccount: None for the main account, whether given as None or 'main' '''
+    return None if subaccount == 'main' else subaccount or None
+
+def private_request(method, endpoint, url_params={}, raw=False, schema=None, subaccount=None, **kwargs):
+    '''
+    subaccount  optional; nickname for this request only, 'main' for the main account, default the client's
+    '''
+    owner = client()
+    track_request(method, endpoint, owner)
+    ts = clock.now_ms()
+    request = requests.Request(method, (owner.base_url or BASE_URL) + endpoint.format(**url_params), **kwargs)
     prepared = request.prepare()
-    print(prepared.url)
-    signature = sign_payload(API_SECRET, ts, method, prepared.path_url, prepared.body)
-    prepared.headers['FTX-KEY'] = API_KEY
+    signature = owner.signer(signing.FtxSigner).sign_request(ts, method, prepared.path_url, prepared.body)
+    prepared.headers['FTX-KEY'] = owner.api_key
     prepared.headers['FTX-SIGN'] = signature
     prepared.headers['FTX-TS'] = str(ts)
-    if DEFAULT_SUBACCOUNT:
-        prepared.headers['FTX-SUBACCOUNT'] = DEFAULT_SUBACCOUNT
-    r = requests.session().send(prepared)
-    return r.json()
+    subaccount = nickname(subaccount or owner.subaccount)
+    if subaccount:
+        prepared.headers['FTX-SUBACCOUNT'] = parse.quote(subaccount)
+    r = send(method, endpoint, owner.session.send, prepared)
+    return r.content if raw else decoding.decode(r.content, schema)
 
 
 def server_time():
-    r = requests.get(_TIME).json()
+    r = client().session.get(_TIME).json()
     return datetime.datetime.fromisoformat(r['result'])
+
+def server_time_ms():
+    return int(server_time().timestamp() * 1000)
+
+# clock.start() to stamp private requests with the exchange clock instead of the local one
+clock = clock_sync.ClockSync(server_time_ms)
     
 """ SUBACCOUNTS API """
 def subaccounts():
@@ -220,8 +330,12 @@ def subaccount_transfer(coin, size, source=None, destination=None):
     return private_request("POST", _SUBACCOUNT_TRANSFER, json=json)
 
 """ MARKETS API """
-def symbols():
-    return basic_request("GET", _MARKETS)
+def symbols(raw=False, schema=None):
+    '''
+    raw     boolean     body as bytes, undecoded
+    schema  optional; decode into this type, see decoding.decode
+    '''
+    return basic_request("GET", _MARKETS, raw=raw, schema=schema)
     
 def quote(symbol):
     '''
@@ -238,28 +352,52 @@ def order_book(symbol, **params):
     url_params = {'symbol': symbol}
     return basic_request("GET", _ORDER_BOOK, url_params, params)
 
-def trades(symbol, **params):
+def order_book_snapshot(symbol, **params):
+    '''
+    order_book() parsed into an orderbook.OrderBook of float64 arrays
+    symbol  true    string  Name of the trading pair
+    depth   false   integer max 100, default 20
+    '''
+    import orderbook
+    return orderbook.OrderBook.from_ftx(order_book(symbol, **params))
+
+def shape_result(resp, schema, as_arrays=False, as_frame=False):
+    '''
+    resp unchanged, or its result as columnar.to_arrays / columnar.to_frame columns.
+    Raises RuntimeError on an error response when columns are asked for.
+    '''
+    if not (as_arrays or as_frame):
+        return resp
+    if not resp.get('success'):
+        raise RuntimeError(resp.get('error'))
+    return (columnar.to_frame if as_frame else columnar.to_arrays)(resp['result'], schema)
+
+def trades(symbol, as_arrays=False, as_frame=False, **params):
     '''
     symbol  true    string  Name of the trading pair
+    as_arrays   false   boolean {column: ndarray} instead of the response, see columnar.FTX_TRADES
+    as_frame    false   boolean pandas DataFrame of the same columns
     '''
     url_params = {'symbol': symbol}
-    return basic_request("GET", _TRADES, url_params, params)
+    return shape_result(basic_request("GET", _TRADES, url_params, params), columnar.FTX_TRADES, as_arrays, as_frame)
 
-def history(symbol, **params):
+def history(symbol, as_arrays=False, as_frame=False, **params):
     '''
     symbol      true    string  Name of the trading pair
     resolution  false   integer window length in seconds. options: 15, 60, 300, 900, 3600, 14400, 86400, or any multiple of 86400 up to 30*86400
     start_time    false   number  filter starting time in seconds
     end_time    false   number  filter ending time in seconds
+    as_arrays   false   boolean {column: ndarray} instead of the response, see columnar.FTX_CANDLES
+    as_frame    false   boolean pandas DataFrame of the same columns
     '''
     url_params = {'symbol': symbol}
-    return basic_request("GET", _HISTORY, url_params, params)
+    return shape_result(basic_request("GET", _HISTORY, url_params, params), columnar.FTX_CANDLES, as_arrays, as_frame)
 
-def account():
-    return private_request("GET", _ACCOUNT)
+def account(subaccount=None):
+    return private_request("GET", _ACCOUNT, subaccount=subaccount)
 
-def positions():
-    return private_request("GET", _POSITIONS)
+def positions(subaccount=None):
+    return private_request("GET", _POSITIONS, subaccount=subaccount)
 
 def set_leverage(leverage):
     '''
@@ -272,8 +410,8 @@ def set_leverage(leverage):
 def coins():
     return basic_request("GET", _WALLET_COINS)
 
-def balances():
-    return private_request("GET", _WALLET_BALANCES)
+def balances(subaccount=None):
+    return private_request("GET", _WALLET_BALANCES, subaccount=subaccount)
 
 def balances_all_accounts():
     return private_request("GET", _WALLET_ALL_BALANCES)
@@ -322,11 +460,16 @@ def saved_addresses(**params):
     return private_request("GET", _WALLET_SAVED_ADDRESSES, params=params)
 
 """ Order API"""
-def open_orders(**params):
+def open_orders(subaccount=None, **params):
     '''
         market	false   string	BTC-0329	optional; market to limit orders
+        subaccount	false	string	sub1	optional; the client's order_store only keeps the orders of its own subaccount
     '''
-    return private_request("GET", _ORDERS, params=params)
+    sent = time.monotonic()
+    resp = private_request("GET", _ORDERS, params=params, subaccount=subaccount)
+    if subaccount and nickname(subaccount) != nickname(client().subaccount):
+        return resp
+    return client().order_store.record_open(resp, sent, params.get('market'))
 
 def order_history(**params):
     '''
@@ -377,7 +520,7 @@ def place_order(**params):
     rejectOnPriceBand	boolean	false	optional; if the order should be rejected if its price would instead be adjusted due to price bands
     rejectAfterTs	    number	null	optional; if the order would be put into the placement queue after this timestamp, instead reject it. If it would be placed on the orderbook after the timestamp, then immediately close it instead (as if it were, for instance, a post-only order that would have taken)
     '''
-    return private_request("POST", _ORDERS, json=params)
+    return client().order_store.record(private_request("POST", _ORDERS, json=params))
 
 def place_trigger_order(**params):
     '''
@@ -407,8 +550,10 @@ def modify_order(order_id, **params):
     size	number	31431.0	optional; either price or size must be specified
     clientId	string	order1	optional; client ID for the modified order
     '''
-    return private_request("POST", _MODIFY_ORDER, url_params={'order_id': order_id},
+    resp = private_request("POST", _MODIFY_ORDER, url_params={'order_id': order_id},
                         json=params)
+    client().order_store.record_cancel(resp, order_ids=[order_id])
+    return client().order_store.record(resp)
 
 def modify_order_by_client_id(client_order_id, **params):
     '''
@@ -416,9 +561,11 @@ def modify_order_by_client_id(client_order_id, **params):
     size	number	31431.0	optional; either price or size must be specified
     clientId	string	order1	optional; client ID for the modified order
     '''
-    return private_request("POST", _MODIFY_ORDER_BY_CLIENT, 
+    resp = private_request("POST", _MODIFY_ORDER_BY_CLIENT, 
                         url_params={'client_order_id': client_order_id},
                         json=params)
+    client().order_store.record_cancel(resp, client_ids=[client_order_id])
+    return client().order_store.record(resp)
 
 def modify_trigger_order(order_id, **params):
     '''
@@ -439,16 +586,19 @@ def modify_trigger_order(order_id, **params):
     return private_request("POST", _MODIFY_TRIGGER_ORDER, url_params={"order_id": order_id}, json=params)
 
 def order_status(order_id):
-    return private_request("GET", _ORDER_STATUS, url_params={"order_id":order_id})
+    return client().order_store.record(private_request("GET", _ORDER_STATUS, url_params={"order_id":order_id}))
 
 def order_status_by_client_id(client_order_id):
-    return private_request("GET", _ORDER_STATUS_BY_CLIENT, url_params={"client_order_id":client_order_id})
+    return client().order_store.record(private_request("GET", _ORDER_STATUS_BY_CLIENT,
+                                              url_params={"client_order_id":client_order_id}))
 
 def cancel_order(order_id):
-    return private_request("DELETE", _CANCEL_ORDER, url_params={"order_id":order_id})
+    resp = private_request("DELETE", _CANCEL_ORDER, url_params={"order_id":order_id})
+    return client().order_store.record_cancel(resp, order_ids=[order_id])
 
 def cancel_order_by_client_id(client_order_id):
-    return private_request("DELETE", _CANCEL_ORDER_BY_CLIENT, url_params={"client_order_id":client_order_id})
+    resp = private_request("DELETE", _CANCEL_ORDER_BY_CLIENT, url_params={"client_order_id":client_order_id})
+    return client().order_store.record_cancel(resp, client_ids=[client_order_id])
 
 def cancel_trigger_order(order_id):
     return private_request("DELETE", _CANCEL_TRIGGER_ORDER, url_params={"order_id":order_id})
@@ -460,18 +610,23 @@ def cancel_all_orders(**params):
     conditionalOrdersOnly	boolean	false	optional; restrict to cancelling conditional orders only
     limitOrdersOnly	boolean	false	optional; restrict to cancelling existing limit orders (non-conditional orders) only
     '''
-    return private_request("DELETE", _ORDERS, json=params)
+    resp = private_request("DELETE", _ORDERS, json=params)
+    if params.get('conditionalOrdersOnly'):
+        return resp
+    return client().order_store.record_cancel_all(resp, params.get('market'), params.get('side'))
 
 
-def fills(**params):
+def fills(as_arrays=False, as_frame=False, **params):
     '''
     market	string	BTC-0329	optional; market to limit fills
     start_time	number	1564146934	optional; minimum time of fills to return, in Unix time (seconds since 1970-01-01)
     end_time	number	1564233334	optional; maximum time of fills to return, in Unix time (seconds since 1970-01-01)
     order	string	null	optional; default is descending, supply 'asc' to receive fills in ascending order of time
     orderId	number	null	
+    as_arrays	boolean	false	optional; {column: ndarray} instead of the response, see columnar.FTX_FILLS
+    as_frame	boolean	false	optional; pandas DataFrame of the same columns
     '''
-    return private_request("GET", _FILLS, params=params)
+    return shape_result(private_request("GET", _FILLS, params=params), columnar.FTX_FILLS, as_arrays, as_frame)
 
 def funding_payment(**params):
     '''
@@ -579,6 +734,71 @@ def maker_sell(market, price, size):
 	return maker_order(**params)
 
 
+def response_error(resp):
+	''' Error message of a failed response, None on success '''
+	return None if resp.get('success') else resp.get('error')
+
+
+def http_error(response):
+	''' response_error of an HTTP response; the body is only decoded when it does not read as a success '''
+	body = response.content
+	if b'"success":true' in body or b'"success": true' in body:
+		return None
+	try:
+		return response_error(decoding.decode(body))
+	except Exception:  # never fail the request over its metrics
+		return 'undecodable response'
+
+
+def place_orders(orders, max_workers=10):
+	'''
+	orders	        list	place_order parameter dicts
+	max_workers	    integer	orders in flight at once
+	RETURNS list of batch.BatchResult(result, latency, error) in the order of orders
+	'''
+	return batch.fan_out(place_order, orders, max_workers, check=response_error)
+
+
+def paginate(func, start_time, end_time, page_limit, window=86400, max_workers=4, **params):
+	'''
+	Generator over the records of func between start_time and end_time, oldest first.
+	func	        callable	history, fills, order_history, funding_payment, my_borrow_history, ...
+	start_time	    number	    seconds
+	end_time	    number	    seconds
+	page_limit	    integer	    most records one response of func holds (history 1500, fills 200), full windows are split
+	window	        number	    seconds covered by one request
+	max_workers	    integer	    windows fetched concurrently
+	params	        passed on to func, e.g. market='BTC/USD' or resolution=60 for history
+	'''
+	def fetch(start, end):
+		resp = func(start_time=start, end_time=end, **params)
+		if not resp.get('success'):
+			raise RuntimeError(resp.get('error'))
+		return resp['result']
+	return pagination.paginate(fetch, int(start_time), int(end_time), window, page_limit, max_workers)
+
+
+def cached_history(symbol, resolution, start_time, end_time, store=None):
+	'''
+	history() candles served from the local candle store; only ranges not cached yet are downloaded.
+	symbol	        string	Name of the trading pair
+	resolution	    integer	window length in seconds
+	start_time	    number	seconds
+	end_time	    number	seconds
+	store	        candle_cache.CandleStore, optional; defaults to candle_cache.DEFAULT_PATH
+	RETURNS read-only candle_cache.CANDLE_DTYPE array (time in milliseconds)
+	'''
+	import candle_cache
+	store = store or candle_cache.default_store()
+
+	def fetch(start_ms, end_ms):
+		candles = paginate(history, start_ms // 1000, end_ms // 1000, window=resolution * 1000,
+						page_limit=1500, symbol=symbol, resolution=resolution)
+		return candle_cache.to_candles((int(c['time']), c['open'], c['high'], c['low'], c['close'], c['volume'])
+									for c in candles)
+	return store.get('ftx', symbol, resolution, int(start_time * 1000), int(end_time * 1000), fetch)
+
+
 def all_open_orders(**params):
 	return open_orders(**params)
 
@@ -587,26 +807,121 @@ def open_orders_by_symbol(market, **params):
 	params.update(market=market)
 	return open_orders(**params)
 
+
+def open_order_list(**params):
+	''' RETURNS the open orders, raises RuntimeError when they cannot be listed '''
+	resp = open_orders(**params)
+	if not resp.get('success'):
+		raise RuntimeError(resp.get('error'))
+	return resp['result']
+
+
+def cancel_plan(orders):
+	''' One cancel_all_orders(market=...) per market with open orders; RETURNS list of mass_cancel.Cancel '''
+	markets = collections.Counter(order['market'] for order in orders)
+	return [mass_cancel.Cancel(market, cancel_all_orders, {'market': market}, count)
+			for market, count in markets.items()]
+
+
+def mass_cancel_orders(markets=None, max_workers=10, rounds=3):
+	'''
+	Cancel open orders market by market with concurrent requests, then list again until none is left.
+	markets	        list	optional; cancelled before anything is listed, and the only markets verified
+	max_workers	    integer	cancel requests in flight at once
+	rounds	        integer	cancel rounds at most, each followed by a listing
+	RETURNS mass_cancel.CancelReport(latency, rounds, remaining, chunks); remaining == [] when flat
+	'''
+	list_open = open_order_list
+	first = None
+	if markets:
+		markets = set(markets)
+		list_open = lambda: [order for order in open_order_list() if order['market'] in markets]
+		first = [mass_cancel.Cancel(market, cancel_all_orders, {'market': market}, None) for market in markets]
+	return mass_cancel.flatten(list_open, cancel_plan, first, max_workers, rounds, check=response_error)
+
 """ Not supported """
 # def open_orders_by_id(orderid, **params):
 # 	params.update(orderId=orderid)
 # 	return open_orders(**params)
 
 
+def subaccount_names():
+	''' RETURNS 'main' followed by the nickname of every subaccount '''
+	resp = subaccounts()
+	if not resp.get('success'):
+		raise RuntimeError(resp.get('error'))
+	return ['main'] + [line['nickname'] for line in resp['result']]
+
+
+# time: exchange-clock epoch ms when the requests went out, latency: seconds until the last answer
+AccountSnapshot = collections.namedtuple('AccountSnapshot', ['time', 'latency', 'accounts', 'errors'])
+
+SNAPSHOT_PARTS = {'account': account, 'positions': positions, 'balances': balances, 'open_orders': open_orders}
+
+
+def account_snapshot(subaccounts=None, parts=SNAPSHOT_PARTS, max_workers=32):
+	'''
+	Every part of every subaccount requested at once, so the snapshot takes about one round trip.
+	subaccounts	    list	optional; nicknames, 'main' for the main account; default subaccount_names()
+	parts	        dict	name -> function(subaccount=...) fetched for each subaccount
+	max_workers	    integer	requests in flight at once
+	RETURNS AccountSnapshot(time, latency, accounts {subaccount: {part: result}}, errors {(subaccount, part): error})
+	'''
+	if subaccounts is None:
+		subaccounts = subaccount_names()
+	calls = [{'part': part, 'subaccount': subaccount} for subaccount in subaccounts for part in parts]
+	fetch = lambda part, subaccount: parts[part](subaccount=subaccount)
+	sent = clock.now_ms()
+	start = time.perf_counter()
+	results = batch.fan_out(fetch, calls, max_workers, check=response_error)
+	latency = time.perf_counter() - start
+	accounts = {subaccount: {} for subaccount in subaccounts}
+	errors = {}
+	for call, r in zip(calls, results):
+		if r.error is None:
+			accounts[call['subaccount']][call['part']] = r.result['result']
+		else:
+			errors[(call['subaccount'], call['part'])] = r.error
+	return AccountSnapshot(sent, latency, accounts, errors)
+
+
 def create_ts():
-	return str(round(pd.Timestamp.utcnow().timestamp() * 1000))
+	return str(clock.now_ms())
+
+def balance_records(resp):
+	if not resp.get('success'):
+		raise RuntimeError(resp.get('error'))
+	return resp['result']
+
+
+def new_balance_store(owner=None):
+	''' Wallet balances of owner (a client, default_client when None) as arrays by coin '''
+	bind = owner.call if owner else lambda func, *args, **kwargs: func(*args, **kwargs)
+	return balance_state.BalanceStore(lambda: bind(private_request, "GET", _WALLET_BALANCES, raw=True),
+										balance_records, lambda: clock.now_ms())
+
+
+# balance_store.poll() returns only the coins that changed
+balance_store = new_balance_store()
+
+# module functions run on default_client unless an FtxClient is bound; its settings are the module globals
+default_client = clients.default_client(
+	FtxClient, api_key='API_KEY', api_secret='API_SECRET', base_url='BASE_URL', subaccount='DEFAULT_SUBACCOUNT',
+	session='session', limiter='limiter', api_limit_track_post='api_limit_track_post',
+	api_limit_track_get='api_limit_track_get', order_store='order_store', balance_store='balance_store')
+
 
 """ Previously named balances"""
 def custom_balances():
-	coins_resp = balances()
-	#coins = {coin['coin']: {'free': coin['free'], 'total': coin['total'], 'locked': coin['locked']}for coin in coins['result']['balances']}
-	coins = {'last_update': create_ts()}
-	for line in coins_resp['result']['balances']:
-		sym = line['coin']
-		coins[f'{sym}_free'] = line['free']
-		coins[f'{sym}_locked'] = line['locked']
+	''' RETURNS {'last_update': ms string, 'BTC_free': number, 'BTC_locked': number, ...}, locked = total - free '''
+	store = client().balance_store
+	store.poll()
+	return store.flat()
 
-	return coins
+
+# symbols() metadata, refreshed in the background after ttl seconds;
+# instrument_cache.use_snapshot('ftx_instruments.json') persists it for warm starts
+instrument_cache = instruments.InstrumentCache(lambda: symbols()['result'], instruments.ftx_instrument, ttl=300)
 
 
 def pair_info():
@@ -626,14 +941,7 @@ def pair_info():
 	'category': 1,
 	'showStatus': True}
 	'''
-
-
-
-	resp = symbols()
-	info = {}
-	for ticker in resp['result']:
-		info[ticker['name']] = ticker
-	return info
+	return instrument_cache.raw()
 
 """ An API exists already for below functionality"""
 # def cancel_all_orders():
@@ -647,32 +955,24 @@ def pair_info():
 
 
 def check_api_limit():
-	global api_limit_track_post
-	global api_limit_track_get
-
-	two_min_ago = pd.Timestamp.utcnow() - pd.Timedelta(minutes=2)
-	api_limit_track_post = [i for i in api_limit_track_post if i > two_min_ago]
-	api_limit_track_get = [i for i in api_limit_track_get if i > two_min_ago]
-
-	post_len = len(api_limit_track_post)
-	get_len = len(api_limit_track_get)
-
-	return [get_len, post_len]
+	''' [GET, POST] requests made in the last two minutes '''
+	owner = client()
+	return [owner.api_limit_track_get.count(), owner.api_limit_track_post.count()]
 
 def check_micro_api_limit():
-	global api_limit_track_post
-	global api_limit_track_get
+	''' [GET, POST] requests made in the last second '''
+	owner = client()
+	return [owner.api_limit_track_get.count(1), owner.api_limit_track_post.count(1)]
 
-	one_secs_ago = pd.Timestamp.utcnow() - pd.Timedelta(seconds=1)
 
-	post_len = len([i for i in api_limit_track_post if i > one_secs_ago])
-	get_len = len([i for i in api_limit_track_get if i > one_secs_ago])
-
-	return [get_len, post_len]
 
+def ticker_list():
+	return list(instrument_cache.all())
 
 
-def ticker_list():
-	sym = symbols()
-	return [i['name'] for i in sym['result']]
+def instrument(symbol):
+	'''
+	RETURNS instruments.Instrument with numeric tick_size, lot_size and min_size; min_notional None, FTX publishes none
+	'''
+	return instrument_cache.get(symbol)
 
@@ -0,0 +1,231 @@
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+""" NOTES:
+    Latency-based choice between equivalent API hosts.
+    probe_once() measures every host concurrently; each host keeps its last `window` samples,
+    so percentiles and error rates roll forward. The active host changes when
+        - another host has had a p95 below margin * active p95 for switch_after evaluations in a row
+        - the active host's error rate exceeds max_error_rate, or failover() reports it broken
+    start() probes every interval seconds on a daemon thread; stop() ends it and its probe threads.
+    Callers only fail requests over (failover()) while the selector is running, since nothing would
+    probe a failed host back into use otherwise.
+    Hedger sends a request to a second host when the first has not answered within the first's
+    recent latency quantile for that endpoint, and takes whichever answer comes first. The slower
+    request cannot be aborted mid-flight with requests; its answer is dropped when it arrives.
+    A first host that fails (an exception, HTTP 429 or 5xx) before the delay is hedged at once,
+    and a failed answer never wins over the other host's.
+"""
+
+
+class HostStats:
+    def __init__(self, window):
+        self.latencies = collections.deque(maxlen=window)
+        self.outcomes = collections.deque(maxlen=window)
+
+    def record(self, latency=None, error=False):
+        if latency is not None:
+            self.latencies.append(latency)
+        self.outcomes.append(error)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return float('inf')
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def error_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class HostSelector:
+    def __init__(self, hosts, probe, on_switch=None, window=100, switch_after=3, margin=0.9,
+                 max_error_rate=0.2):
+        '''
+        hosts           list        base URLs, the first is active to begin with
+        probe           callable    probe(host), raises on failure
+        on_switch       callable    optional; on_switch(host) when the active host changes
+        window          integer     samples kept per host
+        switch_after    integer     consecutive evaluations another host must win before switching
+        margin          number      another host wins when its p95 < margin * active p95
+        max_error_rate  number      error rate that fails the active host over
+        '''
+        self.hosts = list(hosts)
+        self.probe = probe
+        self.on_switch = on_switch
+        self.margin = margin
+        self.switch_after = switch_after
+        self.max_error_rate = max_error_rate
+        self.active = self.hosts[0]
+        self.stats = {host: HostStats(window) for host in self.hosts}
+        self.running = False
+        self._wins = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._executor = None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(self.hosts), thread_name_prefix='probe')
+            return self._executor
+
+    def _probe(self, host):
+        start = time.perf_counter()
+        try:
+            self.probe(host)
+        except Exception:
+            self.stats[host].record(error=True)
+        else:
+            self.stats[host].record(time.perf_counter() - start)
+
+    def _switch(self, host):
+        self.active = host
+        self._wins = 0
+        if self.on_switch:
+            self.on_switch(host)
+
+    def probe_once(self):
+        list(self._pool().map(self._probe, self.hosts))
+        self.evaluate()
+
+    def best(self, exclude=()):
+        candidates = [h for h in self.hosts if h not in exclude and self.stats[h].error_rate <= self.max_error_rate]
+        return min(candidates, key=lambda h: self.stats[h].percentile(0.95), default=None)
+
+    def evaluate(self):
+        with self._lock:
+            active = self.stats[self.active]
+            if active.error_rate > self.max_error_rate:
+                other = self.best(exclude=(self.active,))
+                if other:
+                    self._switch(other)
+                return
+            other = self.best(exclude=(self.active,))
+            if other and self.stats[other].percentile(0.95) < self.margin * active.percentile(0.95):
+                self._wins += 1
+                if self._wins >= self.switch_after:
+                    self._switch(other)
+            else:
+                self._wins = 0
+
+    def select_best(self):
+        ''' Switch to the host with the lowest p95 now, without waiting for switch_after rounds. '''
+        with self._lock:
+            best = self.best()
+            if best and best != self.active:
+                self._switch(best)
+        return self.active
+
+    def failover(self, host):
+        ''' Report a failed request on host; moves off it at once if it is active. '''
+        self.stats[host].record(error=True)
+        with self._lock:
+            if host == self.active:
+                other = self.best(exclude=(host,)) or next((h for h in self.hosts if h != host), host)
+                self._switch(other)
+
+    def snapshot(self):
+        return {host: {'active': host == self.active, 'p50': stats.percentile(0.5),
+                       'p95': stats.percentile(0.95), 'p99': stats.percentile(0.99),
+                       'error_rate': stats.error_rate, 'samples': len(stats.outcomes)}
+                for host, stats in self.stats.items()}
+
+    def start(self, interval=5):
+        ''' Probe every interval seconds on a daemon thread until stop(); a running selector is left as it is. '''
+        if self.running:
+            return
+        stop = self._stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                self.probe_once()
+        self.running = True
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.running = False
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False)
+
+
+def failed(future):
+    ''' True when a finished request raised or answered HTTP 429 or 5xx '''
+    if future.exception() is not None:
+        return True
+    status = getattr(future.result(), 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class Hedger:
+    def __init__(self, quantile=0.95, window=200, min_samples=20, default_delay=0.05, max_workers=32):
+        '''
+        quantile        number      the hedge fires after this quantile of the first host's recent latency
+        window          integer     latencies kept per endpoint
+        min_samples     integer     latencies needed before the quantile is used instead of default_delay
+        default_delay   number      seconds to wait before hedging while an endpoint has too few samples
+        max_workers     integer     threads the requests run on
+        '''
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.endpoints = set()
+        self.latency = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._counts = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hedge')
+
+    def delay(self, endpoint):
+        stats = self.latency.get(endpoint)
+        if stats is None or len(stats.latencies) < self.min_samples:
+            return self.default_delay
+        return stats.percentile(self.quantile)
+
+    def _recorder(self, endpoint, start):
+        def record(future):
+            if not failed(future):
+                stats = self.latency.get(endpoint) or self.latency.setdefault(endpoint, HostStats(self.window))
+                stats.record(time.perf_counter() - start)
+        return record
+
+    def request(self, endpoint, call, hosts, charge):
+        '''
+        call(host) on hosts[0], and on hosts[1] too when hosts[0] is slower than delay(endpoint) or fails
+        charge      callable    takes rate budget for the second request before it is sent
+        RETURNS the first successful response; when both fail, the first host's response or error
+        '''
+        with self._counts:
+            self.calls += 1
+        start = time.perf_counter()
+        first = self._executor.submit(call, hosts[0])
+        first.add_done_callback(self._recorder(endpoint, start))
+        done, _ = wait([first], timeout=self.delay(endpoint))
+        if len(hosts) < 2 or (done and not failed(first)):
+            return first.result()
+        charge()
+        with self._counts:
+            self.hedged += 1
+        second = self._executor.submit(call, hosts[1])
+        pending = {second} if done else {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not failed(future):
+                    if future is second:
+                        with self._counts:
+                            self.hedge_wins += 1
+                    return future.result()
+        return first.result()
+
+    def snapshot(self):
+        return {'calls': self.calls, 'hedged': self.hedged, 'hedge_wins': self.hedge_wins,
+                'delay': {endpoint: self.delay(endpoint) for endpoint in self.latency}}
@@ -0,0 +1,129 @@
+import bisect
+import threading
+import time
+
+""" NOTES:
+    Per-endpoint request metrics: call and error counts and latency histograms.
+    Disabled by default; a disabled Metrics costs the request path one attribute check.
+        ftx_rest.metrics.enabled = True
+        ftx_rest.metrics.snapshot()     {'GET /markets': {'calls': 3, 'errors': 0, 'p50': ..., ...}}
+        ftx_rest.metrics.prometheus()   Prometheus text exposition format
+    Hooks run only while enabled:
+        pre(method, endpoint)
+        post(method, endpoint, latency_seconds, response, error)
+    Responses with HTTP status >= 400, raised exceptions and responses check() reports count as errors;
+    check covers application errors sent with HTTP 200 (Bybit ret_code != 0, FTX success: false).
+"""
+
+# 50us to ~90s, 20% apart
+BUCKETS = tuple(50e-6 * 1.2 ** i for i in range(80))
+
+
+class Histogram:
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, q):
+        ''' Upper bound of the bucket holding the q quantile, q in [0, 1] '''
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else float('inf')
+        return float('inf')
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram()
+
+
+class Metrics:
+    def __init__(self, prefix, check=None):
+        '''
+        prefix  string      metric name prefix in the Prometheus export, e.g. 'ftx'
+        check   callable    optional; maps an HTTP response below 400 to an error detail, None when it succeeded
+        '''
+        self.prefix = prefix
+        self.check = check
+        self.enabled = False
+        self.pre_hooks = []
+        self.post_hooks = []
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, pre=None, post=None):
+        if pre:
+            self.pre_hooks.append(pre)
+        if post:
+            self.post_hooks.append(post)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+    def observe(self, method, endpoint, send, *args, **kwargs):
+        ''' send(*args, **kwargs) timed and counted under (method, endpoint) '''
+        for hook in self.pre_hooks:
+            hook(method, endpoint)
+        response = error = None
+        start = time.perf_counter()
+        try:
+            response = send(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            failed = error is not None or getattr(response, 'status_code', 200) >= 400 or \
+                bool(self.check and self.check(response))
+            with self._lock:
+                stats = self.endpoints.get((method, endpoint))
+                if stats is None:
+                    stats = self.endpoints[(method, endpoint)] = EndpointStats()
+                stats.calls += 1
+                stats.errors += failed
+                stats.latency.record(latency)
+            for hook in self.post_hooks:
+                hook(method, endpoint, latency, response, error)
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            return {f'{method} {endpoint}': {'calls': stats.calls, 'errors': stats.errors,
+                                             'mean': stats.latency.sum / stats.latency.count,
+                                             'p50': stats.latency.percentile(0.5),
+                                             'p95': stats.latency.percentile(0.95),
+                                             'p99': stats.latency.percentile(0.99)}
+                    for (method, endpoint), stats in self.endpoints.items()}
+
+    def prometheus(self):
+        name = f'{self.prefix}_request'
+        lines = [f'# TYPE {name}s_total counter', f'# TYPE {name}_errors_total counter',
+                 f'# TYPE {name}_latency_seconds histogram']
+        with self._lock:
+            for (method, endpoint), stats in sorted(self.endpoints.items()):
+                labels = f'method="{method}",endpoint="{endpoint}"'
+                lines.append(f'{name}s_total{{{labels}}} {stats.calls}')
+                lines.append(f'{name}_errors_total{{{labels}}} {stats.errors}')
+                cumulative = 0
+                for bound, count in zip(stats.latency.bounds, stats.latency.counts):
+                    cumulative += count
+                    lines.append(f'{name}_latency_seconds_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+                lines.append(f'{name}_latency_seconds_bucket{{{labels},le="+Inf"}} {stats.latency.count}')
+                lines.append(f'{name}_latency_seconds_sum{{{labels}}} {stats.latency.sum}')
+                lines.append(f'{name}_latency_seconds_count{{{labels}}} {stats.latency.count}')
+        return '\n'.join(lines) + '\n'
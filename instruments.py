@@ -0,0 +1,147 @@
+import collections
+import json
+import os
+import threading
+import time
+
+""" NOTES:
+    Instrument metadata cache with TTL, background refresh and a snapshot file.
+    get(symbol) is a dict lookup. When the data is older than ttl it is still served while
+    a background thread fetches a fresh copy; only an empty cache waits on the network, and
+    concurrent callers of an empty cache wait on the same first load.
+    With a snapshot_path (off by default, use_snapshot(path) to opt in) every refresh is written
+    to that file, and a new process starts from it, so it can trade before symbols() has answered.
+    all() and raw() return copies; callers may change them without touching the cache.
+    min_notional is None where the exchange does not publish one (FTX).
+"""
+
+Instrument = collections.namedtuple('Instrument', ['symbol', 'base', 'quote', 'tick_size', 'lot_size',
+                                                   'min_size', 'min_notional', 'raw'])
+
+
+def _float(value):
+    return float(value) if value not in (None, '') else 0.0
+
+
+def ftx_instrument(raw):
+    return Instrument(raw['name'], raw.get('baseCurrency') or raw.get('underlying'), raw.get('quoteCurrency'),
+                      _float(raw.get('priceIncrement')), _float(raw.get('sizeIncrement')),
+                      _float(raw.get('minProvideSize')), None, raw)
+
+
+def bybit_instrument(raw):
+    return Instrument(raw['name'], raw.get('baseCurrency'), raw.get('quoteCurrency'),
+                      _float(raw.get('minPricePrecision')), _float(raw.get('basePrecision')),
+                      _float(raw.get('minTradeQuantity')), _float(raw.get('minTradeAmount')), raw)
+
+
+class InstrumentCache:
+    def __init__(self, fetch, parse, ttl=300, snapshot_path=None):
+        '''
+        fetch           callable    returns the list of raw instrument dicts from the exchange
+        parse           callable    raw dict -> Instrument
+        ttl             number      seconds before a background refresh is started
+        snapshot_path   string      optional; json file the cache is persisted to and started from
+        '''
+        self.fetch = fetch
+        self.parse = parse
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.by_symbol = {}
+        self.raw_by_symbol = {}
+        self.updated = 0.0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self.running = False
+        self._stop = threading.Event()
+        self._load_snapshot()
+
+    def _load_snapshot(self):
+        if not self.snapshot_path:
+            return
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._install(snapshot['symbols'], snapshot['updated'])
+
+    def _install(self, raws, updated):
+        by_symbol = {instrument.symbol: instrument for instrument in map(self.parse, raws)}
+        self.raw_by_symbol = {symbol: instrument.raw for symbol, instrument in by_symbol.items()}
+        self.by_symbol = by_symbol
+        self.updated = updated
+
+    def use_snapshot(self, path):
+        ''' Persist every refresh to path, and start from it when the cache is still empty '''
+        self.snapshot_path = path
+        if not self.by_symbol:
+            self._load_snapshot()
+
+    def refresh(self):
+        raws = self.fetch()
+        updated = time.time()
+        self._install(raws, updated)
+        if self.snapshot_path:
+            tmp = self.snapshot_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'updated': updated, 'symbols': raws}, f)
+            os.replace(tmp, self.snapshot_path)
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+        finally:
+            self._refreshing = False
+
+    def _claim_refresh(self):
+        ''' True when no other refresh is running; the caller must then run _background_refresh() '''
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def _check(self):
+        if not self.by_symbol:
+            with self._load_lock:
+                if not self.by_symbol:
+                    self.refresh()
+        elif time.time() - self.updated > self.ttl and self._claim_refresh():
+            threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def get(self, symbol):
+        self._check()
+        return self.by_symbol[symbol]
+
+    def all(self):
+        ''' {symbol: Instrument} '''
+        self._check()
+        return dict(self.by_symbol)
+
+    def raw(self):
+        ''' {symbol: raw exchange dict}, copies of the cached dicts '''
+        self._check()
+        return {symbol: dict(raw) for symbol, raw in self.raw_by_symbol.items()}
+
+    def start(self, interval=None):
+        ''' Refresh every interval seconds (default ttl) on a daemon thread until stop(); no-op while running. '''
+        if self.running:
+            return
+        stop = self._stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval or self.ttl):
+                if self._claim_refresh():
+                    self._background_refresh()
+        self.running = True
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.running = False
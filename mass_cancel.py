@@ -0,0 +1,58 @@
+import collections
+import time
+
+import batch
+
+""" NOTES:
+    Taking every open order off a venue in as few round trips as possible.
+    flatten() turns the open orders into cancel requests (one per market, or per chunk of ids),
+    sends them all concurrently, then lists the open orders again to verify nothing is left.
+    Orders that survive (rejected chunks, orders placed meanwhile, a listing capped at one page)
+    go round again, up to `rounds` times.
+    Every cancel request is reported with its latency; the slowest one bounds the time to flat.
+        bybit_spot_rest.mass_cancel_orders()    fast_cancel_all per symbol, or cancel_by_id in 100-id chunks
+        ftx_rest.mass_cancel_orders()           DELETE /orders once per market
+"""
+
+# key: the market or id range the request covered, orders: open orders it targeted (None when not listed)
+Chunk = collections.namedtuple('Chunk', ['round', 'key', 'orders', 'latency', 'error'])
+
+# latency: seconds until the venue was verified flat (or rounds ran out), remaining: orders still open
+CancelReport = collections.namedtuple('CancelReport', ['latency', 'rounds', 'remaining', 'chunks'])
+
+# one cancel request: func(**params), targeting `orders` open orders
+Cancel = collections.namedtuple('Cancel', ['key', 'func', 'params', 'orders'])
+
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _send(cancel):
+    return cancel.func(**cancel.params)
+
+
+def flatten(list_open, plan, first=None, max_workers=10, rounds=3, check=None):
+    '''
+    list_open   callable    RETURNS the open orders, raises when they cannot be listed
+    plan        callable    plan(orders) -> list of Cancel covering every order
+    first       list        optional; Cancel requests sent before the first listing, e.g. per known market
+    max_workers integer     cancel requests in flight at once
+    rounds      integer     cancel rounds at most; each is followed by a listing
+    check       callable    optional; maps a cancel response to an error detail, None when it succeeded
+    RETURNS CancelReport(latency, rounds, remaining, chunks); remaining == [] means verified flat
+    '''
+    start = time.perf_counter()
+    chunks = []
+    cancels = first
+    done = 0
+    while True:
+        if cancels is None:
+            orders = list_open()
+            if not orders or done == rounds:
+                return CancelReport(time.perf_counter() - start, done, orders, chunks)
+            cancels = plan(orders)
+        results = batch.fan_out(_send, [{'cancel': cancel} for cancel in cancels], max_workers, check)
+        chunks += [Chunk(done, cancel.key, cancel.orders, r.latency, r.error) for cancel, r in zip(cancels, results)]
+        done += 1
+        cancels = None
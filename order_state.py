@@ -0,0 +1,191 @@
+import collections
+import threading
+import time
+
+""" NOTES:
+    In-process index of our own orders, so their state is read from memory instead of polled.
+    Every order a response carries (place, modify, status, open orders) replaces the stored copy;
+    cancel acknowledgements mark the stored order cancelled. FTX only queues a cancel, so there the
+    order becomes 'cancelling' and stays open until a status or open orders response confirms it.
+    Orders are found by exchange id, client id or market in O(1), and kept as the exchange sent them.
+    The store can miss fills and cancels made elsewhere, so it is reconciled against the open
+    orders: every complete open orders response reconciles its market, and sync() (or start())
+    lists them all. An order we hold as open that the listing lacks has closed without our seeing
+    how; it is dropped, and order_status tells the rest.
+        ftx_rest.order_store.get(order_id)             last known order dict, or None
+        ftx_rest.order_store.open_orders('BTC/USD')    open orders on a market, no request sent
+"""
+
+# (order id, client id or None, market, open) of an exchange order dict
+OrderFields = collections.namedtuple('OrderFields', ['order_id', 'client_id', 'market', 'open'])
+
+
+def ftx_fields(order):
+    return OrderFields(str(order['id']), order.get('clientId') or None, order['market'],
+                       order['status'] in ('new', 'open', 'cancelling'))
+
+
+def ftx_cancelled(order):
+    ''' FTX acknowledges a cancel once it is queued: the order stays open until a later response closes it '''
+    return dict(order, status='cancelling')
+
+
+def bybit_fields(order):
+    return OrderFields(str(order['orderId']), order.get('orderLinkId') or None, order['symbol'],
+                       order['status'] in ('NEW', 'PARTIALLY_FILLED', 'PENDING_NEW'))
+
+
+def bybit_cancelled(order):
+    return dict(order, status='CANCELED')
+
+
+class OrderStore:
+    def __init__(self, fields, cancelled, check, list_open=None, interval=30):
+        '''
+        fields      callable    fields(order) -> OrderFields of an exchange order dict
+        cancelled   callable    cancelled(order) -> the order as it reads once cancelled
+        check       callable    maps a response to an error detail, None when it succeeded
+        list_open   callable    optional; RETURNS every open order, used by sync()
+        interval    number      seconds between background syncs
+        '''
+        self.fields = fields
+        self.cancelled = cancelled
+        self.check = check
+        self.list_open = list_open
+        self.interval = interval
+        self.orders = {}
+        self.client_ids = {}
+        self.markets = collections.defaultdict(set)
+        self.updated = {}
+        self.last_sync = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self.running = False
+        self._stop = threading.Event()
+
+    def _store(self, order):
+        fields = self.fields(order)
+        self.orders[fields.order_id] = order
+        self.updated[fields.order_id] = time.monotonic()
+        if fields.client_id:
+            self.client_ids[fields.client_id] = fields.order_id
+        if fields.open:
+            self.markets[fields.market].add(fields.order_id)
+        else:
+            self.markets[fields.market].discard(fields.order_id)
+
+    def _forget(self, order_id):
+        fields = self.fields(self.orders.pop(order_id))
+        self.updated.pop(order_id, None)
+        self.markets[fields.market].discard(order_id)
+        if self.client_ids.get(fields.client_id) == order_id:
+            del self.client_ids[fields.client_id]
+
+    def update(self, *orders):
+        with self._lock:
+            for order in orders:
+                self._store(order)
+
+    def get(self, order_id):
+        return self.orders.get(str(order_id))
+
+    def get_by_client_id(self, client_id):
+        order_id = self.client_ids.get(client_id)
+        return None if order_id is None else self.orders.get(order_id)
+
+    def open_orders(self, market=None):
+        with self._lock:
+            markets = [market] if market else list(self.markets)
+            return [self.orders[order_id] for m in markets for order_id in self.markets.get(m, ())]
+
+    def record(self, resp):
+        ''' Store the order a successful response carries; RETURNS resp '''
+        if self.check(resp) is None:
+            self.update(resp['result'])
+        return resp
+
+    def record_cancel(self, resp, order_ids=(), client_ids=()):
+        ''' Mark these orders cancelled when resp acknowledges it; RETURNS resp '''
+        if self.check(resp) is None:
+            with self._lock:
+                order_ids = [str(i) for i in order_ids] + [self.client_ids.get(c) for c in client_ids]
+                for order_id in order_ids:
+                    if order_id in self.orders:
+                        self._store(self.cancelled(self.orders[order_id]))
+        return resp
+
+    def record_cancel_all(self, resp, market=None, side=None):
+        ''' Mark the open orders of market (all markets by default) on side cancelled; RETURNS resp '''
+        if self.check(resp) is None:
+            cancelled = [order for order in self.open_orders(market)
+                         if side is None or str(order.get('side')).lower() == side.lower()]
+            self.record_cancel(resp, [self.fields(order).order_id for order in cancelled])
+        return resp
+
+    def reconcile(self, orders, market=None, since=None):
+        '''
+        Take orders as the complete list of open orders on market (every market by default).
+        since   number  optional; time.monotonic() when the listing was requested, orders stored
+                        after it are newer than the listing: kept as they are, whether listed or not
+        RETURNS the ids of the orders dropped
+        '''
+        with self._lock:
+            listed = set()
+            for order in orders:
+                order_id = self.fields(order).order_id
+                listed.add(order_id)
+                if since is None or order_id not in self.updated or self.updated[order_id] < since:
+                    self._store(order)
+            markets = [market] if market else list(self.markets)
+            dropped = [order_id for m in markets for order_id in self.markets.get(m, ())
+                       if order_id not in listed and (since is None or self.updated[order_id] < since)]
+            for order_id in dropped:
+                self._forget(order_id)
+        return dropped
+
+    def record_open(self, resp, since=None, market=None, complete=True):
+        ''' Reconcile against an open orders response; complete is False for a partial page. RETURNS resp '''
+        if self.check(resp) is None:
+            if complete:
+                self.reconcile(resp['result'], market, since)
+            else:
+                self.update(*resp['result'])
+        return resp
+
+    def sync(self):
+        ''' Reconcile against list_open(); RETURNS the ids of the open orders dropped '''
+        since = time.monotonic()
+        with self._lock:
+            held = [order_id for ids in self.markets.values() for order_id in ids]
+        self.reconcile(self.list_open(), since=since)
+        self.last_sync = time.time()
+        return [order_id for order_id in held if order_id not in self.orders]
+
+    def start(self, interval=None):
+        ''' Reconcile every interval seconds (default self.interval) until stop(); no-op while running. '''
+        if self.running:
+            return
+        stop = self._stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval or self.interval):
+                try:
+                    self.sync()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = e
+        self.running = True
+        threading.Thread(target=run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self.running = False
+
+    def clear(self):
+        with self._lock:
+            self.orders, self.client_ids, self.updated = {}, {}, {}
+            self.markets = collections.defaultdict(set)
+
+    def snapshot(self):
+        return {'orders': len(self.orders), 'open': sum(len(ids) for ids in self.markets.values()),
+                'markets': sorted(m for m, ids in self.markets.items() if ids), 'last_sync': self.last_sync}
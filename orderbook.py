@@ -0,0 +1,114 @@
+import itertools
+
+import numpy as np
+
+""" NOTES:
+    Order book snapshot held as contiguous float64 arrays.
+    bids are sorted best (highest) first, asks best (lowest) first, as both exchanges send them.
+    OrderBook.from_ftx(order_book(...))     FTX {'result': {'bids': [[price, size], ...], 'asks': ...}}
+    OrderBook.from_bybit(orderbook(...))    Bybit {'result': {'time': ms, 'bids': [['price', 'qty'], ...]}}
+"""
+
+
+def _levels(levels):
+    ''' [[price, size], ...] of numbers or numeric strings, parsed in one pass '''
+    return np.fromiter(itertools.chain.from_iterable(levels), np.float64, 2 * len(levels)).reshape(-1, 2)
+
+
+class OrderBook:
+    def __init__(self, bids, asks, time=None):
+        '''
+        bids, asks  float64 arrays of shape (n, 2), columns price and size
+        time        optional; exchange timestamp
+        '''
+        self.bids = bids
+        self.asks = asks
+        self.time = time
+
+    @classmethod
+    def from_levels(cls, bids, asks, time=None):
+        return cls(_levels(bids), _levels(asks), time)
+
+    @classmethod
+    def from_ftx(cls, resp):
+        result = resp['result']
+        return cls.from_levels(result['bids'], result['asks'])
+
+    @classmethod
+    def from_bybit(cls, resp):
+        result = resp['result']
+        return cls.from_levels(result['bids'], result['asks'], result.get('time'))
+
+    def _side(self, side):
+        return self.asks if side in ('buy', 'Buy', 'ask', 'asks') else self.bids
+
+    @property
+    def best_bid(self):
+        return self.bids[0, 0] if len(self.bids) else np.nan
+
+    @property
+    def best_ask(self):
+        return self.asks[0, 0] if len(self.asks) else np.nan
+
+    @property
+    def mid(self):
+        return (self.best_bid + self.best_ask) / 2
+
+    @property
+    def spread(self):
+        return self.best_ask - self.best_bid
+
+    @property
+    def spread_bps(self):
+        return self.spread / self.mid * 1e4
+
+    def cumulative_depth(self, side):
+        '''
+        side    'buy' walks the asks, 'sell' walks the bids
+        RETURNS (prices, cumulative size, cumulative notional) arrays
+        '''
+        levels = self._side(side)
+        return levels[:, 0], np.cumsum(levels[:, 1]), np.cumsum(levels[:, 0] * levels[:, 1])
+
+    def depth(self, side, bps):
+        '''
+        Size resting within bps of mid on the side a buy or sell would take.
+        bps     number or array; an array gives the depth at every threshold in one call
+        '''
+        levels = self._side(side)
+        sizes = np.r_[0.0, np.cumsum(levels[:, 1])]
+        bps = np.asarray(bps, dtype=np.float64)
+        if levels is self.asks:
+            count = np.searchsorted(levels[:, 0], self.mid * (1 + bps / 1e4), side='right')
+        else:
+            count = np.searchsorted(-levels[:, 0], -self.mid * (1 - bps / 1e4), side='right')
+        return sizes[count]
+
+    def impact_price(self, notional, side='buy'):
+        '''
+        Average fill price of a market order of `notional` quote currency; nan where the book is too thin.
+        notional    number or array
+        '''
+        prices, sizes, notionals = self.cumulative_depth(side)
+        notional = np.asarray(notional, dtype=np.float64)
+        if not len(prices):
+            return np.full(notional.shape, np.nan)[()]
+        index = np.searchsorted(notionals, notional)
+        thin = index >= len(prices)
+        index = np.minimum(index, len(prices) - 1)
+        filled_notional = np.where(index > 0, notionals[index - 1], 0.0)
+        filled_size = np.where(index > 0, sizes[index - 1], 0.0)
+        size = filled_size + (notional - filled_notional) / prices[index]
+        return np.where(thin, np.nan, notional / size)[()]
+
+    def merged(self, tick):
+        ''' Book with levels merged to a coarser tick: bids rounded down, asks rounded up. '''
+        return OrderBook(self._merge(self.bids, tick, np.floor), self._merge(self.asks, tick, np.ceil), self.time)
+
+    @staticmethod
+    def _merge(levels, tick, rounding):
+        if not len(levels):
+            return levels
+        prices = rounding(np.round(levels[:, 0] / tick, 9)) * tick
+        starts = np.flatnonzero(np.r_[True, prices[1:] != prices[:-1]])
+        return np.column_stack([prices[starts], np.add.reduceat(levels[:, 1], starts)])
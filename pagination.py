@@ -0,0 +1,82 @@
+import collections
+import json
+
+import batch
+
+""" NOTES:
+    Streaming backfill over a time range.
+    The range is cut into windows which are fetched concurrently, at most max_workers ahead
+    of the consumer, and yielded oldest first. Records repeated on a window edge are dropped.
+    A window returning a full page (page_limit records) is split in half and re-fetched,
+    so nothing is lost to the exchange page size.
+"""
+
+
+def record_key(record):
+    ''' The id of a record, or its whole content when it has none (nested values included) '''
+    if isinstance(record, (list, tuple)):
+        return record[0]
+    if record.get('id') is not None:
+        return record['id']
+    return json.dumps(record, sort_keys=True, default=str)
+
+
+def record_time(record):
+    if isinstance(record, (list, tuple)):
+        return record[0]
+    for field in ('time', 'startTime', 'createdAt'):
+        if field in record:
+            return record[field]
+    return 0
+
+
+def windows(start, end, size):
+    while start < end:
+        yield start, min(start + size, end)
+        start += size
+
+
+def _fetch(fetch, start, end, page_limit, min_window):
+    records = fetch(start, end)
+    if len(records) >= page_limit and end - start > min_window:
+        middle = start + (end - start) // 2
+        records = (_fetch(fetch, start, middle, page_limit, min_window)
+                   + _fetch(fetch, middle, end, page_limit, min_window))
+    return sorted(records, key=record_time)
+
+
+def paginate(fetch, start, end, window, page_limit, max_workers=4, min_window=1, key=record_key):
+    '''
+    fetch       callable    fetch(window_start, window_end) -> list of records
+    start, end  integer     range in the unit fetch expects
+    window      integer     size of one request window in that unit
+    page_limit  integer     records in a full page of the exchange, full windows are split
+    max_workers integer     windows fetched ahead of the consumer
+    min_window  integer     windows are not split below this size
+    key         callable    identity of a record, used to drop window-edge duplicates
+    '''
+    pool = batch.executor()
+    todo = windows(start, end, window)
+    pending = collections.deque()
+    for s, e in todo:
+        pending.append(pool.submit(_fetch, fetch, s, e, page_limit, min_window))
+        if len(pending) >= max_workers:
+            break
+    previous = set()
+    try:
+        while pending:
+            records = pending.popleft().result()
+            for s, e in todo:
+                pending.append(pool.submit(_fetch, fetch, s, e, page_limit, min_window))
+                break
+            keys = set()
+            for record in records:
+                k = key(record)
+                if k in previous or k in keys:
+                    continue
+                keys.add(k)
+                yield record
+            previous = keys
+    finally:
+        for future in pending:
+            future.cancel()
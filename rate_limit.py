@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+""" NOTES:
+    Constant memory, O(1) request accounting on the monotonic clock.
+    TokenBucket         budget of `capacity` requests refilled at `rate` per second
+    RateLimiter         one TokenBucket per HTTP method plus per-endpoint weights
+    SlidingWindowCounter    request count over a trailing window, kept in a ring of buckets
+    Blocking acquire() reserves the tokens and sleeps exactly until they are available,
+    so concurrent callers are served in the order they asked.
+"""
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        '''
+        rate        number  tokens added per second
+        capacity    number  maximum burst
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic_ns()
+        self.lock = threading.Lock()
+
+    def _reserve(self, weight, timeout):
+        ''' Take weight tokens and return the seconds to wait for them, None if over timeout. '''
+        with self.lock:
+            now = time.monotonic_ns()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / 1e9)
+            self.updated = now
+            delay = max(0.0, (weight - self.tokens) / self.rate)
+            if timeout is not None and delay > timeout:
+                return None
+            self.tokens -= weight
+            return delay
+
+    def try_acquire(self, weight=1):
+        return self._reserve(weight, 0) is not None
+
+    def acquire(self, weight=1, blocking=True, timeout=None):
+        delay = self._reserve(weight, timeout if blocking else 0)
+        if delay is None:
+            return False
+        if delay:
+            time.sleep(delay)
+        return True
+
+    async def acquire_async(self, weight=1, timeout=None):
+        delay = self._reserve(weight, timeout)
+        if delay is None:
+            return False
+        if delay:
+            await asyncio.sleep(delay)
+        return True
+
+
+class RateLimiter:
+    def __init__(self, budgets, weights=None):
+        '''
+        budgets     dict    {'GET': TokenBucket(...), 'POST': ...}; methods without a budget are not limited
+        weights     dict    {endpoint: weight}; endpoints default to weight 1
+        '''
+        self.budgets = budgets
+        self.weights = weights or {}
+
+    def _bucket(self, method, endpoint):
+        return self.budgets.get(method), self.weights.get(endpoint, 1)
+
+    def try_acquire(self, method, endpoint=None):
+        bucket, weight = self._bucket(method, endpoint)
+        return bucket is None or bucket.try_acquire(weight)
+
+    def acquire(self, method, endpoint=None, blocking=True, timeout=None):
+        bucket, weight = self._bucket(method, endpoint)
+        return bucket is None or bucket.acquire(weight, blocking, timeout)
+
+    async def acquire_async(self, method, endpoint=None, timeout=None):
+        bucket, weight = self._bucket(method, endpoint)
+        return bucket is None or await bucket.acquire_async(weight, timeout)
+
+
+class SlidingWindowCounter:
+    def __init__(self, window, resolution=0.1):
+        '''
+        window      number  seconds counted
+        resolution  number  bucket width in seconds; counts are exact to this granularity
+        '''
+        self.bucket_ns = int(resolution * 1e9)
+        self.counts = [0] * max(1, round(window / resolution))
+        self.head = time.monotonic_ns() // self.bucket_ns
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def _advance(self):
+        current = time.monotonic_ns() // self.bucket_ns
+        steps = current - self.head
+        if steps <= 0:
+            return
+        size = len(self.counts)
+        if steps >= size:
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for i in range(self.head + 1, current + 1):
+                self.total -= self.counts[i % size]
+                self.counts[i % size] = 0
+        self.head = current
+
+    def add(self, n=1):
+        with self.lock:
+            self._advance()
+            self.counts[self.head % len(self.counts)] += n
+            self.total += n
+
+    def count(self, window=None):
+        ''' Events in the whole window, or in the trailing `window` seconds of it. '''
+        with self.lock:
+            self._advance()
+            if window is None:
+                return self.total
+            size = len(self.counts)
+            span = min(size, max(1, round(window * 1e9 / self.bucket_ns)))
+            return sum(self.counts[(self.head - i) % size] for i in range(span))
+
+    def __len__(self):
+        return self.count()
@@ -0,0 +1,58 @@
+import hashlib
+import hmac
+from urllib.parse import urlencode
+
+""" NOTES:
+    HMAC-SHA256 signers keyed once per credential.
+    The keyed HMAC state is built in the constructor and copied for every signature,
+    so the secret is never re-encoded or re-hashed on the request path.
+    Keep one signer per credential: each clients.Client holds its own, see Client.signer(); nothing here
+    caches signers by secret.
+"""
+
+
+class Signer:
+    def __init__(self, secret):
+        self._mac = hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+    def sign(self, *parts):
+        ''' Signature of the concatenation of the bytes parts, without building it. '''
+        mac = self._mac.copy()
+        for part in parts:
+            mac.update(part)
+        return mac.hexdigest()
+
+    def sign_batch(self, payloads):
+        return [self.sign(payload) for payload in payloads]
+
+
+class FtxSigner(Signer):
+    def sign_request(self, ts, method, path_url, body=None):
+        '''
+        ts          integer     milliseconds, sent as FTX-TS
+        method      string      GET, POST, DELETE
+        path_url    string      path and query, e.g. /api/orders?market=BTC-PERP
+        body        bytes       optional; request body
+        '''
+        mac = self._mac.copy()
+        mac.update(f'{ts}{method}{path_url}'.encode())
+        if body:
+            mac.update(body.encode() if isinstance(body, str) else body)
+        return mac.hexdigest()
+
+    def sign_batch(self, requests):
+        ''' requests    iterable of (ts, method, path_url, body) '''
+        return [self.sign_request(*request) for request in requests]
+
+
+class BybitSigner(Signer):
+    def query(self, params):
+        ''' Canonical query string for params: keys sorted, sign appended. '''
+        query = urlencode(sorted(params.items()))
+        return f'{query}&sign={self.sign(query.encode())}'
+
+    def sign_params(self, params):
+        return self.sign(urlencode(sorted(params.items())).encode())
+
+    def sign_batch(self, params_list):
+        return [self.sign_params(params) for params in params_list]
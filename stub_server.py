@@ -0,0 +1,692 @@
+import collections
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import ssl
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+import rate_limit
+
+""" NOTES:
+    Local stand-in for the FTX and Bybit spot REST APIs, used by the tests and benchmarks.
+    Both venues are served from one address, FTX under /api and Bybit under /spot,
+    so point the wrappers at it with
+        ftx_rest.BASE_URL = url + '/api'
+        bybit_spot_rest.BASE_URL = url
+    Every server keeps its own Exchange per venue: orders, fills and balances. Orders match
+    against resting orders of the same server, then against a quoted book that always has liquidity
+    at Exchange.BID and Exchange.ASK; the rest of a limit order rests and locks its balance.
+    FTX requests with an FTX-SUBACCOUNT header go to that subaccount's own Exchange, created on first use.
+    start() options
+    latency     false   number  seconds to sleep before answering every request
+    jitter      false   number  up to this many seconds more, uniformly at random
+    stall_rate  false   number  share of requests delayed by stall seconds more, the slow tail
+    stall       false   number  seconds, default 0.1
+    clock_skew  false   number  seconds the stub's clock runs ahead of the local one (negative: behind);
+                                signed Bybit requests are rejected with ret_code 10002 like the exchange
+                                does when their timestamp is outside recvWindow of it
+    api_key     false   string  with api_secret, private requests must carry this key and a valid
+    api_secret  false   string  HMAC signature, or get 'Not logged in' (FTX) / ret_code 10003, 10004 (Bybit)
+    rate_limits false   dict    {'GET': (rate, capacity), ...} token buckets; requests over budget get a 429
+    error_rate  false   number  share of requests answered with a 500
+    drop_rate   false   number  share of requests whose connection is closed without an answer
+    seed        false   integer seed of the error and jitter draws
+    certfile    false   string  serve HTTPS with this certificate, see self_signed_cert
+"""
+
+_MARKET = {'name': 'BTC/USD', 'enabled': True, 'type': 'spot', 'baseCurrency': 'BTC',
+           'quoteCurrency': 'USD', 'underlying': None, 'bid': 46916.0, 'ask': 46917.0,
+           'last': 46916.5, 'price': 46916.5, 'priceIncrement': 1.0, 'sizeIncrement': 0.0001,
+           'minProvideSize': 0.0001}
+
+_SYMBOL = {'name': 'BTCUSDT', 'alias': 'BTCUSDT', 'baseCurrency': 'BTC', 'quoteCurrency': 'USDT',
+           'basePrecision': '0.000001', 'quotePrecision': '0.00000001',
+           'minTradeQuantity': '0.000158', 'minTradeAmount': '10', 'maxTradeQuantity': '4',
+           'maxTradeAmount': '100000', 'minPricePrecision': '0.01', 'category': 1, 'showStatus': True}
+
+
+def _ftx(result):
+    return {'success': True, 'result': result}
+
+
+def _bybit(result):
+    return {'ret_code': 0, 'ret_msg': '', 'ext_code': None, 'ext_info': None, 'result': result}
+
+
+def _ftx_error(status, error):
+    return status, {'success': False, 'error': error}
+
+
+def _bybit_error(code, message):
+    return {'ret_code': code, 'ret_msg': message, 'ext_code': None, 'ext_info': None, 'result': None}
+
+
+# state of the server answering on this thread: its clock_skew and its Exchange per venue
+_serving = threading.local()
+
+
+def _now_ms():
+    return time.time_ns() // 1_000_000 + getattr(_serving, 'skew_ms', 0)
+
+
+def _timestamp_rejected(query):
+    ''' Bybit accepts timestamp when server - recvWindow <= timestamp < server + 1000 '''
+    if 'timestamp' not in query or 'sign' not in query:
+        return False
+    server = _now_ms()
+    timestamp = int(query['timestamp'])
+    return not server - int(query.get('recvWindow', 5000)) <= timestamp < server + 1000
+
+
+_TIMESTAMP_REJECTED = _bybit_error(10002, 'invalid request, please check your timestamp and recv_window param')
+
+
+class Exchange:
+    ''' Orders, fills and balances of one venue. '''
+    BID = 46916.0
+    ASK = 46917.0
+
+    def __init__(self, quote, balances=None):
+        '''
+        quote       string  quote currency, used to split symbols like BTCUSDT
+        balances    dict    optional; starting {coin: total}
+        '''
+        self.quote = quote
+        self.balances = collections.defaultdict(float, balances or {'BTC': 1e6, quote: 1e12})
+        self.locked = collections.defaultdict(float)
+        self.orders = {}
+        self.client_ids = {}
+        self.fills = []
+        self.lock = threading.Lock()
+
+    def coins(self, market):
+        if '/' in market:
+            return tuple(market.split('/', 1))
+        if market.endswith(self.quote):
+            return market[:-len(self.quote)], self.quote
+        return market, self.quote
+
+    def _lock_amount(self, order, size):
+        base, quote = self.coins(order['market'])
+        return (quote, order['price'] * size) if order['side'] == 'buy' else (base, size)
+
+    def _trade(self, order, size, price, liquidity):
+        base, quote = self.coins(order['market'])
+        sign = 1 if order['side'] == 'buy' else -1
+        self.balances[base] += sign * size
+        self.balances[quote] -= sign * size * price
+        order['filled'] += size
+        order['cost'] += size * price
+        order['updated'] = _now_ms()
+        if order['filled'] >= order['size'] - 1e-12:
+            order['status'] = 'filled'
+        self.fills.append({'id': _next_id(), 'order': order, 'price': price, 'size': size,
+                           'liquidity': liquidity, 'time': order['updated']})
+
+    def _crosses(self, order, price):
+        if order['price'] is None:
+            return True
+        return price <= order['price'] if order['side'] == 'buy' else price >= order['price']
+
+    def _match(self, order):
+        resting = sorted((o for o in self.orders.values()
+                          if o['status'] == 'open' and o['market'] == order['market']
+                          and o['side'] != order['side'] and self._crosses(order, o['price'])),
+                         key=lambda o: (o['price'] if order['side'] == 'buy' else -o['price'], o['id']))
+        for maker in resting:
+            size = min(order['size'] - order['filled'], maker['size'] - maker['filled'])
+            if size <= 0:
+                break
+            coin, amount = self._lock_amount(maker, size)
+            self.locked[coin] -= amount
+            self._trade(maker, size, maker['price'], 'maker')
+            self._trade(order, size, maker['price'], 'taker')
+        quoted = self.ASK if order['side'] == 'buy' else self.BID
+        remaining = order['size'] - order['filled']
+        if remaining > 0 and self._crosses(order, quoted):
+            self._trade(order, remaining, quoted, 'taker')
+
+    def place(self, market, side, type, size, price=None, client_id=None, post_only=False, ioc=False):
+        ''' RETURNS (order, None) or (None, error) '''
+        side, size = side.lower(), float(size)
+        price = None if type.lower() == 'market' or price in (None, '') else float(price)
+        with self.lock:
+            if client_id and self.client_ids.get(client_id, {}).get('status') == 'open':
+                return None, 'Duplicate client order ID'
+            order = {'id': _next_id(), 'client_id': client_id or None, 'market': market, 'side': side,
+                     'type': type.lower(), 'price': price, 'size': size, 'filled': 0.0, 'cost': 0.0,
+                     'status': 'open', 'post_only': post_only, 'ioc': ioc or price is None,
+                     'created': _now_ms(), 'updated': _now_ms()}
+            coin, amount = self._lock_amount(dict(order, price=price or self.ASK), size)
+            if self.balances[coin] - self.locked[coin] < amount:
+                return None, 'Not enough balances'
+            self.orders[order['id']] = order
+            if client_id:
+                self.client_ids[client_id] = order
+            if post_only and self._crosses(order, self.ASK if side == 'buy' else self.BID):
+                order['status'] = 'cancelled'
+                return order, None
+            self._match(order)
+            if order['status'] == 'open':
+                if order['ioc']:
+                    order['status'] = 'cancelled'
+                else:
+                    coin, amount = self._lock_amount(order, size - order['filled'])
+                    self.locked[coin] += amount
+            return order, None
+
+    def find(self, order_id=None, client_id=None):
+        if client_id is not None:
+            return self.client_ids.get(client_id)
+        return self.orders.get(int(order_id)) if str(order_id).isdigit() else None
+
+    def cancel(self, order):
+        ''' RETURNS None or an error '''
+        with self.lock:
+            if order is None:
+                return 'Order not found'
+            if order['status'] != 'open':
+                return 'Order already closed'
+            coin, amount = self._lock_amount(order, order['size'] - order['filled'])
+            self.locked[coin] -= amount
+            order['status'] = 'cancelled'
+            order['updated'] = _now_ms()
+
+    def open_orders(self, market=None, side=None):
+        return [o for o in list(self.orders.values()) if o['status'] == 'open'
+                and market in (None, o['market']) and side in (None, o['side'])]
+
+    def cancel_all(self, market=None, side=None):
+        orders = self.open_orders(market, side)
+        for order in orders:
+            self.cancel(order)
+        return orders
+
+    def balance(self, coin):
+        ''' RETURNS (total, free) '''
+        return self.balances[coin], self.balances[coin] - self.locked[coin]
+
+
+def _sim(venue):
+    return _serving.sim[venue]
+
+
+def _ftx_orderbook(match, query):
+    depth = int(query.get('depth', 20))
+    return _ftx({'bids': [[Exchange.BID - i, 1.0] for i in range(depth)],
+                 'asks': [[Exchange.ASK + i, 1.0] for i in range(depth)]})
+
+
+def _bybit_orderbook(match, query):
+    limit = int(query.get('limit', 100))
+    return _bybit({'time': _now_ms(),
+                   'bids': [[str(Exchange.BID - i), '1.0'] for i in range(limit)],
+                   'asks': [[str(Exchange.ASK + i), '1.0'] for i in range(limit)]})
+
+
+def _iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def _times(query, step, page):
+    ''' Record times every step seconds inside start_time/end_time, newest first, one page of them. '''
+    end = int(float(query.get('end_time', time.time())))
+    start = int(float(query.get('start_time', end - step * page)))
+    first = -(-start // step) * step
+    return list(range(first, end + 1, step))[::-1][:page]
+
+
+def _ftx_fill(fill):
+    order = fill['order']
+    base, quote = _sim('ftx').coins(order['market'])
+    return {'id': fill['id'], 'market': order['market'], 'future': None, 'baseCurrency': base,
+            'quoteCurrency': quote, 'type': 'order', 'side': order['side'], 'price': fill['price'],
+            'size': fill['size'], 'orderId': order['id'], 'time': _iso(fill['time'] / 1000),
+            'tradeId': fill['id'], 'feeRate': 0.0, 'fee': 0.0, 'feeCurrency': quote,
+            'liquidity': fill['liquidity']}
+
+
+def _ftx_fills(match, query):
+    ''' The simulated fills inside start_time/end_time, then a history fill every 60s, newest first '''
+    history = [{'id': ts, 'market': query.get('market', 'BTC/USD'), 'future': None,
+                'baseCurrency': 'BTC', 'quoteCurrency': 'USD', 'type': 'order', 'side': 'buy',
+                'price': 46916.0, 'size': 0.01, 'orderId': ts, 'time': _iso(ts), 'tradeId': ts,
+                'feeRate': 0.0007, 'fee': 0.0003, 'feeCurrency': 'USD', 'liquidity': 'maker'}
+               for ts in _times(query, 60, 200)]
+    start = float(query.get('start_time', 0)) * 1000
+    end = float(query.get('end_time', time.time() + 1)) * 1000
+    fills = [_ftx_fill(f) for f in reversed(_sim('ftx').fills)
+             if start <= f['time'] <= end and query.get('market') in (None, f['order']['market'])]
+    return _ftx((fills + history)[:200])
+
+
+def _ftx_candles(match, query):
+    resolution = int(query.get('resolution', 60))
+    return _ftx([{'startTime': _iso(ts), 'time': ts * 1000.0, 'open': 46916.0, 'high': 46920.0,
+                  'low': 46910.0, 'close': 46917.0, 'volume': 1.0}
+                 for ts in _times(query, resolution, 1501)[::-1]])
+
+
+def _bybit_klines(match, query):
+    step = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}[query['interval'][-1]] * int(query['interval'][:-1])
+    seconds = {'start_time': int(query['startTime']) // 1000} if 'startTime' in query else {}
+    if 'endTime' in query:
+        seconds['end_time'] = int(query['endTime']) // 1000
+    limit = int(query.get('limit', 1000))
+    return _bybit([[ts * 1000, '46916', '46920', '46910', '46917', '1.5', ts * 1000 + step * 1000 - 1,
+                    '70374', 10, '0.7', '32841']
+                   for ts in _times(seconds, step, limit)[::-1]])
+
+
+def _ftx_render(order):
+    return {'id': order['id'], 'clientId': order['client_id'], 'market': order['market'], 'future': None,
+            'type': order['type'], 'side': order['side'], 'price': order['price'], 'size': order['size'],
+            'filledSize': order['filled'],
+            'remainingSize': order['size'] - order['filled'] if order['status'] == 'open' else 0.0,
+            'avgFillPrice': order['cost'] / order['filled'] if order['filled'] else None,
+            'status': 'open' if order['status'] == 'open' else 'closed',
+            'createdAt': _iso(order['created'] / 1000), 'reduceOnly': False, 'ioc': order['ioc'],
+            'postOnly': order['post_only']}
+
+
+def _ftx_order(match, query, body):
+    body = body or {}
+    order, error = _sim('ftx').place(body.get('market'), body.get('side'), body.get('type', 'limit'),
+                                     body.get('size'), body.get('price'), body.get('clientId'),
+                                     bool(body.get('postOnly')), bool(body.get('ioc')))
+    return _ftx_error(400, error) if error else _ftx(_ftx_render(order))
+
+
+def _ftx_find(match):
+    return _sim('ftx').find(match.get('order_id'), match.get('client_id'))
+
+
+def _ftx_status(match, query):
+    order = _ftx_find(match)
+    return _ftx(_ftx_render(order)) if order else _ftx_error(404, 'Order not found')
+
+
+def _ftx_cancel(match, query, body):
+    error = _sim('ftx').cancel(_ftx_find(match))
+    return _ftx_error(400, error) if error else _ftx('Order queued for cancellation')
+
+
+def _ftx_cancel_all(match, query, body):
+    _sim('ftx').cancel_all((body or {}).get('market'), (body or {}).get('side'))
+    return _ftx('Orders queued for cancellation')
+
+
+def _ftx_modify(match, query, body):
+    ''' Cancel and replace, as FTX does: the new order gets a new id '''
+    sim, body = _sim('ftx'), body or {}
+    order = _ftx_find(match)
+    error = sim.cancel(order)
+    if error:
+        return _ftx_error(400, error)
+    replaced, error = sim.place(order['market'], order['side'], order['type'], body.get('size', order['size']),
+                                body.get('price', order['price']), body.get('clientId', order['client_id']),
+                                order['post_only'], order['ioc'])
+    return _ftx_error(400, error) if error else _ftx(_ftx_render(replaced))
+
+
+def _ftx_orders(match, query):
+    return _ftx([_ftx_render(o) for o in _sim('ftx').open_orders(query.get('market'))])
+
+
+def _ftx_order_history(match, query):
+    return _ftx([_ftx_render(o) for o in reversed(list(_sim('ftx').orders.values()))
+                 if query.get('market') in (None, o['market'])])
+
+
+def _ftx_account(match, query):
+    total, free = _sim('ftx').balance('USD')
+    return _ftx({'username': 'stub', 'collateral': total, 'freeCollateral': free, 'totalAccountValue': total,
+                 'totalPositionSize': 0.0, 'initialMarginRequirement': 0.1, 'maintenanceMarginRequirement': 0.03,
+                 'marginFraction': None, 'leverage': 10.0, 'makerFee': 0.0002, 'takerFee': 0.0007,
+                 'liquidating': False, 'backstopProvider': False, 'positions': []})
+
+
+def _ftx_subaccounts(match, query):
+    return _ftx([{'nickname': name, 'deletable': True, 'editable': True, 'competition': False}
+                 for name in sorted(_serving.sim['ftx_subaccounts'])])
+
+
+def _ftx_balances(match, query):
+    sim = _sim('ftx')
+    rows = []
+    for coin in sorted(sim.balances):
+        total, free = sim.balance(coin)
+        rows.append({'coin': coin, 'free': free, 'total': total, 'availableWithoutBorrow': free,
+                     'usdValue': total * (Exchange.BID if coin == 'BTC' else 1.0), 'spotBorrow': 0.0})
+    return _ftx(rows)
+
+
+_BYBIT_STATUS = {'filled': 'FILLED', 'cancelled': 'CANCELED'}
+
+
+def _bybit_render(order):
+    status = _BYBIT_STATUS.get(order['status']) or ('PARTIALLY_FILLED' if order['filled'] else 'NEW')
+    return {'accountId': '1', 'exchangeId': '301', 'symbol': order['market'], 'symbolName': order['market'],
+            'orderLinkId': order['client_id'] or '', 'orderId': str(order['id']),
+            'price': str(order['price'] or 0), 'origQty': str(order['size']),
+            'executedQty': str(order['filled']), 'cummulativeQuoteQty': str(order['cost']),
+            'avgPrice': str(order['cost'] / order['filled'] if order['filled'] else 0), 'status': status,
+            'timeInForce': 'IOC' if order['ioc'] else 'GTC',
+            'type': 'LIMIT_MAKER' if order['post_only'] else order['type'].upper(),
+            'side': order['side'].upper(), 'stopPrice': '0.0', 'icebergQty': '0.0',
+            'time': str(order['created']), 'updateTime': str(order['updated']),
+            'transactTime': str(order['created']), 'isWorking': True}
+
+
+def _bybit_order(match, query, body):
+    order, error = _sim('bybit').place(query.get('symbol'), query.get('side', ''), query.get('type', 'LIMIT'),
+                                       query.get('qty'), query.get('price'), query.get('orderLinkId'),
+                                       query.get('type') == 'LIMIT_MAKER',
+                                       query.get('timeInForce') in ('IOC', 'FOK'))
+    return _bybit_error(-1131, error) if error else _bybit(_bybit_render(order))
+
+
+def _bybit_find(query):
+    return _sim('bybit').find(query.get('orderId'), query.get('orderLinkId'))
+
+
+def _bybit_order_info(match, query):
+    order = _bybit_find(query)
+    return _bybit(_bybit_render(order)) if order else _bybit_error(-2013, 'Order does not exist.')
+
+
+def _bybit_cancel(match, query, body):
+    order = _bybit_find(query)
+    error = _sim('bybit').cancel(order)
+    return _bybit_error(-2013, error) if error else _bybit(_bybit_render(order))
+
+
+def _bybit_fast_cancel(match, query, body):
+    error = _sim('bybit').cancel(_bybit_find(query))
+    return _bybit_error(-2013, error) if error else _bybit({'isCancelled': True})
+
+
+def _bybit_cancel_all(match, query, body):
+    _sim('bybit').cancel_all(query.get('symbol'), query.get('side', '').lower() or None)
+    return _bybit({'success': True})
+
+
+def _bybit_cancel_ids(match, query, body):
+    ''' Bybit lists the ids it could not cancel '''
+    sim = _sim('bybit')
+    return _bybit([{'orderId': order_id, 'code': '-2013'} for order_id in query.get('orderIds', '').split(',')
+                   if sim.cancel(sim.find(order_id))])
+
+
+def _bybit_open_orders(match, query):
+    return _bybit([_bybit_render(o) for o in _sim('bybit').open_orders(query.get('symbol'))])
+
+
+def _bybit_order_history(match, query):
+    return _bybit([_bybit_render(o) for o in reversed(list(_sim('bybit').orders.values()))
+                   if o['status'] != 'open' and query.get('symbol') in (None, o['market'])])
+
+
+def _bybit_my_trades(match, query):
+    sim = _sim('bybit')
+    rows = []
+    for fill in reversed(sim.fills):
+        order = fill['order']
+        if query.get('symbol') in (None, order['market']):
+            rows.append({'id': str(fill['id']), 'symbol': order['market'], 'symbolName': order['market'],
+                         'orderId': str(order['id']), 'matchOrderId': '0', 'price': str(fill['price']),
+                         'qty': str(fill['size']), 'commission': '0', 'commissionAsset': sim.quote,
+                         'time': str(fill['time']), 'isBuyer': order['side'] == 'buy',
+                         'isMaker': fill['liquidity'] == 'maker'})
+    return _bybit(rows[:int(query.get('limit', 50))])
+
+
+def _bybit_account(match, query):
+    sim = _sim('bybit')
+    rows = []
+    for coin in sorted(sim.balances):
+        total, free = sim.balance(coin)
+        rows.append({'coin': coin, 'coinId': coin, 'coinName': coin, 'total': str(total),
+                     'free': str(free), 'locked': str(total - free)})
+    return _bybit({'balances': rows})
+
+
+_ids = iter(range(10**9, 10**10))
+_ids_lock = threading.Lock()
+
+
+def _next_id():
+    with _ids_lock:
+        return next(_ids)
+
+
+_GET = [
+    (r'/api/markets', lambda m, q: _ftx([_MARKET])),
+    (r'/api/markets/(?P<symbol>[^/]+/[^/]+|[^/]+)/orderbook', _ftx_orderbook),
+    (r'/api/markets/(?P<symbol>[^/]+/[^/]+|[^/]+)/trades',
+     lambda m, q: _ftx([{'id': 1, 'price': 46916.5, 'size': 0.1, 'side': 'buy', 'liquidation': False,
+                         'time': '2022-01-01T00:00:00+00:00'}])),
+    (r'/api/markets/(?P<symbol>[^/]+/[^/]+|[^/]+)/candles', _ftx_candles),
+    (r'/api/markets/(?P<symbol>[^/]+/[^/]+|[^/]+)', lambda m, q: _ftx(dict(_MARKET, name=m['symbol']))),
+    (r'/api/fills', _ftx_fills),
+    (r'/api/time', lambda m, q: _ftx(_iso(_now_ms() / 1000))),
+    (r'/api/orders', _ftx_orders),
+    (r'/api/orders/history', _ftx_order_history),
+    (r'/api/orders/by_client_id/(?P<client_id>[^/]+)', _ftx_status),
+    (r'/api/orders/(?P<order_id>[^/]+)', _ftx_status),
+    (r'/api/wallet/balances', _ftx_balances),
+    (r'/api/account', _ftx_account),
+    (r'/api/positions', lambda m, q: _ftx([])),
+    (r'/api/subaccounts', _ftx_subaccounts),
+    (r'/api/.*', lambda m, q: _ftx([])),
+    (r'/spot/v1/time', lambda m, q: _bybit({'serverTime': _now_ms()})),
+    (r'/spot/v1/symbols', lambda m, q: _bybit([_SYMBOL])),
+    (r'/spot/quote/v1/depth(/merged)?', _bybit_orderbook),
+    (r'/spot/quote/v1/trades',
+     lambda m, q: _bybit([{'price': '46916.5', 'time': _now_ms(), 'qty': '0.1', 'isBuyerMaker': True}])),
+    (r'/spot/quote/v1/kline', _bybit_klines),
+    (r'/spot/quote/v1/ticker/price', lambda m, q: _bybit({'symbol': q.get('symbol'), 'price': '46916.5'})),
+    (r'/spot/quote/v1/ticker/book_ticker',
+     lambda m, q: _bybit({'symbol': q.get('symbol'), 'bidPrice': str(Exchange.BID), 'bidQty': '1',
+                          'askPrice': str(Exchange.ASK), 'askQty': '1', 'time': _now_ms()})),
+    (r'/spot/v1/order', _bybit_order_info),
+    (r'/spot/v1/open-orders', _bybit_open_orders),
+    (r'/spot/v1/history-orders', _bybit_order_history),
+    (r'/spot/v1/myTrades', _bybit_my_trades),
+    (r'/spot/v1/account', _bybit_account),
+    (r'/spot/.*', lambda m, q: _bybit([])),
+]
+
+_POST = [
+    (r'/api/orders', _ftx_order),
+    (r'/api/orders/by_client_id/(?P<client_id>[^/]+)/modify', _ftx_modify),
+    (r'/api/orders/(?P<order_id>[^/]+)/modify', _ftx_modify),
+    (r'/api/.*', lambda m, q, b: _ftx(None)),
+    (r'/spot/v1/order', _bybit_order),
+    (r'/spot/.*', lambda m, q, b: _bybit(None)),
+]
+
+_DELETE = [
+    (r'/api/orders', _ftx_cancel_all),
+    (r'/api/orders/by_client_id/(?P<client_id>[^/]+)', _ftx_cancel),
+    (r'/api/orders/(?P<order_id>[^/]+)', _ftx_cancel),
+    (r'/api/.*', lambda m, q, b: _ftx(None)),
+    (r'/spot/v1/order', _bybit_cancel),
+    (r'/spot/v1/order/fast', _bybit_fast_cancel),
+    (r'/spot/order/batch-(fast-)?cancel', _bybit_cancel_all),
+    (r'/spot/order/batch-cancel-by-ids', _bybit_cancel_ids),
+    (r'/spot/.*', lambda m, q, b: _bybit(None)),
+]
+
+_GET = [(re.compile(pattern + '$'), handler) for pattern, handler in _GET]
+_POST = [(re.compile(pattern + '$'), handler) for pattern, handler in _POST]
+_DELETE = [(re.compile(pattern + '$'), handler) for pattern, handler in _DELETE]
+
+_PUBLIC = re.compile(r'/api/markets.*|/api/time|/spot/v1/time|/spot/v1/symbols|/spot/quote/.*')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0
+    jitter = 0
+    stall_rate = 0
+    stall = 0.1
+    clock_skew = 0
+    api_key = None
+    api_secret = None
+    error_rate = 0
+    drop_rate = 0
+    limiter = None
+    random = None
+    sim = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _venue_error(self, path, status, ftx_error, bybit_code, bybit_message):
+        if path.startswith('/spot'):
+            return self._reply(status, _bybit_error(bybit_code, bybit_message))
+        return self._reply(status, {'success': False, 'error': ftx_error})
+
+    def _unauthorized(self, path, query, raw):
+        ''' (status, payload) for a private request without valid credentials, None when it may go on '''
+        if not self.api_secret or _PUBLIC.match(path):
+            return None
+        secret = self.api_secret.encode()
+        if path.startswith('/spot'):
+            params = dict(query)
+            sign = params.pop('sign', '')
+            if params.get('api_key') != self.api_key:
+                return 200, _bybit_error(10003, 'Invalid api_key')
+            expected = hmac.new(secret, urlencode(sorted(params.items())).encode(), hashlib.sha256).hexdigest()
+            return None if hmac.compare_digest(sign, expected) else (200, _bybit_error(10004, 'error sign!'))
+        payload = f'{self.headers.get("FTX-TS", "")}{self.command}{self.path}'.encode() + raw
+        expected = hmac.new(secret, payload, hashlib.sha256).hexdigest()
+        if self.headers.get('FTX-KEY') != self.api_key or \
+                not hmac.compare_digest(self.headers.get('FTX-SIGN', ''), expected):
+            return 401, {'success': False, 'error': 'Not logged in'}
+
+    def _route(self, routes):
+        raw = self._raw_body()
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query))
+        _serving.skew_ms = int(self.clock_skew * 1000)
+        _serving.sim = self.sim
+        subaccount = self.headers.get('FTX-SUBACCOUNT')
+        if subaccount and parts.path.startswith('/api'):
+            subaccounts = self.sim['ftx_subaccounts']
+            name = unquote(subaccount)
+            _serving.sim = dict(self.sim, ftx=subaccounts.get(name) or subaccounts.setdefault(name, Exchange('USD')))
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.jitter * self.random.random())
+        if self.stall_rate and self.random.random() < self.stall_rate:
+            time.sleep(self.stall)
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            self.close_connection = True
+            return
+        if self.error_rate and self.random.random() < self.error_rate:
+            return self._venue_error(parts.path, 500, 'An unexpected error occurred', -1000, 'Internal error')
+        if self.limiter and not self.limiter.try_acquire(self.command):
+            return self._venue_error(parts.path, 429, 'Please retry request', 10006, 'Too many visits!')
+        rejected = self._unauthorized(parts.path, query, raw)
+        if rejected:
+            return self._reply(*rejected)
+        if _timestamp_rejected(query):
+            return self._reply(200, _TIMESTAMP_REJECTED)
+        for pattern, handler in routes:
+            match = pattern.match(parts.path)
+            if match:
+                if routes is _GET:
+                    result = handler(match.groupdict(), query)
+                else:
+                    result = handler(match.groupdict(), query, json.loads(raw) if raw else None)
+                return self._reply(*(result if isinstance(result, tuple) else (200, result)))
+        self._reply(404, {'success': False, 'error': 'Not found'})
+
+    def _raw_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        self._route(_GET)
+
+    def do_POST(self):
+        self._route(_POST)
+
+    def do_DELETE(self):
+        self._route(_DELETE)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops bursts of new connections, which then retry after a second
+    request_queue_size = 128
+
+
+def self_signed_cert(directory, host='127.0.0.1'):
+    '''
+    Write a throwaway certificate and key for host into directory with the openssl CLI.
+    Returns the path of a PEM file holding both, usable as certfile and as a CA bundle.
+    '''
+    path = os.path.join(directory, 'stub.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                    '-subj', f'/CN={host}', '-addext', f'subjectAltName=IP:{host}',
+                    '-keyout', path, '-out', path + '.crt'],
+                   check=True, capture_output=True)
+    with open(path, 'a') as pem, open(path + '.crt') as crt:
+        pem.write(crt.read())
+    return path
+
+
+def start(host='127.0.0.1', port=0, latency=0, certfile=None, clock_skew=0, jitter=0, stall_rate=0, stall=0.1,
+          api_key=None, api_secret=None, rate_limits=None, error_rate=0, drop_rate=0, seed=None):
+    '''
+    Serve the stub on a background thread, options as in the NOTES above.
+    Returns (server, url); call server.shutdown() when done.
+    server.sim is {'ftx': Exchange, 'bybit': Exchange, 'ftx_subaccounts': {nickname: Exchange}}.
+    '''
+    limiter = None
+    if rate_limits:
+        limiter = rate_limit.RateLimiter({method: rate_limit.TokenBucket(rate, capacity)
+                                          for method, (rate, capacity) in rate_limits.items()})
+    sim = {'ftx': Exchange('USD'), 'bybit': Exchange('USDT'), 'ftx_subaccounts': {}}
+    handler = type('StubHandler', (StubHandler,), {
+        'latency': latency, 'jitter': jitter, 'stall_rate': stall_rate, 'stall': stall, 'clock_skew': clock_skew,
+        'api_key': api_key, 'api_secret': api_secret, 'error_rate': error_rate, 'drop_rate': drop_rate, 'limiter': limiter,
+        'random': random.Random(seed), 'sim': sim})
+    server = StubServer((host, port), handler)
+    server.sim = sim
+    scheme = 'http'
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = 'https'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'{scheme}://{host}:{server.server_address[1]}'
+
+
+if __name__ == '__main__':
+    server, url = start(port=8000)
+    print(url)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
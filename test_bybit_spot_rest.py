@@ -0,0 +1,169 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import balance_state
+import bybit_spot_rest
+import clock_sync
+import host_selection
+import instrumentation
+import order_state
+import rate_limit
+import transport
+
+
+def test_host_selector_switch_and_failover(serve, monkeypatch):
+    slow, slow_url = serve(latency=0.03)
+    fast, fast_url = serve()
+    selector = host_selection.HostSelector([slow_url, fast_url], bybit_spot_rest.probe_host,
+                                           on_switch=bybit_spot_rest.use_host, switch_after=3)
+    monkeypatch.setattr(bybit_spot_rest, 'host_selector', selector)
+    monkeypatch.setattr(bybit_spot_rest, 'BASE_URL', slow_url)
+    monkeypatch.setattr(bybit_spot_rest, 'session', transport.pooled_session())
+    for _ in range(2):
+        selector.probe_once()
+    assert selector.active == slow_url
+    selector.probe_once()
+    assert selector.active == fast_url and bybit_spot_rest.BASE_URL == fast_url
+    assert selector.snapshot()[slow_url]['p50'] > selector.snapshot()[fast_url]['p95']
+
+    fast.shutdown()
+    fast.server_close()
+    bybit_spot_rest.session.close()
+    with pytest.raises(requests.ConnectionError):
+        bybit_spot_rest.server_time()  # no failover unless the selector is running
+    assert selector.active == fast_url
+    selector.start(interval=60)
+    try:
+        assert selector.running
+        assert 'serverTime' in bybit_spot_rest.server_time()['result']
+        assert selector.active == slow_url and bybit_spot_rest.BASE_URL == slow_url
+        assert selector.stats[fast_url].error_rate > 0
+        threads = threading.active_count()
+        selector.start(interval=60)  # already running: no second probe thread
+        assert threading.active_count() == threads
+
+        monkeypatch.setattr(bybit_spot_rest, 'BASE_URL', 'http://127.0.0.1:9')  # the module moved elsewhere
+        pinned = bybit_spot_rest.BybitSpotClient('key', 'secret', base_url=fast_url)
+        assert 'serverTime' in pinned.server_time()['result'] and pinned.base_url == fast_url
+    finally:
+        selector.stop()
+    assert not selector.running and selector._executor is None
+    selector.probe_once()  # a stopped selector can still be probed by hand
+
+def test_clock_sync_against_skewed_stub(serve, monkeypatch):
+    serve(clock_skew=7.5)
+    monkeypatch.setattr(bybit_spot_rest, 'clock', clock_sync.ClockSync(bybit_spot_rest.server_time_ms))
+    order = dict(symbol="BTCUSDT", qty=0.01, side="BUY", type="LIMIT", price=40000)
+    assert bybit_spot_rest.place_order(**order)['ret_code'] == 10002
+    bybit_spot_rest.clock.sync()
+    assert abs(bybit_spot_rest.clock.offset_ns - 7_500_000_000) < 50_000_000
+    assert bybit_spot_rest.clock.rtt_ns > 0
+    assert bybit_spot_rest.place_order(**order)['ret_code'] == 0
+
+def test_hedged_requests(serve, monkeypatch):
+    latency = 0.3
+    slow, slow_url = serve(latency=latency)
+    fast, fast_url = serve()
+    selector = host_selection.HostSelector([slow_url, fast_url], bybit_spot_rest.probe_host)
+    hedger = host_selection.Hedger(default_delay=0.02)
+    monkeypatch.setattr(bybit_spot_rest, 'host_selector', selector)
+    monkeypatch.setattr(bybit_spot_rest, 'hedger', hedger)
+    monkeypatch.setattr(bybit_spot_rest, 'BASE_URL', slow_url)
+    monkeypatch.setattr(bybit_spot_rest, 'api_limit_track_get', rate_limit.SlidingWindowCounter(120))
+    bybit_spot_rest.enable_hedging()
+    start = time.perf_counter()
+    assert bybit_spot_rest.best_bid_ask("BTCUSDT")["result"]["bidPrice"] == "46916.0"
+    assert time.perf_counter() - start < latency  # answered before the slow host could
+    assert (hedger.calls, hedger.hedged, hedger.hedge_wins) == (1, 1, 1)  # by the hedge to the fast host
+    assert bybit_spot_rest.check_api_limit()[0] == 2
+    bybit_spot_rest.server_time()
+    assert hedger.calls == 1
+    bybit_spot_rest.enable_hedging(())
+    assert hedger.endpoints == set()
+
+def test_hedged_failover():
+    delay = 1
+    hedger = host_selection.Hedger(default_delay=delay)
+    charged = []
+
+    def call(host):
+        if host == 'down':
+            raise requests.ConnectionError(host)
+        response = requests.Response()
+        response.status_code = 503 if host == 'busy' else 200
+        return response
+    start = time.perf_counter()
+    assert hedger.request('/quote', call, ['down', 'up'], lambda: charged.append(1)).status_code == 200
+    assert hedger.request('/quote', call, ['busy', 'up'], lambda: charged.append(1)).status_code == 200
+    assert time.perf_counter() - start < delay  # hedged on the failure, not after the delay
+    assert charged == [1, 1] and hedger.hedge_wins == 2
+    assert hedger.request('/quote', call, ['busy', 'down'], lambda: None).status_code == 503
+    with pytest.raises(requests.ConnectionError):
+        hedger.request('/quote', call, ['down'], lambda: None)
+
+def test_metrics_application_errors(exchange, monkeypatch):
+    metrics = instrumentation.Metrics('bybit_spot', bybit_spot_rest.metrics.check)
+    monkeypatch.setattr(bybit_spot_rest, 'metrics', metrics)
+    metrics.enabled = True
+    assert bybit_spot_rest.response_error(bybit_spot_rest.open_orders()) is None
+    monkeypatch.setattr(bybit_spot_rest, 'API_SECRET', 'wrong')
+    assert bybit_spot_rest.response_error(bybit_spot_rest.open_orders()) is not None  # sent with HTTP 200
+    assert metrics.snapshot()['GET /spot/v1/open-orders']['errors'] == 1
+
+def test_mass_cancel(exchange, monkeypatch):
+    bybit = exchange.sim['bybit']
+    for i in range(201):
+        bybit.place(f'COIN{i}USDT', 'buy', 'limit', 1, 100)
+    report = bybit_spot_rest.cancel_all_orders()
+    assert report.remaining == [] and report.rounds == 1
+    assert [(c.key, c.orders, c.error) for c in report.chunks] == [
+        ('ids 0-99', 100, None), ('ids 100-199', 100, None), ('ids 200-200', 1, None)]
+    assert all(c.latency > 0 for c in report.chunks) and report.latency >= max(c.latency for c in report.chunks)
+
+    for i in range(250):
+        bybit.place(('BTCUSDT', 'ETHUSDT')[i % 2], 'buy', 'limit', 1, 100)
+    report = bybit_spot_rest.mass_cancel_orders()
+    assert sorted((c.key, c.orders) for c in report.chunks) == [('BTCUSDT', 125), ('ETHUSDT', 125)]
+    assert report.remaining == [] and bybit.open_orders() == []
+    bybit.place('BTCUSDT', 'buy', 'limit', 1, 100)
+    bybit.place('ETHUSDT', 'buy', 'limit', 1, 100)
+    report = bybit_spot_rest.mass_cancel_orders('BTCUSDT')
+    assert [(c.key, c.orders) for c in report.chunks] == [('BTCUSDT', None)] and report.remaining == []
+    assert [o['market'] for o in bybit.open_orders()] == ['ETHUSDT']
+
+    monkeypatch.setattr(bybit_spot_rest, 'API_SECRET', 'wrong')
+    with pytest.raises(RuntimeError):
+        bybit_spot_rest.mass_cancel_orders()
+
+def test_order_store(exchange, monkeypatch):
+    store = order_state.OrderStore(order_state.bybit_fields, order_state.bybit_cancelled,
+                                   bybit_spot_rest.response_error, bybit_spot_rest.open_order_list)
+    monkeypatch.setattr(bybit_spot_rest, 'order_store', store)
+    ids = [bybit_spot_rest.place_order(symbol="BTCUSDT", qty=1, side="Buy", type="LIMIT", price=40000 - i,
+                                       orderLinkId=f"l{i}")["result"]["orderId"] for i in range(3)]
+    assert store.get_by_client_id("l1")["orderId"] == ids[1] and len(store.open_orders("BTCUSDT")) == 3
+    bybit_spot_rest.cancel_by_id(",".join(ids[:2]))
+    assert [o["orderId"] for o in store.open_orders()] == [ids[2]] and store.get(ids[0])["status"] == "CANCELED"
+    bybit_spot_rest.fast_cancel("BTCUSDT", ids[2])
+    assert store.open_orders() == []
+    order_id = bybit_spot_rest.place_order(symbol="ETHUSDT", qty=1, side="Buy", type="LIMIT", price=100)["result"]["orderId"]
+    bybit_spot_rest.cancel_by_id(int(order_id))  # a single id may be passed as an int
+    assert store.get(order_id)["status"] == "CANCELED"
+    bybit_spot_rest.place_order(symbol="ETHUSDT", qty=1, side="Buy", type="LIMIT", price=100)
+    bybit_spot_rest.mass_cancel_orders()
+    assert store.open_orders() == [] and store.snapshot()['orders'] == 5
+
+def test_balance_store(exchange, monkeypatch):
+    store = balance_state.BalanceStore(bybit_spot_rest.balance_store.fetch, bybit_spot_rest.balance_records,
+                                       bybit_spot_rest.clock.now_ms)
+    monkeypatch.setattr(bybit_spot_rest, 'balance_store', store)
+    assert set(store.poll().changed) == {'BTC', 'USDT'}
+    bybit_spot_rest.place_order(symbol="BTCUSDT", qty=2, side="Sell", type="LIMIT", price=50000)
+    assert store.poll().changed == {'BTC': (1e6, 1e6 - 2, 2.0)}
+    assert bybit_spot_rest.balances()['BTC_locked'] == 2.0
+    monkeypatch.setattr(bybit_spot_rest, 'API_SECRET', 'wrong')
+    with pytest.raises(RuntimeError):
+        store.poll()
@@ -0,0 +1,45 @@
+import threading
+
+import batch
+import bybit_spot_rest
+import ftx_rest
+import stub_server
+
+
+def test_clients(serve, monkeypatch):
+    server, url = serve(api_key='key', api_secret='secret')
+    server.sim['ftx_subaccounts']['sub1'] = stub_server.Exchange('USD', {'USD': 1000})
+    main = ftx_rest.FtxClient('key', 'secret')
+    sub = ftx_rest.FtxClient('key', 'secret', subaccount='sub1', per_thread_sessions=True)
+    wrong = ftx_rest.FtxClient('key', 'wrong', base_url=url + '/api')
+    a = main.place_order(market="BTC/USD", side="buy", price=40000, type="limit", size=1)["result"]
+    b = sub.place_order(market="ETH/USD", side="buy", price=100, type="limit", size=1)["result"]
+    assert main.order_store.open_orders() == [a] and sub.order_store.open_orders() == [b]
+    assert sub.balances()["result"][0]["total"] == 1000.0 and wrong.account()["error"] == "Not logged in"
+    assert main.check_api_limit() == [0, 1] and sub.check_api_limit() == [1, 1] and wrong.check_api_limit() == [1, 0]
+
+    with sub.bound():
+        assert ftx_rest.client() is sub and ftx_rest.open_orders()["result"] == [b]
+        results = batch.fan_out(lambda: ftx_rest.client(), [{}] * 4)
+        assert {r.result for r in results} == {sub}
+        together = threading.Barrier(4)  # four calls on four threads at once
+
+        def session():
+            together.wait()
+            return ftx_rest.client().session
+        sessions = batch.fan_out(session, [{}] * 4, max_workers=4)
+        assert len({id(r.result) for r in sessions}) == 4
+    assert ftx_rest.client() is ftx_rest.default_client and main.session is main.session
+
+    # the default client reads and writes the module globals
+    monkeypatch.setattr(ftx_rest, 'API_KEY', 'key')
+    monkeypatch.setattr(ftx_rest, 'API_SECRET', 'wrong')
+    assert ftx_rest.open_orders()["error"] == "Not logged in"
+    ftx_rest.default_client.api_secret = 'secret'
+    assert ftx_rest.open_orders()["result"] == [a] and ftx_rest.order_store.get(a["id"]) == a
+    assert ftx_rest.default_client.api_key == 'key' and ftx_rest.default_client.session is ftx_rest.session
+
+    bybit = bybit_spot_rest.BybitSpotClient('key', 'secret')
+    order = bybit.place_order(symbol="BTCUSDT", side="BUY", type="LIMIT", qty=1, price=40000)["result"]
+    assert bybit.order_store.get(order["orderId"]) == order and bybit_spot_rest.order_store.get(order["orderId"]) is None
+    assert bybit.check_api_limit() == [0, 1]
@@ -4,6 +4,31 @@ from ftx_rest import *
 import datetime
 import dateutil
 import json
+import time
+import threading
+import asyncio
+
+import numpy as np
+import pytest
+
+import balance_state
+import batch
+import candle_cache
+import clock_sync
+import coalescing
+import columnar
+import decoding
+import ftx_rest
+import instruments
+import instrumentation
+import order_state
+import pagination
+import orderbook
+import stub_server
+import rate_limit
+import signing
+import transport
+from async_rest import AsyncFtxClient
 
 def test_sign_payload():
     api = "LR0RQT6bKjrUNh38eCw9jYC89VDAbRkCogAc_XAm"
@@ -304,3 +329,361 @@ def test_spot():
     
 
 
+def test_async_client(stub_url):
+    adapter = ftx_rest.session.get_adapter(stub_url)
+
+    async def run():
+        async with AsyncFtxClient(pool_size=8) as ftx:
+            quotes = await asyncio.gather(*[ftx.quote(m) for m in ['BTC/USD', 'ETH/USD', 'SOL/USD']])
+            return quotes, transport.connection_stats(ftx.session)
+    quotes, stats = asyncio.run(run())
+    assert [q['result']['name'] for q in quotes] == ['BTC/USD', 'ETH/USD', 'SOL/USD']
+    assert sum(s['requests'] for s in stats.values()) == 3  # sent on the async client's own session
+    assert ftx_rest.session.get_adapter(stub_url) is adapter
+
+def test_private_request_reuses_session(stub_url, monkeypatch):
+    monkeypatch.setattr(ftx_rest, 'session', transport.pooled_session())
+    for _ in range(3):
+        assert ftx_rest.account()['success']
+    stats = ftx_rest.connection_stats()
+    assert sum(s['reused'] for s in stats.values()) == 2
+
+def test_rate_limiter():
+    bucket = rate_limit.TokenBucket(rate=100, capacity=2)
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert not bucket.acquire(blocking=False)
+    start = time.monotonic()
+    assert bucket.acquire()
+    assert 0.005 < time.monotonic() - start < 0.05
+    assert asyncio.run(bucket.acquire_async(timeout=0.05))
+    limiter = rate_limit.RateLimiter({'POST': rate_limit.TokenBucket(rate=1, capacity=5)}, weights={ftx_rest._ORDERS: 5})
+    assert limiter.try_acquire("GET", ftx_rest._ORDERS)
+    assert limiter.try_acquire("POST", ftx_rest._ORDERS)
+    assert not limiter.try_acquire("POST", ftx_rest._ACCOUNT)
+    limiter = ftx_rest.new_limiter()
+    assert all(limiter.try_acquire(method) for method in ['GET', 'POST', 'DELETE'] * 10)
+    assert not any(limiter.try_acquire(method) for method in ['GET', 'POST', 'DELETE'])  # 30 in all, not per method
+
+def test_check_api_limit(stub_url):
+    start_get, start_post = check_api_limit()
+    quote('BTC/USD')
+    quote('BTC/USD')
+    assert check_api_limit() == [start_get + 2, start_post]
+    assert check_micro_api_limit()[0] >= 2
+
+def test_signers():
+    secret = "T4lPid48QtjNxjLUFOcUZghD7CUJ7sTVsfuvQZF2"
+    j = {"market": "BTC-PERP", "side": "buy", "price": 8500, "size": 1, "type": "limit", "reduceOnly": False, "ioc": False, "postOnly": False, "clientId": None}
+    client = ftx_rest.FtxClient('key', secret)
+    signer = client.signer(signing.FtxSigner)
+    assert signer is client.signer(signing.FtxSigner)
+    client.api_secret = 'other'
+    assert client.signer(signing.FtxSigner) is not signer
+    assert signer.sign_batch([(1588591511721, "GET", "/api/markets", None),
+                              (1588591856950, "POST", "/api/orders", json.dumps(j).encode())]) == [
+        "dbc62ec300b2624c580611858d94f2332ac636bb86eccfa1167a7777c496ee6f",
+        "c4fbabaf178658a59d7bbf57678d44c369382f3da29138f04cd46d3d582ba4ba"]
+    # Bybit documentation example
+    bybit = signing.BybitSigner("t7T0YlFnYXk0Fx3JswQsDrViLg1Gh3DUU5Mr")
+    params = {"api_key": "B2Rou0PLPpGqcU0Vu2", "symbol": "BTCUSD", "leverage": 100, "timestamp": 1542434791000}
+    assert bybit.sign_params(params) == "670e3e4aa32b243f2dedf1dafcec2fd17a440e71b05681550416507de591d908"
+    assert bybit.query(params).endswith("&sign=670e3e4aa32b243f2dedf1dafcec2fd17a440e71b05681550416507de591d908")
+
+def test_place_orders(stub_url):
+    orders = [{"market": "BTC/USD", "side": "buy", "price": 46000 - i, "type": "limit", "size": 0.01} for i in range(12)]
+    results = place_orders(orders, max_workers=4)
+    assert [r.result['result']['price'] for r in results] == [o['price'] for o in orders]
+    assert all(r.error is None and r.latency > 0 for r in results)
+    failed = batch.fan_out(lambda **o: {"success": False, "error": "Size too small"}, orders[:2], check=response_error)
+    assert [r.error for r in failed] == ["Size too small"] * 2
+
+def test_paginate(stub_url):
+    # the stub has a fill every minute and answers at most 200 per request
+    records = list(paginate(fills, 0, 36000, window=7200, page_limit=200, market="BTC/USD"))
+    assert [r['id'] for r in records] == list(range(0, 36001, 60))
+    candles = list(paginate(history, 0, 86400 * 3, window=86400, page_limit=1500, symbol="BTC/USD", resolution=300))
+    assert len(candles) == 86400 * 3 // 300 + 1
+    assert pagination.record_key({'id': 0, 'time': 1}) == 0
+    nested = {'time': 1, 'fills': [{'price': 1.0}], 'meta': {'a': 1}}
+    assert pagination.record_key(nested) == pagination.record_key(dict(reversed(list(nested.items()))))
+
+def test_cached_history(stub_url, tmp_path):
+    store = candle_cache.CandleStore(str(tmp_path))
+    day = 86400
+    c = cached_history("BTC/USD", 300, 0, day, store=store)
+    assert len(c) == day // 300 + 1
+    assert store.stats['misses'] == 1
+    c = cached_history("BTC/USD", 300, 3600, 7200, store=store)
+    assert store.stats['hits'] == 1
+    assert isinstance(c.base, np.memmap) or isinstance(c, np.memmap)
+    assert c['time'][0] == 3600 * 1000 and c['time'][-1] == 7200 * 1000
+    c = cached_history("BTC/USD", 300, day // 2, 2 * day, store=store)
+    assert store.stats['fetches'] == 2
+    assert len(c) == 3 * day // 600 + 1
+    assert store.coverage('ftx', "BTC/USD", 300) == [[0, 2 * day * 1000]]
+
+    def truncated(start_ms, end_ms):  # the latest 10 candles of the range only
+        return candle_cache.to_candles((t, 1, 1, 1, 1, 1) for t in range(end_ms - 9 * 60_000, end_ms + 1, 60_000))
+    assert len(store.get('ftx', 'ETH/USD', 60, 0, 3_600_000, truncated)) == 10
+    assert store.coverage('ftx', 'ETH/USD', 60) == [[3_060_000, 3_600_000]]
+
+    fetching = threading.Event()
+    def slow(start_ms, end_ms):  # holds its key while another key is fetched
+        fetching.set()
+        assert other.wait(5)
+        return truncated(start_ms, end_ms)
+    other = threading.Event()
+    thread = threading.Thread(target=store.get, args=('ftx', 'SOL/USD', 60, 0, 600_000, slow))
+    thread.start()
+    fetching.wait(5)
+    store.get('ftx', 'XRP/USD', 60, 0, 600_000, truncated)
+    other.set()
+    thread.join()
+    assert store.coverage('ftx', 'SOL/USD', 60) == [[60_000, 600_000]]
+
+def test_order_book_snapshot(stub_url):
+    book = order_book_snapshot("BTC/USD", depth=30)
+    assert book.bids.shape == (30, 2) and book.bids.dtype == np.float64
+    assert book.mid == 46916.5 and book.spread == 1.0
+    assert book.depth('sell', 1) == 5.0  # bids down to 46911.8
+    # 1 at 46917, 1 at 46918, rest at 46919
+    notional = 46917 + 46918 + 46919 * 0.5
+    assert book.impact_price(notional, 'buy') == pytest.approx(notional / 2.5)
+    assert np.isnan(book.impact_price(1e9, 'buy'))
+    one_sided = orderbook.OrderBook.from_levels([[100, 1]], [])
+    assert np.isnan(one_sided.impact_price(50, 'buy')) and np.isnan(one_sided.impact_price([50, 60], 'buy')).all()
+    assert one_sided.impact_price(50, 'sell') == 100.0
+    merged = book.merged(10)
+    assert merged.bids[0].tolist() == [46910.0, 7.0]
+    assert merged.asks[0].tolist() == [46920.0, 4.0]
+    assert merged.bids[:, 1].sum() == 30.0
+
+def test_instrument_cache(stub_url, tmp_path, monkeypatch):
+    calls = []
+    def fetch():
+        calls.append(1)
+        time.sleep(0.01)
+        return symbols()['result']
+    path = str(tmp_path / "instruments.json")
+    cache = instruments.InstrumentCache(fetch, instruments.ftx_instrument, ttl=300, snapshot_path=path)
+    monkeypatch.setattr(ftx_rest, 'instrument_cache', cache)
+    batch.fan_out(instrument, [{'symbol': 'BTC/USD'}] * 8, max_workers=8)  # one first load for all of them
+    btc = instrument("BTC/USD")
+    assert (btc.tick_size, btc.lot_size, btc.min_size, btc.min_notional) == (1.0, 0.0001, 0.0001, None)
+    assert ticker_list() == ["BTC/USD"]
+    assert pair_info()["BTC/USD"]["name"] == "BTC/USD"
+    pair_info()["BTC/USD"]["name"] = "changed"
+    assert pair_info()["BTC/USD"]["name"] == "BTC/USD"
+    assert len(calls) == 1
+    warm = instruments.InstrumentCache(fetch, instruments.ftx_instrument, snapshot_path=path)
+    assert warm.get("BTC/USD") == btc
+    assert len(calls) == 1
+    opted_in = instruments.InstrumentCache(fetch, instruments.ftx_instrument)
+    opted_in.use_snapshot(path)
+    assert opted_in.get("BTC/USD") == btc and len(calls) == 1
+    opted_in._refreshing = True  # a refresh already running: start() must not fetch alongside it
+    opted_in.start(interval=0.01)
+    time.sleep(0.05)
+    opted_in.stop()
+    assert len(calls) == 1
+
+def test_decoding(stub_url, monkeypatch):
+    body = symbols(raw=True)
+    assert isinstance(body, bytes)
+    assert decoding.loads(body) == symbols()
+    names = symbols(schema=lambda resp: [m['name'] for m in resp['result']])
+    assert names == ["BTC/USD"]
+    # restored after the test even when an assertion fails
+    monkeypatch.setattr(decoding, 'backend', decoding.backend)
+    monkeypatch.setattr(decoding, 'loads', decoding.loads)
+    for backend in decoding.BACKENDS:
+        decoding.use(backend)
+        assert decoding.decode(body) == json.loads(body)
+
+def test_columnar_results(stub_url):
+    t = trades("BTC/USD", as_arrays=True)
+    assert t['time'].dtype == np.int64 and t['time'][0] == 1640995200 * 1000
+    assert t['price'].dtype == np.float64 and t['side'].tolist() == [0]
+    h = history("BTC/USD", resolution=60, start_time=0, end_time=600, as_arrays=True)
+    assert h['time'].tolist() == [i * 60000 for i in range(11)]
+    f = fills(market="BTC/USD", start_time=0, end_time=36000, as_frame=True)
+    assert len(f) == 200
+    assert str(f['side'].dtype) == 'category' and f['price'].dtype == np.float64
+    assert f['time'].iloc[0] == 36000 * 1000
+    funding = dict(fills(market="BTC/USD", start_time=0, end_time=36000)["result"][0], orderId=None, tradeId=None)
+    columns = columnar.to_arrays([funding], columnar.FTX_FILLS)
+    assert columns['orderId'].tolist() == [-1] and columns['tradeId'].tolist() == [-1]
+    with pytest.raises(RuntimeError):
+        shape_result({"success": False, "error": "Not logged in"}, columnar.FTX_FILLS, as_arrays=True)
+
+def test_metrics(stub_url, monkeypatch):
+    metrics = instrumentation.Metrics('ftx')
+    monkeypatch.setattr(ftx_rest, 'metrics', metrics)
+    quote("BTC/USD")
+    assert metrics.snapshot() == {}
+    seen = []
+    metrics.add_hook(pre=lambda method, endpoint: seen.append(endpoint),
+                     post=lambda method, endpoint, latency, response, error: seen.append(getattr(response, "status_code", error)))
+    metrics.enabled = True
+    quote("BTC/USD")
+    quote("ETH/USD")
+    account()
+    snap = metrics.snapshot()
+    assert snap["GET /markets/{symbol}"]["calls"] == 2
+    assert snap["GET /account"]["errors"] == 0
+    assert 0 < snap["GET /account"]["p50"] <= snap["GET /account"]["p99"]
+    assert seen[:2] == ["/markets/{symbol}", 200]
+    with pytest.raises(ConnectionError):
+        metrics.observe("GET", "/account", lambda: (_ for _ in ()).throw(ConnectionError()))
+    assert metrics.snapshot()["GET /account"]["errors"] == 1
+    text = metrics.prometheus()
+    assert 'ftx_requests_total{method="GET",endpoint="/markets/{symbol}"} 2' in text
+    assert 'ftx_request_latency_seconds_count{method="GET",endpoint="/account"} 2' in text
+
+def test_metrics_application_errors(exchange, monkeypatch):
+    metrics = instrumentation.Metrics('ftx', ftx_rest.metrics.check)
+    monkeypatch.setattr(ftx_rest, 'metrics', metrics)
+    metrics.enabled = True
+    assert ftx_rest.response_error(ftx_rest.account()) is None
+    monkeypatch.setattr(ftx_rest, 'API_SECRET', 'wrong')
+    assert ftx_rest.response_error(ftx_rest.account()) is not None
+    assert metrics.snapshot()['GET /account']['errors'] == 1
+
+def test_clock_sync_against_skewed_stub(serve, monkeypatch):
+    server, url = serve(clock_skew=7.5)
+    monkeypatch.setattr(ftx_rest, '_TIME', url + '/api/time')
+    clock = clock_sync.ClockSync(ftx_rest.server_time_ms, samples=4, best=2)
+    assert abs(clock.sync() - 7_500_000_000) < 50_000_000
+    assert abs(clock.now_ms() - time.time() * 1000 - 7500) < 50
+
+def test_coalescing(serve, monkeypatch):
+    coalescer = coalescing.Coalescer([ftx_rest._SINGLE_MARKET])
+    monkeypatch.setattr(ftx_rest, 'coalescer', coalescer)
+    serve(latency=0.1)
+    results = batch.fan_out(quote, [{'symbol': 'BTC/USD'}] * 8 + [{'symbol': 'ETH/USD'}] * 4, max_workers=12)
+    assert [r.result['result']['name'] for r in results] == ['BTC/USD'] * 8 + ['ETH/USD'] * 4
+    assert len({id(r.result) for r in results}) == 12  # every caller gets its own copy
+    assert coalescer.snapshot()['/markets/{symbol}'] == {'calls': 12, 'fetches': 2, 'hits': 0, 'coalesced': 10}
+    quote("BTC/USD")
+    assert coalescer.snapshot()['/markets/{symbol}']['fetches'] == 3
+
+    coalescer.set_ttl(ftx_rest._SINGLE_MARKET, 500)
+    first = quote("BTC/USD")
+    first['result']['bid'] = 0  # a caller's changes stay out of the cache
+    assert quote("BTC/USD")['result']['bid'] == 46916.0
+    assert coalescer.snapshot()['/markets/{symbol}']['hits'] == 1  # served from memory, not fetched
+    coalescer.set_ttl(ftx_rest._SINGLE_MARKET, 0)
+    quote("BTC/USD")
+    assert coalescer.snapshot()['/markets/{symbol}']['fetches'] == 5
+
+    failing = coalescing.Coalescer(['x'])
+    with pytest.raises(ZeroDivisionError):
+        failing.call('x', 1, lambda: 1 / 0)
+    assert failing.call('x', 1, lambda: 2) == 2
+
+def test_mass_cancel(exchange):
+    ftx = exchange.sim['ftx']
+    for market in ('BTC/USD', 'ETH/USD', 'SOL/USD'):
+        for _ in range(3):
+            ftx.place(market, 'buy', 'limit', 1, 100)
+    report = ftx_rest.mass_cancel_orders(markets=['BTC/USD'])
+    assert [(c.key, c.orders) for c in report.chunks] == [('BTC/USD', None)] and report.remaining == []
+    report = ftx_rest.mass_cancel_orders()
+    assert sorted((c.key, c.orders) for c in report.chunks) == [('ETH/USD', 3), ('SOL/USD', 3)]
+    assert report.remaining == [] and ftx.open_orders() == []
+    assert ftx_rest.mass_cancel_orders().chunks == []
+
+
+def test_order_store(exchange, monkeypatch):
+    store = order_state.OrderStore(ftx_rest.order_store.fields, ftx_rest.order_store.cancelled,
+                                   ftx_rest.response_error, ftx_rest.open_order_list)
+    monkeypatch.setattr(ftx_rest, 'order_store', store)
+    a = place_order(market="BTC/USD", side="buy", price=40000, type="limit", size=1, clientId="a")["result"]
+    b = place_order(market="ETH/USD", side="buy", price=100, type="limit", size=1)["result"]
+    assert store.get(a["id"]) is a and store.get_by_client_id("a") is a
+    assert store.open_orders("BTC/USD") == [a] and len(store.open_orders()) == 2
+    modified = ftx_rest.modify_order(a["id"], price=39000, size=1, clientId="a2")["result"]
+    assert store.get(a["id"])["status"] == "cancelling" and store.get_by_client_id("a2") is modified
+    assert order_status(a["id"])["result"]["status"] == "closed"  # the status confirms the cancel
+    assert store.open_orders("BTC/USD") == [modified]
+    cancel_order(modified["id"])
+    assert store.open_orders("BTC/USD") == [store.get(modified["id"])]  # queued, not yet confirmed
+    assert store.get(modified["id"])["status"] == "cancelling"
+    ftx_rest.open_orders(market="BTC/USD")  # so does a listing without it
+    assert store.open_orders("BTC/USD") == [] and store.get(modified["id"]) is None
+
+    exchange.sim['ftx'].cancel(exchange.sim['ftx'].find(b["id"]))  # cancelled behind our back
+    assert store.open_orders() == [store.get(b["id"])]
+    assert store.sync() == [str(b["id"])]
+    assert store.get(b["id"]) is None and store.open_orders() == []
+    c = place_order(market="BTC/USD", side="buy", price=40000, type="limit", size=1)["result"]
+    assert store.reconcile([], since=time.monotonic() - 10) == []  # placed after that listing was requested
+    assert order_status(c["id"])["result"]["status"] == "open" and store.open_orders() == [store.get(c["id"])]
+    stale = dict(store.get(c["id"]))  # listed before the cancel below was recorded
+    listed = time.monotonic()
+    cancel_order(c["id"])
+    assert store.reconcile([stale], since=listed) == [] and store.get(c["id"])["status"] == "cancelling"
+    store.reconcile([stale], since=time.monotonic())
+    assert store.open_orders() == [stale]
+    cancel_all_orders(market="BTC/USD")
+    assert [o["status"] for o in store.open_orders()] == ["cancelling"]
+    store.sync()
+    assert store.open_orders() == []
+
+
+def test_balance_store(exchange, monkeypatch):
+    store = balance_state.BalanceStore(ftx_rest.balance_store.fetch, ftx_rest.balance_records, ftx_rest.clock.now_ms)
+    monkeypatch.setattr(ftx_rest, 'balance_store', store)
+    first = store.poll()
+    assert first.changed == {'BTC': (1e6, 1e6, 0.0), 'USD': (1e12, 1e12, 0.0)}
+    assert abs(first.time - ftx_rest.clock.now_ms()) < 1000
+    assert store.poll().changed == {} and (store.polls, store.parsed) == (2, 1)
+    place_order(market="BTC/USD", side="buy", price=40000, type="limit", size=1)
+    assert store.poll().changed == {'USD': (1e12, 1e12 - 40000, 40000.0)}
+    assert store.get('BTC') == (1e6, 1e6, 0.0) and store.get('XRP') == (0.0, 0.0, 0.0)
+    assert list(store.locked) == [0.0, 40000.0]
+    balances = ftx_rest.custom_balances()
+    assert balances['USD_free'] == 1e12 - 40000 and balances['USD_locked'] == 40000 and balances['BTC_locked'] == 0
+    exchange.sim['ftx'].balances['ETH'] = 5
+    assert store.poll().changed == {'ETH': (5.0, 5.0, 0.0)} and store.coins == ['BTC', 'USD', 'ETH']
+
+
+    # polls racing on a growing coin list: every coin keeps its own value (or 0 when the last body lacks it)
+    store = balance_state.BalanceStore(None, lambda resp: resp['result'], lambda: 0)
+    bodies = [json.dumps({'result': [{'coin': f'C{i}', 'total': i, 'free': i} for i in range(n)][::-1]}).encode()
+              for n in range(1, 60)]
+    batch.fan_out(store.apply, [{'body': body, 'time': n} for n, body in enumerate(bodies * 5)], max_workers=16)
+    assert all(store.get(f'C{i}').total in (i, 0.0) for i in range(59))
+
+def test_account_snapshot(serve, monkeypatch):
+    server, url = serve(latency=0.05, api_key='key', api_secret='secret')
+    subaccounts = server.sim['ftx_subaccounts']
+    subaccounts['sub1'] = stub_server.Exchange('USD', {'USD': 1000})
+    subaccounts['sub 2'] = stub_server.Exchange('USD', {'USD': 2000})
+    subaccounts['sub 2'].place('BTC/USD', 'buy', 'limit', 0.01, 40000)
+    snapshot = ftx_rest.account_snapshot()
+    assert not snapshot.errors and list(snapshot.accounts) == ['main', 'sub 2', 'sub1']
+    serial = 0.05 * (1 + 3 * len(ftx_rest.SNAPSHOT_PARTS))  # the subaccount list, then every part of 3 accounts
+    assert snapshot.latency < serial / 2 and abs(snapshot.time - ftx_rest.clock.now_ms()) < 1000
+    assert snapshot.accounts['sub1']['balances'] == [{'coin': 'USD', 'free': 1000.0, 'total': 1000.0,
+                                                      'availableWithoutBorrow': 1000.0, 'usdValue': 1000.0,
+                                                      'spotBorrow': 0.0}]
+    assert snapshot.accounts['sub 2']['account']['freeCollateral'] == 1600.0
+    assert [len(a['open_orders']) for a in snapshot.accounts.values()] == [0, 1, 0]
+    assert snapshot.accounts['main']['positions'] == []
+
+    monkeypatch.setattr(ftx_rest, 'DEFAULT_SUBACCOUNT', 'sub1')
+    assert balances()['result'][0]['total'] == 1000.0
+    assert balances(subaccount='main')['result'][0]['coin'] == 'BTC'
+    assert ftx_rest.open_orders(subaccount='sub 2')['result'][0]['price'] == 40000
+    monkeypatch.setattr(ftx_rest, 'DEFAULT_SUBACCOUNT', None)
+    main_order = place_order(market="ETH/USD", side="buy", price=100, type="limit", size=1)["result"]
+    monkeypatch.setattr(ftx_rest, 'order_store', ftx_rest.new_order_store())
+    ftx_rest.open_orders(subaccount='main')  # the default account: reconciles order_store
+    assert ftx_rest.order_store.get(main_order["id"]) == main_order
+    monkeypatch.setattr(ftx_rest, 'DEFAULT_SUBACCOUNT', 'sub1')
+    snapshot = ftx_rest.account_snapshot(['sub1', 'missing'], parts={'open_orders': ftx_rest.open_orders})
+    assert snapshot.accounts == {'sub1': {'open_orders': []}, 'missing': {'open_orders': []}}
+    monkeypatch.setattr(ftx_rest, 'API_SECRET', 'wrong')
+    assert ftx_rest.account_snapshot(['main']).errors[('main', 'account')] == 'Not logged in'
@@ -0,0 +1,49 @@
+import requests
+
+import bybit_spot_rest
+import ftx_rest
+
+
+def test_stub_simulator(exchange, monkeypatch):
+    resting = ftx_rest.place_order(market="BTC/USD", side="buy", price=46000, type="limit", size=2, clientId="a")["result"]
+    assert resting["status"] == "open" and resting["remainingSize"] == 2
+    taker = ftx_rest.place_order(market="BTC/USD", side="sell", price=45000, type="limit", size=3)["result"]
+    assert taker["filledSize"] == 3 and taker["avgFillPrice"] == (2 * 46000 + 46916) / 3
+    assert ftx_rest.order_status(resting["id"])["result"]["status"] == "closed"
+    assert len(ftx_rest.fills(market="BTC/USD")["result"]) >= 3
+    usd = {b["coin"]: b for b in ftx_rest.balances()["result"]}["USD"]
+    assert usd["total"] == usd["free"] == 1e12 + 46916  # the 2 BTC crossed our own bid
+
+    open_order = ftx_rest.place_order(market="BTC/USD", side="buy", price=40000, type="limit", size=1)["result"]
+    assert [o["id"] for o in ftx_rest.open_orders()["result"]] == [open_order["id"]]
+    usd = {b["coin"]: b for b in ftx_rest.balances()["result"]}["USD"]
+    assert usd["total"] - usd["free"] == 40000
+    assert ftx_rest.cancel_order(open_order["id"])["success"]
+    assert not ftx_rest.cancel_order(open_order["id"])["success"]
+    assert ftx_rest.open_orders()["result"] == []
+
+    order = bybit_spot_rest.place_order(symbol="BTCUSDT", qty=1, side="Buy", type="LIMIT", price=40000)["result"]
+    assert bybit_spot_rest.open_orders()["result"][0]["orderId"] == order["orderId"]
+    assert bybit_spot_rest.cancel_by_id(order["orderId"])["result"] == []
+    assert bybit_spot_rest.order_info(order["orderId"])["result"]["status"] == "CANCELED"
+    filled = bybit_spot_rest.place_order(symbol="BTCUSDT", qty=1, side="Buy", type="MARKET")["result"]
+    assert filled["status"] == "FILLED" and filled["avgPrice"] == "46917.0"
+
+    monkeypatch.setattr(ftx_rest, 'API_SECRET', 'wrong')
+    monkeypatch.setattr(bybit_spot_rest, 'API_SECRET', 'wrong')
+    assert ftx_rest.open_orders() == {"success": False, "error": "Not logged in"}
+    assert bybit_spot_rest.open_orders()["ret_code"] == 10004
+    assert ftx_rest.quote("BTC/USD")["success"]
+
+def test_stub_rate_limits_and_errors(serve):
+    server, url = serve(rate_limits={'GET': (1, 5)})
+    statuses = [requests.get(url + '/spot/v1/time').status_code for _ in range(10)]
+    assert statuses[:5] == [200] * 5 and statuses.count(429) >= 4
+    server, url = serve(error_rate=0.3, drop_rate=0.2, seed=1)
+    outcomes = []
+    for _ in range(50):
+        try:
+            outcomes.append(requests.get(url + '/api/markets').status_code)
+        except requests.ConnectionError:
+            outcomes.append('dropped')
+    assert outcomes.count(500) > 5 and outcomes.count('dropped') > 3 and outcomes.count(200) > 15
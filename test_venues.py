@@ -0,0 +1,24 @@
+import pytest
+
+import bybit_spot_rest
+import venues
+
+
+def test_venues(serve):
+    latency = 0.1
+    serve(latency=latency)
+    book = venues.top_of_book({'ftx': 'BTC/USD', 'bybit_spot': 'BTC/USDT'})
+    assert not book.errors and latency <= book.latency < 2 * latency  # both venues at once, not one after the other
+    assert abs(book.quotes['bybit_spot'].time - bybit_spot_rest.clock.now_ms()) < 1000
+    assert list(venues.top_of_book({'ftx': 'BTC/USD', 'bybit_spot': 'BTC/USDT'}, ['ftx']).quotes) == ['ftx']
+    with pytest.raises(TypeError):
+        type('Incomplete', (venues.Venue,), {'quote': lambda self, symbol: None})()
+    assert book.quotes['ftx'] == venues.Quote('ftx', 'BTC/USD', 46916.0, 1.0, 46917.0, 1.0, book.quotes['ftx'].time)
+    assert book.quotes['bybit_spot'][1:6] == ('BTC/USDT', 46916.0, 1.0, 46917.0, 1.0)
+
+    for name, symbol in [('ftx', 'BTC/USD'), ('bybit_spot', 'BTC/USDT')]:
+        order = venues.VENUES[name].place_order(symbol, 'buy', 0.01, 40000, client_id='c1')
+        assert (order.venue, order.symbol, order.side, order.type, order.price, order.size, order.client_id) == \
+            (name, symbol, 'buy', 'limit', 40000, 0.01, 'c1')
+        assert order.order_id.isdigit()
+    assert venues.VENUES['bybit_spot'].native_symbol('BTC/USDT') == 'BTCUSDT'
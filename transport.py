@@ -0,0 +1,39 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+""" NOTES:
+    Pooled keep-alive sessions shared by the public and private requests of a module.
+    pool_size       integer     number of hosts to keep connection pools for
+    max_per_host    integer     keep-alive connections kept open per host
+    block           boolean     wait for a free connection instead of opening a throwaway one
+                                when all max_per_host connections are busy
+"""
+
+
+def configure(session, pool_size=10, max_per_host=10, block=False):
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=max_per_host, pool_block=block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def pooled_session(pool_size=10, max_per_host=10, block=False):
+    return configure(requests.Session(), pool_size, max_per_host, block)
+
+
+def connection_stats(session):
+    '''
+    RETURNS per host
+    {'https://ftx.com': {'connections': 2, 'requests': 120, 'reused': 118}}
+    '''
+    stats = {}
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            host = f'{pool.scheme}://{pool.host}:{pool.port}'
+            entry = stats.setdefault(host, {'connections': 0, 'requests': 0, 'reused': 0})
+            entry['connections'] += pool.num_connections
+            entry['requests'] += pool.num_requests
+            entry['reused'] += pool.num_requests - pool.num_connections
+    return stats
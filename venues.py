@@ -0,0 +1,159 @@
+import abc
+import collections
+import time
+
+import batch
+import bybit_spot_rest
+import ftx_rest
+
+""" NOTES:
+    One interface over ftx_rest and bybit_spot_rest.
+    Symbols are written BASE/QUOTE everywhere ('BTC/USD', 'BTC/USDT'); each venue maps them to its own
+    format. Sides are 'buy' / 'sell', types 'limit' / 'market', sizes in the base currency.
+        VENUES['bybit_spot'].quote('BTC/USDT')          Quote
+        VENUES['ftx'].place_order('BTC/USD', 'buy', 0.01, 40000)     OrderResult
+        top_of_book({'ftx': 'BTC/USD', 'bybit_spot': 'BTC/USDT'})     both quotes in one round trip
+    Error responses raise RuntimeError with the exchange's message.
+    Quote.time is when the quote arrived, in epoch ms on the venue's clock (module.clock, the local clock
+    until it has synced); FTX books carry no timestamp, so Bybit's is not used either.
+"""
+
+# time: epoch ms on the venue's clock when the quote arrived
+Quote = collections.namedtuple('Quote', ['venue', 'symbol', 'bid', 'bid_size', 'ask', 'ask_size', 'time'])
+
+OrderResult = collections.namedtuple('OrderResult', ['venue', 'symbol', 'order_id', 'client_id', 'side',
+                                                     'type', 'price', 'size', 'status', 'raw'])
+
+# time: local epoch ms when the last quote arrived, latency: seconds for all of them
+TopOfBook = collections.namedtuple('TopOfBook', ['time', 'latency', 'quotes', 'errors'])
+
+
+class Venue(abc.ABC):
+    name = None
+    module = None
+
+    @abc.abstractmethod
+    def native_symbol(self, symbol):
+        ''' BASE/QUOTE symbol -> the venue's format '''
+
+    @abc.abstractmethod
+    def symbol(self, native):
+        ''' The venue's symbol -> BASE/QUOTE '''
+
+    def checked(self, resp):
+        error = self.module.response_error(resp)
+        if error is not None:
+            raise RuntimeError(f'{self.name}: {error}')
+        return resp['result']
+
+    @abc.abstractmethod
+    def quote(self, symbol):
+        ''' RETURNS Quote '''
+
+    @abc.abstractmethod
+    def order_book(self, symbol, depth=20):
+        ''' RETURNS orderbook.OrderBook '''
+
+    @abc.abstractmethod
+    def place_order(self, symbol, side, size, price=None, type='limit', client_id=None):
+        ''' RETURNS OrderResult '''
+
+    @abc.abstractmethod
+    def cancel_order(self, order_id):
+        ''' Raises RuntimeError when the venue refuses '''
+
+
+class FtxVenue(Venue):
+    name = 'ftx'
+    module = ftx_rest
+
+    def native_symbol(self, symbol):
+        return symbol
+
+    def symbol(self, native):
+        return native
+
+    def quote(self, symbol):
+        book = self.checked(ftx_rest.order_book(self.native_symbol(symbol), depth=1))
+        (bid, bid_size), (ask, ask_size) = book['bids'][0], book['asks'][0]
+        return Quote(self.name, symbol, bid, bid_size, ask, ask_size, ftx_rest.clock.now_ms())
+
+    def order_book(self, symbol, depth=20):
+        return ftx_rest.order_book_snapshot(self.native_symbol(symbol), depth=depth)
+
+    def order_result(self, order):
+        return OrderResult(self.name, self.symbol(order['market']), str(order['id']), order.get('clientId'),
+                           order['side'], order['type'], order['price'], order['size'], order['status'], order)
+
+    def place_order(self, symbol, side, size, price=None, type='limit', client_id=None):
+        params = dict(market=self.native_symbol(symbol), side=side, price=price, type=type, size=size)
+        if client_id:
+            params['clientId'] = client_id
+        return self.order_result(self.checked(ftx_rest.place_order(**params)))
+
+    def cancel_order(self, order_id):
+        self.checked(ftx_rest.cancel_order(order_id))
+
+
+class BybitSpotVenue(Venue):
+    name = 'bybit_spot'
+    module = bybit_spot_rest
+
+    def native_symbol(self, symbol):
+        return symbol.replace('/', '')
+
+    def symbol(self, native):
+        instrument = bybit_spot_rest.instrument(native)
+        return f'{instrument.base}/{instrument.quote}'
+
+    def quote(self, symbol):
+        book = self.checked(bybit_spot_rest.best_bid_ask(self.native_symbol(symbol)))
+        return Quote(self.name, symbol, float(book['bidPrice']), float(book['bidQty']),
+                     float(book['askPrice']), float(book['askQty']), bybit_spot_rest.clock.now_ms())
+
+    def order_book(self, symbol, depth=20):
+        return bybit_spot_rest.orderbook_snapshot(self.native_symbol(symbol), limit=depth)
+
+    def order_result(self, order, symbol):
+        price = order.get('price')
+        return OrderResult(self.name, symbol, order['orderId'], order.get('orderLinkId') or None,
+                           order['side'].lower(), order['type'].lower(), float(price) if price else None,
+                           float(order['origQty']), order['status'].lower(), order)
+
+    def place_order(self, symbol, side, size, price=None, type='limit', client_id=None):
+        params = dict(symbol=self.native_symbol(symbol), qty=size, side=side.upper(), type=type.upper())
+        if price is not None:
+            params['price'] = price
+        if client_id:
+            params['orderLinkId'] = client_id
+        return self.order_result(self.checked(bybit_spot_rest.place_order(**params)), symbol)
+
+    def cancel_order(self, order_id):
+        self.checked(bybit_spot_rest.cancel_order(order_id))
+
+
+VENUES = {venue.name: venue for venue in (FtxVenue(), BybitSpotVenue())}
+
+
+def top_of_book(symbols, venues=None):
+    '''
+    Quotes from every venue requested at once, so the snapshot takes the slowest venue's round trip
+    rather than the sum of them.
+    symbols     string or dict  one symbol for every venue, or {venue name: symbol}
+    venues      list            optional; venue names, default all of VENUES or the keys of symbols
+    RETURNS TopOfBook(time, latency, quotes {venue: Quote}, errors {venue: exception})
+    '''
+    if isinstance(symbols, str):
+        symbols = dict.fromkeys(venues or VENUES, symbols)
+    elif venues is not None:
+        symbols = {name: symbol for name, symbol in symbols.items() if name in venues}
+    start = time.perf_counter()
+    pool = batch.executor()
+    futures = {name: pool.submit(VENUES[name].quote, symbol) for name, symbol in symbols.items()}
+    quotes, errors = {}, {}
+    for name, future in futures.items():
+        try:
+            quotes[name] = future.result()
+        except Exception as e:
+            errors[name] = e
+    return TopOfBook(time.time_ns() // 1_000_000, time.perf_counter() - start, quotes, errors)